@@ -1,8 +1,6 @@
 import os
-import sys
 import tempfile
-import logging
-from flask import Flask, request
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -10,18 +8,21 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
 from whitenoise import WhiteNoise
+from .database import RoutingSession
+from .passwords import password_hasher
+from .media import image_pipeline
+from .payments import mpesa
+from .ratelimit import configure_ratelimit
 
 # Load environment variables from .env file
 load_dotenv()
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
-# limiter = Limiter(
-#     key_func=get_remote_address,
-#     default_limits=["200 per day", "50 per hour"],
-#     storage_uri="memory://"
-# )
+# Storage comes from RATELIMIT_STORAGE_URI (see configure_ratelimit); importing
+# app.ratelimit registers the shared SQLite backend with the limits library.
+limiter = Limiter(key_func=get_remote_address)
 
 def create_app(config_class=None):
     # Use temp directory for instance path on Vercel
@@ -32,6 +33,10 @@ def create_app(config_class=None):
 
     app = Flask(__name__, instance_path=instance_path, instance_relative_config=False)
 
+    # orjson-backed jsonify (stdlib json if orjson is not installed)
+    from .json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # Set database URI from environment variable
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
         'SQLALCHEMY_DATABASE_URI',
@@ -49,15 +54,21 @@ def create_app(config_class=None):
     app.config.from_object(config_class)
 
     # Set SQLALCHEMY_ENGINE_OPTIONS after all config is loaded
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'connect_args': {'check_same_thread': False} if 'sqlite' in app.config['SQLALCHEMY_DATABASE_URI'] else {}
-    }
+    from .database import build_engine_options, configure_engines, configure_replica, init_replica_routing
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
+    configure_replica(app.config)
 
     # Initialize extensions (moved after app.config.from_object)
     db.init_app(app)
+    configure_engines(app, db)
+    init_replica_routing(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
-    # limiter.init_app(app) # Uncomment if you want to use the limiter
+    password_hasher.init_app(app)
+    image_pipeline.init_app(app)
+    mpesa.init_app(app)
+    configure_ratelimit(app)
+    limiter.init_app(app)
 
     # Configure template and static folders
     base_dir = os.path.dirname(__file__)
@@ -65,39 +76,59 @@ def create_app(config_class=None):
     static_path = os.path.abspath(os.path.join(base_dir, 'static'))
     app.template_folder = templates_path
     app.static_folder = static_path
-    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-    app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-    # Add whitenoise
-    app.wsgi_app = WhiteNoise(app.wsgi_app, root=static_path, prefix='/static/')
 
-    # Configure logging
-    stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    )
-    stream_handler.setFormatter(formatter)
-    app.logger.addHandler(stream_handler)
-    app.logger.setLevel(logging.INFO)
+    # Hashed asset URLs in production (see app/assets.py); caching and
+    # template reloading come from SEND_FILE_MAX_AGE_DEFAULT,
+    # TEMPLATES_AUTO_RELOAD and STATIC_MAX_AGE in config.
+    from .assets import init_assets, is_immutable
+    init_assets(app)
+
+    # Add whitenoise; in debug it re-scans the static folder on every request
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=static_path, prefix='/static/',
+                              autorefresh=app.debug, max_age=app.config['STATIC_MAX_AGE'],
+                              immutable_file_test=is_immutable)
+    # Content-addressed uploads never change, so they are cached for good.
+    from .media.storage import URL_SUBDIR, MediaFiles, media_cli
+    app.wsgi_app = MediaFiles(app.wsgi_app, root=image_pipeline.store.root,
+                              prefix=f'/static/{URL_SUBDIR}/')
+    app.cli.add_command(media_cli)
+
+    # Configure logging: app messages and sampled access records go through a
+    # background queue writer instead of a synchronous stdout handler.
+    from .access_log import init_access_log
+    init_access_log(app)
     app.logger.info('Flask startup')
 
-    # Log requests
-    @app.before_request
-    def log_request_info():
-        app.logger.info(f'Request: {request.method} {request.url}')
+    from .metrics import init_metrics
+    init_metrics(app)
 
-    @app.after_request
-    def log_response_info(response):
-        app.logger.info(f'Response: {request.method} {request.url} Status: {response.status_code}')
-        return response
+    from .query_tracker import init_query_tracking
+    init_query_tracking(app)
 
     # Initialize Flask-Login
     login_manager.login_view = 'auth.login'
+    from .identity_cache import configure_identity_cache
+    configure_identity_cache(app)
+    from .http_cache import configure_http_cache
+    configure_http_cache(app)
+    from .fragment_cache import configure_fragment_cache
+    configure_fragment_cache(app)
+    from .map_clusters import configure_map_clusters
+    configure_map_clusters(app)
+    from .scheduling import configure_scheduling
+    configure_scheduling(app)
 
     # Import models to ensure they are registered with SQLAlchemy
     from .modules import User, Service, Booking, Payment, Professional
 
+    # Rating aggregates follow Review writes (see app/ratings.py)
+    from .ratings import ratings_cli
+    app.cli.add_command(ratings_cli)
+
+    # Admin analytics rollups (see app/analytics.py)
+    from .analytics import analytics_cli
+    app.cli.add_command(analytics_cli)
+
     # Import and register Blueprints
     from .main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -113,10 +144,30 @@ def create_app(config_class=None):
     from .admin import admin_bp
     app.register_blueprint(admin_bp)
 
+    # Paged job recommendations; login required and rate limited
+    from .routes.recommendations import bp as recommendations_bp
+    app.register_blueprint(recommendations_bp)
+
+    # Full-text search API; the index itself is created with the tables
+    from .routes.search import bp as search_bp
+    from .search import search_cli
+    app.register_blueprint(search_bp)
+    app.cli.add_command(search_cli)
+
+    # Booking availability API (see app/scheduling.py)
+    from .routes.bookings import bp as bookings_bp
+    app.register_blueprint(bookings_bp)
+
+    # M-Pesa STK push, callbacks and reconciliation (see app/payments)
+    from .routes.payments import bp as payments_bp
+    from .payments.reconcile import payments_cli
+    app.register_blueprint(payments_bp)
+    app.cli.add_command(payments_cli)
+
     return app
 
 @login_manager.user_loader
 def load_user(user_id):
     # local import to avoid circular dependency during app creation
-    from .models import User
-    return db.session.get(User, int(user_id))
\ No newline at end of file
+    from .identity_cache import load_cached_user
+    return load_cached_user(int(user_id))
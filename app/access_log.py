@@ -0,0 +1,143 @@
+"""
+Structured access logging.
+
+Each request produces at most one JSON record. Records are handed to a
+QueueHandler and written by a background QueueListener thread, so request
+threads never block on stdout.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+from flask.logging import default_handler
+
+access_logger = logging.getLogger('skillhub.access')
+
+_log_queue = None
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record as a single JSON line."""
+
+    def format(self, record):
+        payload = getattr(record, 'access', None)
+        if payload is None:
+            payload = {
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+            }
+            if record.exc_info:
+                payload['exc'] = self.formatException(record.exc_info)
+        payload = {'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(), **payload}
+        return json.dumps(payload, separators=(',', ':'), default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _get_queue_handler(maxsize):
+    """Start the shared background writer (once per process) and return a queue handler."""
+    global _log_queue, _listener
+    if _log_queue is None:
+        _log_queue = queue.Queue(maxsize=maxsize)
+        atexit.register(stop_listener)
+    if _listener is None:
+        # Restarts after stop_listener() reuse the queue, which loggers
+        # configured earlier still hold handlers for.
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JSONFormatter())
+        _listener = QueueListener(_log_queue, stream_handler, respect_handler_level=False)
+        _listener.start()
+    return DroppingQueueHandler(_log_queue)
+
+
+def stop_listener():
+    """Flush pending records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _attach(logger, handler):
+    if not any(isinstance(h, QueueHandler) for h in logger.handlers):
+        logger.addHandler(handler)
+
+
+def _should_log(app, status, duration_ms):
+    if status >= 500 or duration_ms >= app.config['ACCESS_LOG_SLOW_MS']:
+        return True
+    rate = app.config['ACCESS_LOG_SAMPLE_RATE']
+    return rate >= 1.0 or random.random() < rate
+
+
+def init_access_log(app):
+    """Route app logging through the queue and register the access-log hooks."""
+    app.config.setdefault('ACCESS_LOG_ENABLED', True)
+    app.config.setdefault('ACCESS_LOG_SAMPLE_RATE', 1.0)
+    app.config.setdefault('ACCESS_LOG_SLOW_MS', 1000)
+    app.config.setdefault('ACCESS_LOG_SKIP_PREFIXES', ('/static/', '/favicon.ico'))
+    app.config.setdefault('ACCESS_LOG_QUEUE_SIZE', 10000)
+
+    handler = _get_queue_handler(app.config['ACCESS_LOG_QUEUE_SIZE'])
+    app.logger.removeHandler(default_handler)
+    _attach(app.logger, handler)
+    app.logger.setLevel(logging.INFO)
+
+    if not app.config['ACCESS_LOG_ENABLED']:
+        return
+
+    _attach(access_logger, handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    skip_prefixes = tuple(app.config['ACCESS_LOG_SKIP_PREFIXES'])
+
+    @app.before_request
+    def _start_timer():
+        g._access_start = time.perf_counter()
+
+    def _emit(status, size=None):
+        start = g.pop('_access_start', None)
+        if start is None or request.path.startswith(skip_prefixes):
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        if not _should_log(app, status, duration_ms):
+            return
+        access_logger.info('access', extra={'access': {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': status,
+            'duration_ms': round(duration_ms, 2),
+            'bytes': size,
+            'remote_addr': request.remote_addr,
+        }})
+
+    @app.after_request
+    def _log_response(response):
+        _emit(response.status_code, response.calculate_content_length())
+        return response
+
+    @app.teardown_request
+    def _log_unhandled(exc):
+        # after_request is skipped when a view raises; still record the request.
+        if exc is not None:
+            _emit(500)
@@ -1,13 +1,112 @@
-from flask import render_template
-from flask_login import login_required
+import hmac
+from datetime import datetime, timedelta, timezone
+
+from flask import Response, abort, current_app, jsonify, render_template, request
+from flask_login import current_user
 from app.admin import admin_bp
+from app.analytics import METRICS, PERIODS, floor_day, series, totals
+from app.http_cache import cached_json
+from app.metrics import registry
+from app.utils import role_required
+
+# Longest range, in days, one analytics API call may cover per period
+MAX_RANGE_DAYS = {'hour': 31, 'day': 3660}
+DASHBOARD_DAYS = 30
+
+
+def _recent_days(days):
+    end = floor_day(datetime.utcnow()) + timedelta(days=1)
+    return end - timedelta(days=days), end
+
+
+def _by_bucket(rows):
+    """Sum series rows over dimensions: [(bucket, count, total)], oldest first."""
+    buckets = {}
+    for row in rows:
+        count, total = buckets.get(row['bucket'], (0, 0.0))
+        buckets[row['bucket']] = (count + row['count'], total + row['total'])
+    return [(bucket[:10], count, total) for bucket, (count, total) in buckets.items()]
+
 
 @admin_bp.route('/dashboard')
-@login_required
+@role_required('admin')
 def dashboard():
-    return render_template('admin/admin_dashboard.html')
+    start, end = _recent_days(DASHBOARD_DAYS)
+    jobs = sorted(totals('jobs', start, end).items(), key=lambda item: -item[1][0])
+    payments = sorted(totals('payments', start, end).items())
+    return render_template(
+        'admin/admin_dashboard.html',
+        days=DASHBOARD_DAYS,
+        jobs_by_profession=[(profession or 'Unspecified', count) for profession, (count, _) in jobs[:10]],
+        jobs_total=sum(count for _, (count, _) in jobs),
+        payments_by_status=[(status, count, total) for status, (count, total) in payments],
+        bookings_per_day=_by_bucket(series('bookings', 'day', end - timedelta(days=14), end)),
+    )
+
 
 @admin_bp.route('/ai-analytics')
-@login_required
+@role_required('admin')
 def ai_analytics():
-    return render_template('admin/ai_analytics.html')
+    start, end = _recent_days(DASHBOARD_DAYS)
+    outcomes = {outcome: count for outcome, (count, _) in totals('suggestions', start, end).items()}
+    suggested = sum(outcomes.values())
+    contacted = suggested - outcomes.get('pending', 0)
+    daily = {}
+    for row in series('suggestions', 'day', start, end):
+        daily.setdefault(row['bucket'][:10], {})[row['dimension']] = row['count']
+    return render_template(
+        'admin/ai_analytics.html',
+        days=DASHBOARD_DAYS,
+        suggested=suggested,
+        contact_rate=contacted / suggested if suggested else None,
+        interest_rate=outcomes.get('interested', 0) / contacted if contacted else None,
+        daily=sorted(daily.items()),
+    )
+
+
+@admin_bp.route('/api/analytics/<metric>')
+@role_required('admin')
+@cached_json('analytics_rollups')
+def analytics_api(metric):
+    """
+    Rolled-up analytics for one metric.
+
+    Query Parameters:
+        - period: hour or day (default)
+        - start, end: ISO 8601 dates, UTC unless an offset is given (default: the last 30 days)
+
+    Returns:
+        JSON array of {bucket, dimension, count, total}, oldest bucket first
+    """
+    if metric not in METRICS:
+        return jsonify({'error': f'metric must be one of: {", ".join(METRICS)}', 'code': 400}), 400
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'error': f'period must be one of: {", ".join(PERIODS)}', 'code': 400}), 400
+    default_start, default_end = _recent_days(DASHBOARD_DAYS)
+    try:
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else default_start
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else default_end
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 dates', 'code': 400}), 400
+    start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t for t in (start, end))
+    if not start < end <= start + timedelta(days=MAX_RANGE_DAYS[period]):
+        return jsonify({'error': f'end must be after start and within {MAX_RANGE_DAYS[period]} days',
+                        'code': 400}), 400
+    return jsonify(series(metric, period, start, end))
+
+
+def _has_metrics_token():
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(supplied, f'Bearer {token}')
+
+@admin_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: admins, or a scraper holding METRICS_TOKEN."""
+    if not _has_metrics_token():
+        if not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        if current_user.role != 'admin':
+            abort(403)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
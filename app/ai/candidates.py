@@ -0,0 +1,64 @@
+"""
+First-stage candidate generation for ProfessionalMatcher.
+
+Embedding every registered professional for every job costs one model call
+per professional. In two-stage mode the matcher first ranks professionals
+with the cheap lexical score below and only embeds the best few hundred, so
+the ML cost per job stays bounded however large the catalogue grows.
+
+The score needs no model and no corpus statistics, so it is computed while
+streaming candidates from the database:
+
+- a profession-category match between the job and the professional, plus
+- skill overlap: job words found among the professional's skill and
+  profession words, divided by the square root of how many such words the
+  professional lists, so long skill lists do not win by volume alone.
+"""
+import heapq
+import re
+from math import sqrt
+from typing import Any, FrozenSet, Iterable, List, Tuple
+
+PROFESSION_WEIGHT = 2.0
+MIN_TOKEN_LENGTH = 3
+
+
+def tokens(text: str) -> FrozenSet[str]:
+    """Lower-cased words of `text`, ignoring very short ones."""
+    return frozenset(t for t in re.findall(r'\w+', (text or '').lower()) if len(t) >= MIN_TOKEN_LENGTH)
+
+
+def skills_of(professional: Any) -> List[str]:
+    """Skills as a list, whether stored as a list or a comma-separated string."""
+    skills = professional.skills or []
+    if isinstance(skills, str):
+        skills = skills.split(',')
+    return [s.strip() for s in skills if s and s.strip()]
+
+
+def job_terms(job: Any) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """(profession words, all words) of a job."""
+    profession = tokens(job.profession)
+    return profession, profession | tokens(f'{job.title} {job.description}')
+
+
+def lexical_score(terms: Tuple[FrozenSet[str], FrozenSet[str]], professional: Any) -> float:
+    """Profession-category match plus normalized skill overlap (higher is better)."""
+    job_profession, job_words = terms
+    profession = tokens(professional.profession)
+    words = profession.union(*(tokens(s) for s in skills_of(professional)))
+    score = PROFESSION_WEIGHT if job_profession & profession else 0.0
+    if words:
+        score += len(words & job_words) / sqrt(len(words))
+    return score
+
+
+def top_candidates(job: Any, professionals: Iterable[Any], pool_size: int) -> List[Any]:
+    """The `pool_size` professionals with the best lexical score, best first.
+
+    `professionals` may be a lazy iterable; only the pool is kept in memory.
+    Ties go to the lower id so the pool, and therefore paging, is stable.
+    """
+    terms = job_terms(job)
+    scored = ((lexical_score(terms, pro), -pro.id, pro) for pro in professionals)
+    return [pro for _, _, pro in heapq.nlargest(pool_size, scored, key=lambda s: s[:2])]
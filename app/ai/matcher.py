@@ -2,16 +2,17 @@
 AI-based professional-job matching system using sentence transformers.
 Handles both skill matching and geographical proximity.
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from dataclasses import dataclass
+import heapq
 import logging
 import numpy as np
 from math import radians, sin, cos, sqrt, atan2
 from sentence_transformers import SentenceTransformer, util
 from functools import lru_cache
+from app.ai.candidates import skills_of, top_candidates
+from app.metrics import matcher_encode_latency, record_cache
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
@@ -82,7 +83,8 @@ class ProfessionalMatcher:
         experience_weight: float = 0.1,
         rating_weight: float = 0.1,
         rate_weight: float = 0.1,
-        max_distance_km: float = DEFAULT_MAX_DISTANCE_KM
+        max_distance_km: float = DEFAULT_MAX_DISTANCE_KM,
+        candidate_pool: Optional[int] = None
     ):
         """
         Initialize the matcher with custom weights and thresholds.
@@ -94,6 +96,9 @@ class ProfessionalMatcher:
             rating_weight: Weight for rating (0-1)
             rate_weight: Weight for hourly rate (0-1)
             max_distance_km: Maximum distance to consider (in km)
+            candidate_pool: If set, rank professionals lexically first and
+                only embed and score the best `candidate_pool` of them
+                (see app/ai/candidates.py)
         """
         weights = [similarity_weight, distance_weight, experience_weight, rating_weight, rate_weight]
         if not all(0 <= w <= 1 for w in weights) or abs(sum(weights) - 1.0) > 1e-6:
@@ -105,24 +110,30 @@ class ProfessionalMatcher:
         self.rating_weight = rating_weight
         self.rate_weight = rate_weight
         self.max_distance_km = max_distance_km
+        self.candidate_pool = candidate_pool
+        model_hits = get_model.cache_info().hits
         self.model = get_model()
+        record_cache('matcher_model', get_model.cache_info().hits > model_hits)
         
         logger.info(
             f"Initialized ProfessionalMatcher with weights: "
             f"similarity={similarity_weight}, distance={distance_weight}, "
             f"experience={experience_weight}, rating={rating_weight}, rate={rate_weight}, "
-            f"max_distance={max_distance_km}km"
+            f"max_distance={max_distance_km}km, candidate_pool={candidate_pool}"
         )
     
     def _get_job_embedding(self, job: Job) -> np.ndarray:
         """Generate embedding for job."""
         job_text = f"{job.title} {job.description} {job.profession}"
-        return self.model.encode(job_text, convert_to_tensor=True)
+        with matcher_encode_latency.time(kind='job'):
+            return self.model.encode(job_text, convert_to_tensor=True)
     
     def _get_professional_embedding(self, professional: Professional) -> np.ndarray:
         """Generate embedding for professional."""
-        skills_text = " ".join(professional.skills) if professional.skills else professional.profession
-        return self.model.encode(skills_text, convert_to_tensor=True)
+        skills = skills_of(professional)
+        skills_text = " ".join(skills) if skills else professional.profession
+        with matcher_encode_latency.time(kind='professional'):
+            return self.model.encode(skills_text, convert_to_tensor=True)
     
     def _calculate_normalized_distance_score(
         self, 
@@ -147,28 +158,27 @@ class ProfessionalMatcher:
     def match(
         self,
         job: Job,
-        professionals: List[Professional],
+        professionals: Iterable[Professional],
         top_n: int = 5,
-        min_score: float = 0.3
+        min_score: float = 0.3,
+        after: Optional[Tuple[float, int]] = None
     ) -> List[Dict[str, Any]]:
         """
         Match professionals to a job.
         
         Args:
             job: The job to match against
-            professionals: List of professionals to consider
+            professionals: Professionals to consider; may be a lazy iterable
+                such as a yield_per query, only the best top_n are kept
             top_n: Maximum number of matches to return
             min_score: Minimum score threshold for matches (0-1)
+            after: (score, professional id) of the last match already served;
+                only matches ranked below it are returned
             
         Returns:
             List of dicts containing match information, sorted by score
+            (descending) then professional id
         """
-        if not professionals:
-            logger.warning("No professionals provided for matching")
-            return []
-            
-        logger.info(f"Matching job '{job.title}' against {len(professionals)} professionals")
-        
         # Pre-compute job embedding once
         try:
             job_embedding = self._get_job_embedding(job)
@@ -176,52 +186,73 @@ class ProfessionalMatcher:
             logger.error(f"Error generating job embedding: {e}")
             return []
         
-        matches = []
+        if self.candidate_pool:
+            # Stage one: a cheap lexical ranking bounds how many get embedded
+            professionals = top_candidates(job, professionals, self.candidate_pool)
         
-        for pro in professionals:
-            try:
-                # Calculate skill similarity
-                pro_embedding = self._get_professional_embedding(pro)
-                similarity = cosine_similarity(job_embedding, pro_embedding)
-                
-                # Calculate distance score if location data is available
-                if None not in (job.location_lat, job.location_lng, pro.latitude, pro.longitude):
-                    distance_score = self._calculate_normalized_distance_score(
-                        job.location_lat, job.location_lng,
-                        pro.latitude, pro.longitude
-                    )
-                else:
-                    distance_score = 0.5  # Neutral score if location data is missing
-                
-                # Calculate combined score
-                combined_score = (
-                    (similarity * self.similarity_weight) +
-                    (distance_score * self.distance_weight)
-                )
-                
-                # Apply minimum score threshold
-                if combined_score >= min_score:
-                    distance = calculate_distance(
-                        job.location_lat, job.location_lng,
-                        pro.latitude, pro.longitude
-                    )
-                    matches.append({
-                        "professional": pro,
-                        "score": round(combined_score, 3),
-                        "similarity": round(similarity, 3),
-                        "distance_score": round(distance_score, 3),
-                        "distance_km": round(distance, 2) if distance is not None else None
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error processing professional {getattr(pro, 'id', 'unknown')}: {e}")
-                continue
+        scored = 0
         
-        # Sort by score (descending) and take top N
-        matches.sort(key=lambda x: x["score"], reverse=True)
+        def candidates():
+            nonlocal scored
+            for pro in professionals:
+                scored += 1
+                match = self._score(job, job_embedding, pro, min_score)
+                if match is not None and (after is None or match_sort_key(match) > (-after[0], after[1])):
+                    yield match
         
-        logger.info(f"Found {len(matches)} matches (min_score={min_score})")
-        return matches[:top_n]
+        # Keep only the best top_n, so memory does not grow with the candidate set
+        matches = heapq.nsmallest(top_n, candidates(), key=match_sort_key)
+        
+        if not scored:
+            logger.warning("No professionals provided for matching")
+        logger.info(f"Matched job '{job.title}' against {scored} professionals "
+                    f"(min_score={min_score}, returned={len(matches)})")
+        return matches
+    
+    def _score(self, job: Job, job_embedding, pro: Professional, min_score: float) -> Optional[Dict[str, Any]]:
+        """Score one professional, or None if below min_score or on error."""
+        try:
+            # Calculate skill similarity
+            pro_embedding = self._get_professional_embedding(pro)
+            similarity = cosine_similarity(job_embedding, pro_embedding)
+            
+            # Calculate distance score if location data is available
+            if None not in (job.location_lat, job.location_lng, pro.latitude, pro.longitude):
+                distance_score = self._calculate_normalized_distance_score(
+                    job.location_lat, job.location_lng,
+                    pro.latitude, pro.longitude
+                )
+            else:
+                distance_score = 0.5  # Neutral score if location data is missing
+            
+            # Calculate combined score
+            combined_score = (
+                (similarity * self.similarity_weight) +
+                (distance_score * self.distance_weight)
+            )
+            
+            # Apply minimum score threshold
+            if combined_score < min_score:
+                return None
+            distance = calculate_distance(
+                job.location_lat, job.location_lng,
+                pro.latitude, pro.longitude
+            )
+            return {
+                "professional": pro,
+                "score": round(combined_score, 3),
+                "similarity": round(similarity, 3),
+                "distance_score": round(distance_score, 3),
+                "distance_km": round(distance, 2) if distance is not None else None
+            }
+                
+        except Exception as e:
+            logger.error(f"Error processing professional {getattr(pro, 'id', 'unknown')}: {e}")
+            return None
+
+def match_sort_key(match: Dict[str, Any]) -> Tuple[float, int]:
+    """Ranking order of matches: best score first, ties by professional id."""
+    return (-match["score"], match["professional"].id)
 
 def match_professionals(
     job: Job,
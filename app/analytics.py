@@ -0,0 +1,201 @@
+"""
+Hourly and daily rollups for the admin analytics pages.
+
+Every metric is a count (and, where it means something, a sum) of rows of a
+source table grouped by an hour of their created_at and one dimension:
+
+- jobs: jobs posted, by profession
+- suggestions: AI suggestions, by outcome (pending, contacted, interested,
+  declined); the total is the summed match score
+- payments: payments, by status; the total is the amount
+- bookings: bookings made, by status
+
+Results live in analytics_rollups, one row per (metric, period, bucket,
+dimension), so the admin pages and /admin/api/analytics read a few hundred
+rows however much history there is.
+
+`flask analytics rollup` is meant to run from cron every few minutes. It
+recomputes the hours from ANALYTICS_LOOKBACK_HOURS before the newest
+rolled-up hour until now: rows whose outcome or status changes after they
+were created, and rows deleted since, are picked up as long as that happens
+within the lookback. Each hour is recomputed from its source rows (a range
+on the created_at indexes) and the days it touches are re-summed from the
+hourly rows. `flask analytics backfill` does the same for all history, a
+chunk of days per transaction. Buckets are UTC.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from app import db
+from app.modules import AISuggestion, AnalyticsRollup, Booking, Job, Payment
+
+PERIODS = ('hour', 'day')
+
+Metric = namedtuple('Metric', 'model timestamp dimension total')
+
+METRICS = {
+    'jobs': Metric(Job, Job.created_at, func.coalesce(Job.profession, ''), None),
+    'suggestions': Metric(
+        AISuggestion, AISuggestion.created_at,
+        case((AISuggestion.is_interested.is_(True), 'interested'),
+             (AISuggestion.is_interested.is_(False), 'declined'),
+             (AISuggestion.is_contacted.is_(True), 'contacted'),
+             else_='pending'),
+        AISuggestion.score,
+    ),
+    'payments': Metric(Payment, Payment.created_at, func.coalesce(Payment.status, 'pending'), Payment.amount),
+    'bookings': Metric(Booking, Booking.created_at, func.coalesce(Booking.status, 'pending'), None),
+}
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _truncate(column, period):
+    """SQL start of the hour or day containing `column`."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:00:00' if period == 'hour' else '%Y-%m-%d 00:00:00', column)
+    return func.date_trunc(period, column)
+
+
+def _as_datetime(value):
+    # SQLite returns the strftime() text; PostgreSQL a timestamp.
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def source_query(metric, start, end):
+    """Select (bucket, dimension, count, total) of `metric` per hour in [start, end)."""
+    spec = METRICS[metric]
+    bucket = _truncate(spec.timestamp, 'hour')
+    total = func.coalesce(func.sum(spec.total), 0) if spec.total is not None else literal(0)
+    return (select(bucket.label('bucket'), spec.dimension.label('dimension'),
+                   func.count().label('count'), total.label('total'))
+            .where(spec.timestamp >= start, spec.timestamp < end)
+            .group_by(bucket, spec.dimension))
+
+
+def _replace(period, start, end, rows):
+    db.session.execute(delete(AnalyticsRollup).where(
+        AnalyticsRollup.period == period, AnalyticsRollup.bucket >= start, AnalyticsRollup.bucket < end))
+    if rows:
+        db.session.execute(insert(AnalyticsRollup), rows)
+
+
+def refresh(start, end):
+    """Recompute every metric's hourly rollups in [start, end) and the daily
+    rollups of the days they fall in. Returns the number of rows written;
+    the caller commits."""
+    start, end = floor_hour(start), floor_hour(end - timedelta(microseconds=1)) + timedelta(hours=1)
+    hourly = []
+    for metric in METRICS:
+        for bucket, dimension, count, total in db.session.execute(source_query(metric, start, end)):
+            hourly.append({'metric': metric, 'period': 'hour', 'bucket': _as_datetime(bucket),
+                           'dimension': dimension, 'count': count, 'total': float(total or 0)})
+    _replace('hour', start, end, hourly)
+
+    day_start, day_end = floor_day(start), floor_day(end - timedelta(microseconds=1)) + timedelta(days=1)
+    day = _truncate(AnalyticsRollup.bucket, 'day')
+    daily = [
+        {'metric': metric, 'period': 'day', 'bucket': _as_datetime(bucket), 'dimension': dimension,
+         'count': count, 'total': float(total or 0)}
+        for metric, bucket, dimension, count, total in db.session.execute(
+            select(AnalyticsRollup.metric, day, AnalyticsRollup.dimension,
+                   func.sum(AnalyticsRollup.count), func.sum(AnalyticsRollup.total))
+            .where(AnalyticsRollup.period == 'hour', AnalyticsRollup.bucket >= day_start,
+                   AnalyticsRollup.bucket < day_end)
+            .group_by(AnalyticsRollup.metric, day, AnalyticsRollup.dimension))
+    ]
+    _replace('day', day_start, day_end, daily)
+    return len(hourly) + len(daily)
+
+
+def roll_up(now=None):
+    """Incremental run: refresh from the lookback before the newest hourly
+    bucket (or before now, if nothing is rolled up yet) until now."""
+    now = now or datetime.utcnow()
+    lookback = timedelta(hours=current_app.config.get('ANALYTICS_LOOKBACK_HOURS', 48))
+    newest = db.session.scalar(select(func.max(AnalyticsRollup.bucket)).where(AnalyticsRollup.period == 'hour'))
+    start = min(_as_datetime(newest) or now, now) - lookback
+    written = refresh(start, now)
+    db.session.commit()
+    return start, written
+
+
+def earliest_source_time():
+    times = [db.session.scalar(select(func.min(spec.timestamp))) for spec in METRICS.values()]
+    times = [_as_datetime(t) for t in times if t is not None]
+    return min(times) if times else None
+
+
+def backfill(since=None, until=None, chunk_days=None, log=None):
+    """Rebuild all rollups from `since` (default: the oldest source row), one
+    chunk of days per transaction. Returns the number of rows written."""
+    chunk = timedelta(days=chunk_days or current_app.config.get('ANALYTICS_BACKFILL_CHUNK_DAYS', 7))
+    until = until or datetime.utcnow()
+    since = since or earliest_source_time()
+    if since is None:
+        return 0
+    written = 0
+    start = floor_day(since)
+    while start < until:
+        end = min(start + chunk, until)
+        written += refresh(start, end)
+        db.session.commit()
+        if log:
+            log(f'{start:%Y-%m-%d} .. {end:%Y-%m-%d %H:%M}: {written} rows so far')
+        start = end
+    return written
+
+
+def series_query(metric, period, start, end):
+    """Select (bucket, dimension, count, total) rollups of `metric` in [start, end)."""
+    return (select(AnalyticsRollup.bucket, AnalyticsRollup.dimension, AnalyticsRollup.count, AnalyticsRollup.total)
+            .where(AnalyticsRollup.metric == metric, AnalyticsRollup.period == period,
+                   AnalyticsRollup.bucket >= start, AnalyticsRollup.bucket < end)
+            .order_by(AnalyticsRollup.bucket, AnalyticsRollup.dimension))
+
+
+def series(metric, period, start, end):
+    """Rolled-up rows of `metric` in [start, end), oldest bucket first."""
+    return [{'bucket': bucket.isoformat(), 'dimension': dimension, 'count': count, 'total': total}
+            for bucket, dimension, count, total in db.session.execute(series_query(metric, period, start, end))]
+
+
+def totals(metric, start, end):
+    """{dimension: (count, total)} of `metric` over the days in [start, end)."""
+    rows = db.session.execute(
+        select(AnalyticsRollup.dimension, func.sum(AnalyticsRollup.count), func.sum(AnalyticsRollup.total))
+        .where(AnalyticsRollup.metric == metric, AnalyticsRollup.period == 'day',
+               AnalyticsRollup.bucket >= start, AnalyticsRollup.bucket < end)
+        .group_by(AnalyticsRollup.dimension)
+    )
+    return {dimension: (count, total) for dimension, count, total in rows}
+
+
+analytics_cli = AppGroup('analytics', help='Maintain the admin analytics rollups.')
+
+
+@analytics_cli.command('rollup')
+def rollup_command():
+    """Refresh recent rollups (run from cron)."""
+    start, written = roll_up()
+    click.echo(f'Rolled up {written} rows since {start:%Y-%m-%d %H:%M}.')
+
+
+@analytics_cli.command('backfill')
+@click.option('--since', type=click.DateTime(), help='Start date, UTC (default: the oldest data).')
+@click.option('--chunk-days', type=int, help='Days per transaction (default: ANALYTICS_BACKFILL_CHUNK_DAYS).')
+def backfill_command(since, chunk_days):
+    """Rebuild rollups for all history, or from --since."""
+    written = backfill(since=since, chunk_days=chunk_days, log=click.echo)
+    click.echo(f'Backfilled {written} rollup rows.')
@@ -0,0 +1,136 @@
+"""
+Fingerprinted static assets.
+
+`flask assets build` copies every file under the static folder (except
+uploads and sources) into static/dist/ with a content hash in its name,
+writes gzip and, if the Brotli package is installed, brotli variants of
+text assets, and records the mapping in static/dist/manifest.json.
+
+With ASSET_MANIFEST on (production), url_for('static', filename=...) returns
+the hashed copy, which WhiteNoise serves with a one-year immutable
+Cache-Control, so a changed file simply gets a new URL. Files missing from
+the manifest keep their plain URL and STATIC_MAX_AGE. Development leaves
+ASSET_MANIFEST off and has WhiteNoise re-scan the static folder on each
+request, so edits show up on reload.
+"""
+import hashlib
+import json
+import os
+import re
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from whitenoise.compress import Compressor
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+SKIP_DIRS = frozenset({'uploads', 'src', DIST_DIR})
+HASH_LENGTH = 12
+
+# URLs of hashed copies, e.g. /static/dist/css/tailwind.0123456789ab.css
+IMMUTABLE_RE = re.compile(r'/%s/.+\.[0-9a-f]{%d}\.[^./]+$' % (DIST_DIR, HASH_LENGTH))
+
+
+def hashed_name(path, content):
+    base, ext = os.path.splitext(path)
+    return f'{base}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.samefile(root, static_folder):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def build_assets(static_folder, clean=False, log=None):
+    """Write hashed copies, compressed variants and the manifest; returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    compressor = Compressor(extensions=Compressor.SKIP_COMPRESS_EXTENSIONS + ('avif',), quiet=True)
+    manifest = {}
+    for name, path in sorted(_source_files(static_folder)):
+        with open(path, 'rb') as f:
+            content = f.read()
+        target_name = hashed_name(name, content)
+        target = os.path.join(dist, *target_name.split('/'))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            if compressor.should_compress(target):
+                compressor.compress(target)
+            if log:
+                log(f'{name} -> {DIST_DIR}/{target_name}')
+        manifest[name] = f'{DIST_DIR}/{target_name}'
+
+    if clean:
+        _remove_stale(dist, set(manifest.values()))
+
+    tmp = os.path.join(dist, MANIFEST_NAME + '.tmp')
+    os.makedirs(dist, exist_ok=True)
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist, MANIFEST_NAME))
+    return manifest
+
+
+def _remove_stale(dist, keep):
+    for root, dirs, files in os.walk(dist):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = f'{DIST_DIR}/' + os.path.relpath(path, dist).replace(os.sep, '/')
+            original = relative[:-3] if relative.endswith(('.gz', '.br')) else relative
+            if original not in keep and name != MANIFEST_NAME:
+                os.remove(path)
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def init_assets(app):
+    """Emit hashed static URLs when ASSET_MANIFEST is on and a manifest exists."""
+    app.config.setdefault('ASSET_MANIFEST', False)
+    app.config.setdefault('STATIC_MAX_AGE', 0)
+    app.cli.add_command(assets_cli)
+    if not app.config['ASSET_MANIFEST']:
+        return
+
+    manifest = load_manifest(app.static_folder)
+    if manifest is None:
+        app.logger.warning('ASSET_MANIFEST is on but no manifest was found; '
+                           'run `flask assets build`. Serving unhashed static URLs.')
+        return
+    app.extensions['asset_manifest'] = manifest
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+
+def is_immutable(path, url):
+    """WhiteNoise immutable_file_test: true for hashed copies under dist/."""
+    return bool(IMMUTABLE_RE.search(url))
+
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+@assets_cli.command('build')
+@click.option('--clean', is_flag=True, help='Remove hashed files no longer in the manifest.')
+def build_command(clean):
+    """Hash, copy and compress static files and write the manifest."""
+    manifest = build_assets(current_app.static_folder, clean=clean, log=click.echo)
+    click.echo(f'Wrote {len(manifest)} entries to {DIST_DIR}/{MANIFEST_NAME}.')
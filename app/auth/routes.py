@@ -1,11 +1,22 @@
 from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, current_user, login_required
-from app import db
+from app import db, limiter
 from app.models import User
 from app.auth import bp
 from app.auth.forms import LoginForm, RegistrationForm
+from app.identity_cache import invalidate, remember
+from app.passwords import HashingBusy
+from app.ratelimit import config_limit
+
+def _busy(template, title, form):
+    """Shed load when the password hashing pool is saturated."""
+    flash('We are receiving too many sign-in requests. Please try again shortly.', 'error')
+    response = current_app.make_response((render_template(template, title=title, form=form), 503))
+    response.headers['Retry-After'] = '5'
+    return response
 
 @bp.route('/login', methods=['GET', 'POST'])
+@limiter.limit(config_limit('RATELIMIT_LOGIN'), methods=['POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -13,10 +24,23 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            return _busy('auth/login.html', 'Sign In', form)
+        if not valid:
             flash('Invalid email or password', 'error')
             return redirect(url_for('auth.login'))
+        if user.password_needs_rehash():
+            # Hashing parameters changed since this hash was made; upgrade it,
+            # or leave that to a later login if the pool is busy
+            try:
+                user.set_password(form.password.data)
+                db.session.commit()
+            except HashingBusy:
+                pass
         login_user(user, remember=form.remember_me.data)
+        remember(user)
         next_page = request.args.get('next')
         if not next_page:
             if user.role == 'admin':
@@ -29,10 +53,13 @@ def login():
 
 @bp.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        invalidate(current_user.id)
     logout_user()
     return redirect(url_for('main.index'))
 
 @bp.route('/register', methods=['GET', 'POST'])
+@limiter.limit(config_limit('RATELIMIT_REGISTER'), methods=['POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -51,6 +78,9 @@ def register():
             db.session.commit()
             flash('Congratulations, you are now a registered user!', 'success')
             return redirect(url_for('auth.login'))
+        except HashingBusy:
+            db.session.rollback()
+            return _busy('auth/register.html', 'Register', form)
         except Exception as e:
             current_app.logger.error(f'Error saving user to database: {e}')
             db.session.rollback()
@@ -0,0 +1,72 @@
+"""
+Small in-process caches shared by the identity, response and template caches.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from app.metrics import record_cache
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL.
+
+    Lookups are counted in the `skillhub_cache_requests` metric under `name`.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is not None and expires <= now:
+                    del self._data[key]
+                    entry = _MISSING
+                else:
+                    self._data.move_to_end(key)
+        record_cache(self.name, entry is not _MISSING)
+        return default if entry is _MISSING else value
+
+    def peek(self, key, default=None):
+        """Like get() but without counting the lookup or refreshing recency."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key satisfies `predicate`."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
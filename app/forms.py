@@ -29,5 +29,5 @@ class LoginForm(FlaskForm):
     submit = SubmitField('Sign In')
 
 class UpdateProfileForm(FlaskForm):
-    picture = FileField('Update Profile Picture', validators=[FileAllowed(['jpg', 'png'])])
+    picture = FileField('Update Profile Picture', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'webp'])])
     submit = SubmitField('Update')
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Template fragment caching.
+
+    {% cache 'footer' %}...{% endcache %}
+    {% cache 'nav', 600, vary='user' %}...{% endcache %}
+    {% cache ('dashboard-cards', current_user.role), vary='role' %}...{% endcache %}
+
+The body is rendered once and its HTML kept in an LRU cache for `ttl`
+seconds (FRAGMENT_CACHE_TTL when omitted, 0 for no expiry). Entries are
+keyed on the template, the key expression and a variant:
+
+- no `vary`: one copy for everyone, so the body must not show anything
+  user-specific (CSRF tokens included);
+- vary='user': one copy per logged-in user plus one for anonymous visitors;
+- vary='role': one copy per set of role names plus one for anonymous
+  visitors.
+
+Put whatever else the body depends on (an id, an updated_at) in the key.
+Per-user copies are dropped when this process commits a change to that
+user; invalidate_fragments() drops anything else explicitly. Other workers
+converge within the TTL.
+"""
+from flask import current_app, has_request_context
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+
+from app.cache import LRUCache
+from app.database import RoutingSession
+
+VARIANTS = (None, 'user', 'role')
+
+fragment_cache = LRUCache('template_fragment', maxsize=2048, ttl=300)
+
+
+def configure_fragment_cache(app):
+    app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+    app.config.setdefault('FRAGMENT_CACHE_MAXSIZE', 2048)
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+    fragment_cache.maxsize = app.config['FRAGMENT_CACHE_MAXSIZE']
+    fragment_cache.ttl = app.config['FRAGMENT_CACHE_TTL']
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def _fragment_name(key):
+    return key[0] if isinstance(key, tuple) and key else key
+
+
+def _variant(vary):
+    if vary is None:
+        return None
+    if not current_user.is_authenticated:
+        return ('anonymous',)
+    if vary == 'user':
+        return ('user', int(current_user.get_id()))
+    return ('role', tuple(sorted(current_user.get_role_names())))
+
+
+def invalidate_fragments(name=None, user_id=None):
+    """Drop cached fragments.
+
+    `name` matches the key, or its first element when the key is a tuple;
+    `user_id` limits it to that user's vary='user' copies. With neither,
+    everything is dropped.
+    """
+    if name is None and user_id is None:
+        fragment_cache.clear()
+        return
+    fragment_cache.delete_where(
+        lambda k: (name is None or _fragment_name(k[1]) == name)
+        and (user_id is None or k[2] == ('user', user_id))
+    )
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension adding the {% cache key[, ttl][, vary=...] %} tag."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        ttl = nodes.Const(None)
+        vary = nodes.Const(None)
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.test('name') and parser.stream.look().test('assign'):
+                option = next(parser.stream).value
+                next(parser.stream)
+                if option != 'vary':
+                    parser.fail(f'unknown cache option {option!r}', lineno)
+                vary = parser.parse_expression()
+            else:
+                ttl = parser.parse_expression()
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        args = [nodes.Const(parser.name), key, ttl, vary]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template, key, ttl, vary, caller):
+        if vary not in VARIANTS:
+            raise ValueError(f'cache vary must be one of {VARIANTS}, not {vary!r}')
+        if not current_app.config.get('FRAGMENT_CACHE_ENABLED', True) or (vary and not has_request_context()):
+            return caller()
+
+        cache_key = (template, key, _variant(vary))
+        html = fragment_cache.get(cache_key)
+        if html is None:
+            html = Markup(caller())
+            fragment_cache.set(cache_key, html, ttl)
+        return html
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _collect_changed_users(session, flush_context, instances):
+    from app.modules import User
+
+    ids = session.info.setdefault('fragment_invalidate', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            ids.add(obj.id)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_on_commit(session):
+    for user_id in session.info.pop('fragment_invalidate', ()):
+        invalidate_fragments(user_id=user_id)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('fragment_invalidate', None)
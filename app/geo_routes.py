@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, current_app, request, jsonify, render_template
 from sqlalchemy import text
 from app import db
+from app.database import read_only
+from app.http_cache import cached_json
+from app.map_clusters import clusters_for, tile_range
+from app.pagination import (InvalidCursor, encode_cursor, ndjson_response, next_page_url,
+                            page_size, request_cursor, wants_ndjson)
 
 # Blueprint for geo-related routes
 geo_bp = Blueprint("geo", __name__)
@@ -12,6 +17,8 @@ def _is_postgres() -> bool:
         return False
 
 @geo_bp.route("/api/professionals/nearby")
+@read_only
+@cached_json("professionals")
 def get_nearby():
     if not _is_postgres():
         return (
@@ -36,29 +43,96 @@ def get_nearby():
     )
 
     results = db.session.execute(query, {"lat": lat, "lon": lon, "radius": radius}).mappings().all()
-    return jsonify([dict(row) for row in results])
+    # RowMappings are serialized directly by the JSON provider
+    return jsonify(results)
 
 @geo_bp.route("/map")
 def map_page():
     return render_template("map.html")
 
+@geo_bp.route('/api/map/clusters')
+@read_only
+def get_map_clusters():
+    """Clustered professionals covering the map viewport.
+
+    `bbox` is west,south,east,north in degrees and `zoom` the map zoom level.
+    Each cluster has a centroid, a count and its most common profession.
+    """
+    try:
+        west, south, east, north = (float(v) for v in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    zoom = request.args.get('zoom', type=int)
+    if zoom is None:
+        return jsonify({"error": "zoom is required"}), 400
+    zoom = max(0, min(zoom, current_app.config['MAP_MAX_ZOOM']))
+
+    try:
+        xs, ys = tile_range(west, south, east, north, zoom)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(xs) * len(ys) > current_app.config['MAP_MAX_TILES']:
+        return jsonify({"error": "Viewport is too large for this zoom level"}), 400
+
+    return jsonify({"zoom": zoom, "clusters": clusters_for(zoom, xs, ys)})
+
 @geo_bp.route('/api/nearby-professionals')
+@read_only
+@cached_json('professionals')
 def get_nearby_professionals():
+    """Professionals within `radius` metres, nearest first.
+
+    Returns `limit` rows as a JSON array with the next page in a Link header
+    (?cursor=...), or streams every remaining row as NDJSON when asked to.
+    """
     lat = request.args.get('lat', type=float)
     lon = request.args.get('lon', type=float)
     radius = request.args.get('radius', 10000, type=int)  # Default 10km radius
     
     if not lat or not lon:
         return jsonify({"error": "Latitude and longitude are required"}), 400
-    
-    query = """
-    SELECT id, full_name, profession, rating,
-    ST_AsText(location) AS coords,
-    ST_Distance(location, ST_MakePoint(:lon, :lat)::geography) AS distance
-    FROM professionals
-    WHERE ST_DWithin(location, ST_MakePoint(:lon, :lat)::geography, :radius)
-    ORDER BY distance ASC;
-    """
-    
-    results = db.session.execute(query, {"lat": lat, "lon": lon, "radius": radius}).mappings().all()
-    return jsonify([dict(row) for row in results])
+
+    try:
+        after = request_cursor(float, int)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    params = {"lat": lat, "lon": lon, "radius": radius}
+    keyset = ""
+    if after:
+        keyset = "WHERE (distance, id) > (:after_distance, :after_id)"
+        params.update(after_distance=after[0], after_id=after[1])
+    streaming = wants_ndjson()
+    limit = ""
+    if not streaming:
+        # One extra row tells us whether there is a next page.
+        limit = "LIMIT :limit"
+        params["limit"] = page_size() + 1
+
+    query = text(f"""
+    SELECT * FROM (
+        SELECT id, full_name, profession, rating,
+        ST_AsText(location) AS coords,
+        ST_Distance(location, ST_MakePoint(:lon, :lat)::geography) AS distance
+        FROM professionals
+        WHERE ST_DWithin(location, ST_MakePoint(:lon, :lat)::geography, :radius)
+    ) AS nearby
+    {keyset}
+    ORDER BY distance ASC, id ASC
+    {limit};
+    """)
+
+    if streaming:
+        query = query.execution_options(stream_results=True,
+                                         yield_per=current_app.config['API_STREAM_BATCH'])
+        result = db.session.execute(query, params)
+        return ndjson_response(result.mappings().partitions())
+
+    results = db.session.execute(query, params).mappings().all()
+    page = results[:params["limit"] - 1]
+    # RowMappings are serialized directly by the JSON provider
+    response = jsonify(page)
+    if len(results) > len(page):
+        last = page[-1]
+        response.headers['Link'] = f'<{next_page_url(encode_cursor(last["distance"], last["id"]))}>; rel="next"'
+    return response
@@ -0,0 +1,149 @@
+"""
+Conditional GET and server-side caching for JSON endpoints.
+
+`cached_json('professionals', ...)` keys a view's response on the request
+(endpoint, path, sorted query string) plus the current versions of the
+tables it reads. The same key yields a strong ETag, so a client repeating a
+poll with If-None-Match gets a 304 after a single primary-key lookup, and a
+client without the validator gets the serialized body from an LRU+TTL cache
+instead of re-running the view.
+
+Table versions live in `data_versions` and are bumped inside the writing
+transaction for any table a cached endpoint depends on. Writes made with raw
+SQL bypass this and are only picked up when the TTL expires.
+"""
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.cache import LRUCache
+from app.database import RoutingSession
+
+response_cache = LRUCache('http_response', maxsize=2048, ttl=300)
+
+# Tables some cached endpoint depends on; only these get version bumps.
+_tracked_tables = set()
+
+
+def configure_http_cache(app):
+    app.config.setdefault('HTTP_CACHE_MAXSIZE', 2048)
+    app.config.setdefault('HTTP_CACHE_TTL', 300)
+    response_cache.maxsize = app.config['HTTP_CACHE_MAXSIZE']
+    response_cache.ttl = app.config['HTTP_CACHE_TTL']
+
+
+def track_tables(*tables):
+    """Start versioning `tables` so data_version() reflects writes to them."""
+    _tracked_tables.update(tables)
+
+
+def data_version(*tables):
+    """Current version of each table, as a tuple in argument order."""
+    from app.modules import DataVersion
+
+    rows = dict(db.session.execute(
+        select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(tables))
+    ).all())
+    return tuple(rows.get(name, 0) for name in tables)
+
+
+def _bump_versions(connection, tables):
+    from app.modules import DataVersion
+
+    table = DataVersion.__table__
+    dialect = connection.dialect.name
+    for name in sorted(tables):
+        if dialect in ('sqlite', 'postgresql'):
+            insert = (sqlite if dialect == 'sqlite' else postgresql).insert
+            stmt = insert(table).values(name=name, version=1)
+            stmt = stmt.on_conflict_do_update(index_elements=['name'],
+                                              set_={'version': table.c.version + 1})
+            connection.execute(stmt)
+        elif connection.execute(update(table).where(table.c.name == name)
+                                .values(version=table.c.version + 1)).rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1))
+
+
+def mark_touched(session, *tables):
+    """Bump `tables` in the current flush even though no object of theirs was
+    pending when it started, e.g. rows another before_flush listener changes."""
+    session.info.setdefault('touched_tables', set()).update(t for t in tables if t in _tracked_tables)
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _collect_touched_tables(session, flush_context, instances):
+    touched = session.info.setdefault('touched_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = getattr(obj, '__tablename__', None)
+        if name in _tracked_tables:
+            touched.add(name)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _bump_touched_tables(session, flush_context):
+    touched = session.info.pop('touched_tables', None)
+    if touched:
+        _bump_versions(session.connection(), touched)
+        # Lets in-process caches that apply their own deltas (app/map_clusters.py)
+        # know how far this transaction moved each version.
+        bumps = session.info.setdefault('version_bumps', {})
+        for name in touched:
+            bumps[name] = bumps.get(name, 0) + 1
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _bump_on_bulk_dml(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    name = mapper.local_table.name if mapper is not None else None
+    if name in _tracked_tables:
+        _bump_versions(orm_execute_state.session.connection(), {name})
+
+
+def cached_json(*tables, vary_on_user=False):
+    """Cache a JSON GET view and answer conditional requests with 304.
+
+    `tables` are the tables whose contents determine the response. Set
+    `vary_on_user` when the body depends on who is logged in. Place the
+    decorator below login_required so authentication still runs first.
+    """
+    track_tables(*tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config.get('HTTP_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+
+            user_key = current_user.get_id() if vary_on_user else None
+            key = (request.endpoint, request.path, tuple(sorted(request.args.items(multi=True))),
+                   user_key, data_version(*tables))
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(key)
+                if cached is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    headers = [(name, value) for name, value in response.headers
+                               if name not in ('Content-Type', 'Content-Length')]
+                    response_cache.set(key, (response.get_data(), response.mimetype, headers))
+                else:
+                    body, mimetype, headers = cached
+                    response = Response(body, mimetype=mimetype, headers=headers)
+
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate on every poll.
+            response.headers['Cache-Control'] = 'private, no-cache' if vary_on_user else 'no-cache'
+            return response
+        return wrapper
+    return decorator
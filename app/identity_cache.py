@@ -0,0 +1,112 @@
+"""
+Per-process cache of logged-in users and their role names.
+
+`load_user` rebuilds the User from a cached column snapshot and merges it
+into the session without a SELECT. Entries expire after IDENTITY_CACHE_TTL
+seconds and are dropped as soon as this process flushes a change to the
+user or to role memberships; other workers converge within the TTL.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+from app.cache import LRUCache
+from app.database import RoutingSession
+
+# Never kept in memory; loaded on demand if something reads them.
+SENSITIVE_COLUMNS = frozenset({'password_hash', 'verification_token', 'reset_token', 'reset_token_expires'})
+
+identity_cache = LRUCache('identity', maxsize=4096, ttl=60)
+
+
+def configure_identity_cache(app):
+    app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+    identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+
+
+def remember(user):
+    """Cache a snapshot of `user` (columns plus role names)."""
+    if not identity_cache.ttl or user.id is None:
+        return
+    state = inspect(user)
+    columns = {
+        attr.key: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict and attr.key not in SENSITIVE_COLUMNS
+    }
+    identity_cache.set(user.id, (columns, user.get_role_names()))
+
+
+def load_cached_user(user_id):
+    """Return the user for `user_id`, from the cache when possible."""
+    from app.models import User
+
+    entry = identity_cache.get(user_id) if identity_cache.ttl else None
+    if entry is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            remember(user)
+        return user
+
+    columns, role_names = entry
+    user = User(**columns)
+    make_transient_to_detached(user)
+    user = db.session.merge(user, load=False)
+    user._role_names = role_names
+    return user
+
+
+def invalidate(user_id=None):
+    """Forget one user, or everyone when `user_id` is None."""
+    if user_id is None:
+        identity_cache.clear()
+    else:
+        identity_cache.delete(user_id)
+
+
+def _pending_invalidations(session):
+    from app.modules import Role, User
+
+    ids = session.info.setdefault('identity_invalidate', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            ids.add(obj.id)
+            obj.__dict__.pop('_role_names', None)
+        elif isinstance(obj, Role):
+            ids.add(None)
+    return ids
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _collect_identity_changes(session, flush_context, instances):
+    _pending_invalidations(session)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _invalidate_on_flush(session, flush_context):
+    for user_id in session.info.get('identity_invalidate', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_on_commit(session):
+    # Repeat after commit so a concurrent request cannot re-cache the
+    # pre-commit row between our flush and commit.
+    for user_id in session.info.pop('identity_invalidate', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('identity_invalidate', None)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _invalidate_on_bulk_dml(orm_execute_state):
+    from app.modules import Role, User
+
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (User, Role):
+        invalidate()
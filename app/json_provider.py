@@ -0,0 +1,62 @@
+"""
+JSON provider backed by orjson, with the stdlib encoder as fallback.
+
+orjson serializes dicts, lists and dataclasses in C and writes bytes
+directly into the response. Types it does not know (SQLAlchemy rows,
+Decimal, anything with __html__) go through `default`, which also keeps
+Flask's RFC 822 formatting for datetimes. Keys are not sorted.
+"""
+from flask.json.provider import DefaultJSONProvider, _default
+from sqlalchemy.engine import Row, RowMapping
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is not installed
+    orjson = None
+
+
+def _default_with_rows(o):
+    if isinstance(o, RowMapping):
+        return dict(o)
+    if isinstance(o, Row):
+        return o._asdict()
+    return _default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using orjson when it is installed."""
+
+    default = staticmethod(_default_with_rows)
+    sort_keys = False
+    ensure_ascii = False
+
+    def _orjson_options(self, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serialize `obj` to UTF-8 bytes."""
+        if orjson is None:
+            kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+            return self.dumps(obj, **kwargs).encode('utf-8')
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default,
+                            option=self._orjson_options(bool(kwargs.get('indent')))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
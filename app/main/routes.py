@@ -3,28 +3,15 @@ from flask_login import login_required, current_user
 from app.main import bp
 from app.forms import JobForm, UpdateProfileForm
 from app import db
-import os
-import secrets
-from PIL import Image
-
-def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/uploads/profiles', picture_fn)
-
-    output_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-
-    return picture_fn
+from app.database import read_only
+from app.media import ImageRejected, image_pipeline, profile_image_url
 
 @bp.route('/')
 def index():
     return render_template('index.html', title='Home')
 
 @bp.route('/dashboard')
+@read_only
 @login_required
 def dashboard():
     """Dashboard route that requires authentication."""
@@ -36,12 +23,16 @@ def profile():
     form = UpdateProfileForm()
     if form.validate_on_submit():
         if form.picture.data:
-            picture_file = save_picture(form.picture.data)
-            current_user.profile_picture = picture_file
+            try:
+                # Variants render in the background; a placeholder shows until then.
+                current_user.profile_picture = image_pipeline.save_profile_picture(form.picture.data)
+            except ImageRejected as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.profile'))
             db.session.commit()
             flash('Your profile has been updated!', 'success')
         return redirect(url_for('main.profile'))
-    image_file = url_for('static', filename='uploads/profiles/' + current_user.profile_picture)
+    image_file = profile_image_url(current_user.profile_picture)
     return render_template('profile.html', title='Profile', image_file=image_file, form=form)
 
 @bp.route('/post_job', methods=['GET', 'POST'])
@@ -0,0 +1,333 @@
+"""
+Grid clustering of professionals for the map page.
+
+The map sends its bounding box and zoom level. The box is covered with
+standard Web Mercator ("slippy map") tiles, and each tile is split into a
+GRID x GRID grid of cells. Available professionals are aggregated per cell
+into a count, a centroid and the most common profession, so the size of a
+response depends on the viewport rather than on how many professionals it
+contains.
+
+Cell aggregates are kept in a per-process tile index covering every zoom
+level. A tile is aggregated from the database the first time it is asked
+for; after that, commits in this process that change a professional's
+coordinates, profession or availability are applied to the cached tiles
+as deltas (remove from the old cell, add to the new one at each zoom), so
+a warm tile is a dictionary lookup. A tile read while such a commit is in
+flight (flushed, but its deltas not applied yet) may already contain the
+change, so it is served but not cached. Each request compares the index with
+the `professionals` data version; writes made by other processes move the
+version past what the index has applied and drop it, so tiles are rebuilt
+from the database on demand. Tiles are evicted LRU and after a TTL.
+"""
+import math
+import threading
+from collections import Counter
+
+from sqlalchemy import event, inspect
+
+from app import db
+from app.cache import LRUCache
+from app.database import RoutingSession
+from app.http_cache import data_version, track_tables
+from app.modules import Professional
+
+GRID = 8
+MAX_LAT = 85.05112878  # Web Mercator cuts off at +/- this latitude
+
+# Columns whose changes move a professional between clusters.
+CLUSTER_COLUMNS = ('latitude', 'longitude', 'profession', 'is_available')
+
+track_tables('professionals')
+
+
+def configure_map_clusters(app):
+    app.config.setdefault('MAP_MAX_ZOOM', 18)
+    app.config.setdefault('MAP_MAX_TILES', 64)
+    app.config.setdefault('MAP_TILE_CACHE_SIZE', 4096)
+    app.config.setdefault('MAP_TILE_CACHE_TTL', 600)
+    tile_index.configure(app.config['MAP_MAX_ZOOM'], app.config['MAP_TILE_CACHE_SIZE'],
+                         app.config['MAP_TILE_CACHE_TTL'])
+
+
+def tile_coords(lat, lon, zoom):
+    """Fractional tile coordinates (x, y) of a point at `zoom`."""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def cell_for(lat, lon, zoom):
+    """Global grid cell (x, y) containing a point; tile is (x // GRID, y // GRID)."""
+    x, y = tile_coords(lat, lon, zoom)
+    last = 2 ** zoom * GRID - 1
+    return (max(0, min(int(x * GRID), last)), max(0, min(int(y * GRID), last)))
+
+
+def tile_bounds(zoom, x, y):
+    """(west, south, east, north) of a tile in degrees."""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_range(west, south, east, north, zoom):
+    """Ranges of tile x and y covering a bounding box."""
+    if west > east or south > north:
+        raise ValueError('bbox must be west,south,east,north')
+    last = 2 ** zoom - 1
+    x0, y0 = tile_coords(north, west, zoom)
+    x1, y1 = tile_coords(south, east, zoom)
+    return (range(max(0, int(x0)), min(int(x1), last) + 1),
+            range(max(0, int(y0)), min(int(y1), last) + 1))
+
+
+class Cell:
+    """Running aggregate of the professionals in one grid cell."""
+
+    __slots__ = ('count', 'lat_sum', 'lon_sum', 'professions')
+
+    def __init__(self):
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.professions = Counter()
+
+    def add(self, lat, lon, profession, sign=1):
+        self.count += sign
+        self.lat_sum += sign * lat
+        self.lon_sum += sign * lon
+        self.professions[profession] += sign
+        if self.professions[profession] <= 0:
+            del self.professions[profession]
+
+    def as_cluster(self):
+        # Ties go to the alphabetically first profession so results are stable.
+        profession = min(self.professions.items(), key=lambda item: (-item[1], item[0]))[0]
+        return {
+            'lat': round(self.lat_sum / self.count, 6),
+            'lon': round(self.lon_sum / self.count, 6),
+            'count': self.count,
+            'profession': profession,
+        }
+
+
+class Tile:
+    """Cells of one tile plus its rendered cluster list."""
+
+    __slots__ = ('cells', 'rendered')
+
+    def __init__(self):
+        self.cells = {}
+        self.rendered = None
+
+    def add(self, cell, lat, lon, profession, sign=1):
+        aggregate = self.cells.get(cell)
+        if aggregate is None:
+            aggregate = self.cells[cell] = Cell()
+        aggregate.add(lat, lon, profession, sign)
+        if aggregate.count <= 0:
+            del self.cells[cell]
+        self.rendered = None
+
+    def render(self):
+        return [self.cells[key].as_cluster() for key in sorted(self.cells)]
+
+
+def available_in(west, south, east, north):
+    """Select location and profession of available professionals in a box."""
+    return (
+        db.select(Professional.latitude, Professional.longitude, Professional.profession)
+        .where(Professional.is_available.is_(True),
+               Professional.latitude.between(south, north),
+               Professional.longitude.between(west, east))
+    )
+
+
+def compute_tile(zoom, x, y):
+    """Aggregate one tile from the database."""
+    tile = Tile()
+    for lat, lon, profession in db.session.execute(available_in(*tile_bounds(zoom, x, y))):
+        cell = cell_for(lat, lon, zoom)
+        # Points on a shared edge belong to exactly one tile.
+        if (cell[0] // GRID, cell[1] // GRID) == (x, y):
+            tile.add(cell, lat, lon, profession)
+    return tile
+
+
+class TileIndex:
+    """Per-process multi-zoom index of tile aggregates, kept current by deltas."""
+
+    def __init__(self, max_zoom=18, maxsize=4096, ttl=600):
+        self.max_zoom = max_zoom
+        self.version = None
+        self._tiles = LRUCache('map_tiles', maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Transactions that flushed deltas which are not applied or discarded yet
+        self._in_flight = 0
+
+    def configure(self, max_zoom, maxsize, ttl):
+        self.max_zoom = max_zoom
+        self._tiles.maxsize = maxsize
+        self._tiles.ttl = ttl
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.version = None
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def sync(self, version):
+        """Drop everything unless the index already reflects `version`."""
+        with self._lock:
+            if version != self.version:
+                self._tiles.clear()
+                self.version = version
+                self._generation += 1
+
+    def begin_write(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def end_write(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def clusters(self, zoom, x, y):
+        """Rendered clusters of a tile, aggregating it on first use."""
+        key = (zoom, x, y)
+        tile = self._tiles.get(key)
+        if tile is None:
+            with self._lock:
+                generation, in_flight = self._generation, self._in_flight
+            tile = compute_tile(zoom, x, y)
+            with self._lock:
+                # A delta applied while we were reading would be missing from
+                # this tile, and one committed but not applied yet may be in it
+                # already, so only keep it if no write overlapped the read.
+                if generation == self._generation and not in_flight and not self._in_flight:
+                    self._tiles.set(key, tile)
+        rendered = tile.rendered
+        if rendered is None:
+            with self._lock:
+                rendered = tile.rendered = tile.render()
+        return rendered
+
+    def apply(self, deltas, bumps):
+        """Apply committed (old, new) points; `bumps` is how far the version moved."""
+        with self._lock:
+            self._generation += 1
+            if self.version is None:
+                return
+            for old, new in deltas:
+                for point, sign in ((old, -1), (new, 1)):
+                    if point is None:
+                        continue
+                    lat, lon, profession = point
+                    for zoom in range(self.max_zoom + 1):
+                        cell = cell_for(lat, lon, zoom)
+                        tile = self._tiles.peek((zoom, cell[0] // GRID, cell[1] // GRID))
+                        if tile is not None:
+                            tile.add(cell, lat, lon, profession, sign)
+            self.version += bumps
+
+
+tile_index = TileIndex()
+
+
+def clusters_for(zoom, xs, ys):
+    """Clusters for every tile in the ranges `xs` x `ys`."""
+    tile_index.sync(data_version('professionals')[0])
+    clusters = []
+    for x in xs:
+        for y in ys:
+            clusters.extend(tile_index.clusters(zoom, x, y))
+    return clusters
+
+
+def _point(values):
+    """The clustered point for a row's CLUSTER_COLUMNS values, or None."""
+    lat, lon, profession, available = values
+    if not available or lat is None or lon is None:
+        return None
+    return lat, lon, profession
+
+
+def _old_and_new(obj):
+    """CLUSTER_COLUMNS values as last flushed and as they are now."""
+    state = inspect(obj)
+    old, new = [], []
+    for key in CLUSTER_COLUMNS:
+        current = getattr(obj, key)
+        history = state.attrs[key].history
+        new.append(current)
+        old.append(history.deleted[0] if history.deleted else current)
+    return old, new
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _collect_cluster_deltas(session, flush_context, instances):
+    # Deleted and changed rows are read before the flush, while the old
+    # values can still be loaded; inserts are read after it so that column
+    # defaults (is_available) are filled in.
+    deltas = session.info.setdefault('map_deltas', [])
+    with session.no_autoflush:
+        for obj in session.deleted:
+            if isinstance(obj, Professional):
+                deltas.append((_point(_old_and_new(obj)[0]), None))
+        for obj in session.dirty:
+            if isinstance(obj, Professional):
+                old, new = _old_and_new(obj)
+                if old != new:
+                    deltas.append((_point(old), _point(new)))
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_cluster_inserts(session, flush_context):
+    deltas = session.info.setdefault('map_deltas', [])
+    for obj in session.new:
+        if isinstance(obj, Professional):
+            deltas.append((None, _point([getattr(obj, key) for key in CLUSTER_COLUMNS])))
+    if deltas and not session.info.get('map_in_flight'):
+        session.info['map_in_flight'] = True
+        tile_index.begin_write()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _apply_cluster_deltas(session):
+    deltas = session.info.pop('map_deltas', None)
+    bumps = session.info.pop('version_bumps', {}).get('professionals', 0)
+    if bumps:
+        tile_index.apply(deltas or (), bumps)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_cluster_deltas(session):
+    session.info.pop('map_deltas', None)
+    session.info.pop('version_bumps', None)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _end_cluster_write(session, transaction):
+    # Runs after after_commit has applied the deltas, and on rollback or close.
+    if transaction.parent is None and session.info.pop('map_in_flight', False):
+        tile_index.end_write()
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value when one of these is assigned on an expired
+# instance, so the delta knows which cell the professional is leaving.
+for _key in CLUSTER_COLUMNS:
+    event.listen(getattr(Professional, _key), 'set', _load_old_value, active_history=True)
@@ -0,0 +1,11 @@
+"""Uploaded media: profile picture processing and storage."""
+from app.media.images import (ImagePipeline, ImageRejected, image_pipeline, profile_image_sources,
+                              profile_image_url)
+
+__all__ = [
+    "ImagePipeline",
+    "ImageRejected",
+    "image_pipeline",
+    "profile_image_sources",
+    "profile_image_url",
+]
@@ -0,0 +1,251 @@
+"""
+Profile picture processing.
+
+An upload is copied to a spooled temporary file in chunks and rejected as
+soon as it passes MEDIA_MAX_UPLOAD_BYTES. Only its header is parsed on the
+request thread: the format must be JPEG, PNG or WebP, and the pixel count
+must stay under MEDIA_MAX_PIXELS, which catches decompression bombs before
+any pixel data is decoded. The view can then store the new name and
+respond.
+
+Decoding and encoding run on a small thread pool; Pillow releases the GIL
+while doing both. JPEGs are decoded with Image.draft, so the DCT is
+scaled down to just above the largest size needed. Each size in
+MEDIA_IMAGE_SIZES (125px plus 2x for retina screens) is written as AVIF
+(when Pillow supports it), WebP and a JPEG fallback into the content-
+addressed store (see app/media/storage.py), named by the SHA-256 of the
+upload; identical uploads are rendered once. The 125px JPEG is written last
+and marks the image as ready; until it exists, profile_image_url() returns
+a placeholder. Readiness is remembered for MEDIA_READY_TTL seconds, after
+which the disk is checked again, so images `flask media gc` deletes (from
+any process) stop being linked.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import url_for
+from PIL import Image, ImageOps, features
+
+from app.cache import LRUCache
+from app.media.storage import MediaStore, is_digest
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+PLACEHOLDER = 'images/profile-placeholder.svg'
+PROFILE_SUBDIR = 'uploads/profiles'  # single-file uploads from before the media store
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageRejected(ValueError):
+    """Raised when an upload is too large, too big to decode or not an image."""
+
+
+def _variant_formats():
+    formats = [('webp', 'WEBP', {'quality': 80, 'method': 4})]
+    if features.check('avif'):
+        formats.insert(0, ('avif', 'AVIF', {'quality': 60}))
+    return formats
+
+
+class ImagePipeline:
+    """Flask extension that validates uploads and renders variants on a pool."""
+
+    def __init__(self, app=None):
+        self.store = MediaStore()
+        self.sizes = (125, 250)
+        self.max_bytes = 8 * 1024 * 1024
+        self.max_pixels = 40_000_000
+        self.formats = _variant_formats()
+        self._executor = None
+        self._ready = LRUCache('media_ready', maxsize=8192, ttl=300)
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MEDIA_IMAGE_SIZES', (125, 250))
+        app.config.setdefault('MEDIA_MAX_UPLOAD_BYTES', 8 * 1024 * 1024)
+        app.config.setdefault('MEDIA_MAX_PIXELS', 40_000_000)
+        app.config.setdefault('MEDIA_WORKERS', 2)
+        app.config.setdefault('MEDIA_GC_GRACE_SECONDS', 24 * 3600)
+        app.config.setdefault('MEDIA_READY_TTL', 300)
+        self.store.root = os.path.join(app.config['UPLOAD_FOLDER'], 'media')
+        self.sizes = tuple(sorted(app.config['MEDIA_IMAGE_SIZES']))
+        self.max_bytes = app.config['MEDIA_MAX_UPLOAD_BYTES']
+        self.max_pixels = app.config['MEDIA_MAX_PIXELS']
+        self._ready.ttl = app.config['MEDIA_READY_TTL']
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=app.config['MEDIA_WORKERS'],
+                                                    thread_name_prefix='image-variants')
+        app.extensions['image_pipeline'] = self
+        app.jinja_env.globals.update(profile_image_url=profile_image_url,
+                                     profile_image_sources=profile_image_sources)
+
+    def _spool(self, stream):
+        """Copy `stream` to a temporary file; returns (file, sha256 hex digest)."""
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_bytes:
+                spooled.close()
+                raise ImageRejected(f'Images must be smaller than {self.max_bytes // (1024 * 1024)} MB.')
+            digest.update(chunk)
+            spooled.write(chunk)
+        spooled.seek(0)
+        return spooled, digest.hexdigest()
+
+    def _inspect(self, spooled):
+        try:
+            with Image.open(spooled) as img:
+                fmt, (width, height) = img.format, img.size
+        except (OSError, Image.DecompressionBombError):
+            raise ImageRejected('The file is not a supported image.') from None
+        if fmt not in ALLOWED_FORMATS:
+            raise ImageRejected('Profile pictures must be JPEG, PNG or WebP images.')
+        if width * height > self.max_pixels:
+            raise ImageRejected('The image dimensions are too large.')
+        spooled.seek(0)
+
+    def save_profile_picture(self, file_storage):
+        """Validate an upload and queue its variants; returns the stored name.
+
+        Returns immediately; profile_image_url() shows a placeholder until
+        the variants are written.
+        """
+        spooled, name = self._spool(file_storage.stream)
+        try:
+            self._inspect(spooled)
+        except ImageRejected:
+            spooled.close()
+            raise
+        if self.store.exists(name, self.ready_marker):
+            # Same bytes as an earlier upload. Touch the directory so garbage
+            # collection treats it as new until this change is committed.
+            os.utime(self.store.path(name))
+            spooled.close()
+        else:
+            self.submit(name, spooled)
+        return name
+
+    @property
+    def ready_marker(self):
+        return f'{self.sizes[0]}.jpg'
+
+    def submit(self, name, source):
+        """Render variants of `source` (a file object the pool takes over) as `name`.
+
+        Returns a Future, or None if `name` is already being rendered.
+        """
+        with self._lock:
+            if name in self._pending:
+                source.close()
+                return None
+            self._pending.add(name)
+        return self._executor.submit(self._render_safely, name, source)
+
+    def _render_safely(self, name, source):
+        try:
+            self.render(name, source)
+        except Exception:
+            logger.exception('Rendering variants for %s failed', name)
+            raise
+        finally:
+            source.close()
+            with self._lock:
+                self._pending.discard(name)
+
+    def render(self, name, source):
+        """Write every size and format of `source` into the store as `name`."""
+        directory = self.store.path(name)
+        os.makedirs(directory, exist_ok=True)
+        with Image.open(source) as img:
+            largest = self.sizes[-1]
+            if img.format == 'JPEG':
+                # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding.
+                img.draft('RGB', (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+            img.thumbnail((largest, largest), Image.Resampling.LANCZOS)
+
+            # Largest first; the smallest JPEG goes last because its presence
+            # means the image is ready.
+            for size in reversed(self.sizes):
+                variant = img.copy()
+                variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+                for ext, fmt, options in self.formats:
+                    self._write(variant, os.path.join(directory, f'{size}.{ext}'), fmt, options)
+                self._write_jpeg(variant, os.path.join(directory, f'{size}.jpg'))
+
+    def _write_jpeg(self, img, path):
+        if img.mode == 'RGBA':
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        self._write(img, path, 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True})
+
+    @staticmethod
+    def _write(img, path, fmt, options):
+        # Write beside the target and rename, so readers never see half a file.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                img.save(out, fmt, **options)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def is_ready(self, name):
+        if self._ready.get(name):
+            return True
+        if self.store.root and self.store.exists(name, self.ready_marker):
+            self._ready.set(name, True)
+            return True
+        return False
+
+    def forget(self, name):
+        """Stop treating `name` as ready, e.g. after deleting it."""
+        self._ready.delete(name)
+
+
+image_pipeline = ImagePipeline()
+
+
+def profile_image_url(name, size=125, fmt='jpg'):
+    """URL of a profile picture variant, or the placeholder while it renders."""
+    if not name or name == 'default_profile.png':
+        return url_for('static', filename=PLACEHOLDER)
+    if not is_digest(name):
+        # Saved before the media store: a single file such as "1a2b3c.jpg".
+        return url_for('static', filename=f'{PROFILE_SUBDIR}/{name}')
+    if not image_pipeline.is_ready(name):
+        return url_for('static', filename=PLACEHOLDER)
+    size = min(image_pipeline.sizes, key=lambda s: (s < size, abs(s - size)))
+    return url_for('static', filename=image_pipeline.store.url_path(name, f'{size}.{fmt}'))
+
+
+def profile_image_sources(name, size=125):
+    """(mimetype, srcset) pairs for a <picture> element, best format first."""
+    if not is_digest(name) or not image_pipeline.is_ready(name):
+        return []
+    sources = []
+    for ext, fmt, _ in image_pipeline.formats:
+        srcset = ', '.join(
+            f"{url_for('static', filename=image_pipeline.store.url_path(name, f'{s}.{ext}'))} {s // size}x"
+            for s in image_pipeline.sizes if s % size == 0
+        )
+        sources.append((f'image/{ext}', srcset))
+    return sources
@@ -0,0 +1,167 @@
+"""
+Content-addressed storage for processed images.
+
+An image is named by the SHA-256 of the uploaded bytes and its variants live
+in a sharded directory, e.g. uploads/media/3f/a2/3fa2.../125.webp, so no
+directory grows past 256 entries. A name is only ever written once, and
+uploading the same bytes again reuses the existing variants. Because
+nothing under a name changes after it is written, the files are served
+with a far-future, immutable Cache-Control header.
+
+Images are referenced by User.profile_picture and Professional.profile_picture.
+`flask media gc` deletes stored images that no row references any more, once
+they are older than MEDIA_GC_GRACE_SECONDS; the grace period leaves room for
+uploads whose profile change has not been committed yet.
+"""
+import os
+import re
+import shutil
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select, union_all
+from whitenoise import WhiteNoise
+from whitenoise.string_utils import decode_path_info
+
+URL_SUBDIR = 'uploads/media'
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_FILE_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}/[0-9a-z]+\.[a-z]+$')
+
+
+def is_digest(name):
+    return bool(name) and bool(DIGEST_RE.match(name))
+
+
+class MediaStore:
+    """Sharded, write-once directory of image variants keyed by content hash."""
+
+    def __init__(self, root=None):
+        self.root = root
+
+    @staticmethod
+    def relative_dir(digest):
+        return f'{digest[:2]}/{digest[2:4]}/{digest}'
+
+    def path(self, digest, filename=''):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest, filename)
+
+    def url_path(self, digest, filename):
+        """Path under the static folder, for url_for('static', filename=...)."""
+        return f'{URL_SUBDIR}/{self.relative_dir(digest)}/{filename}'
+
+    def exists(self, digest, filename):
+        return os.path.exists(self.path(digest, filename))
+
+    def stored(self):
+        """Every digest in the store, with its directory's modification time."""
+        if not self.root or not os.path.isdir(self.root):
+            return
+        for first in os.scandir(self.root):
+            if not first.is_dir():
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.is_dir() and is_digest(entry.name):
+                        yield entry.name, entry.stat().st_mtime
+
+    def delete(self, digest):
+        shutil.rmtree(self.path(digest), ignore_errors=True)
+        # Drop shard directories left empty.
+        for parent in (os.path.dirname(self.path(digest).rstrip(os.sep)),
+                       os.path.join(self.root, digest[:2])):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+
+
+def reference_counts():
+    """How many users and professionals point at each stored image."""
+    from app import db
+    from app.modules import Professional, User
+
+    pictures = union_all(select(User.profile_picture.label('name')),
+                         select(Professional.profile_picture.label('name'))).subquery()
+    rows = db.session.execute(
+        select(pictures.c.name, func.count()).where(pictures.c.name.isnot(None))
+        .group_by(pictures.c.name)
+    )
+    return Counter({name: count for name, count in rows if is_digest(name)})
+
+
+def collect_garbage(store, grace_seconds, dry_run=False):
+    """Delete unreferenced images older than `grace_seconds`; returns their digests."""
+    referenced = reference_counts()
+    cutoff = time.time() - grace_seconds
+    removed = []
+    for digest, mtime in list(store.stored()):
+        if referenced[digest] or mtime > cutoff:
+            continue
+        if not dry_run:
+            store.delete(digest)
+        removed.append(digest)
+    return removed
+
+
+class MediaFiles(WhiteNoise):
+    """WhiteNoise for the media store, with files discovered on first request.
+
+    Images are written after startup, so instead of scanning the directory
+    once, a request for an unknown path under `prefix` is checked against
+    the disk and, if the file exists, remembered. Everything is served as
+    immutable for ten years.
+    """
+
+    def __init__(self, application, root, prefix):
+        super().__init__(application, max_age=self.FOREVER,
+                         immutable_file_test=lambda path, url: True)
+        self.media_root = root
+        self.media_prefix = '/' + prefix.strip('/') + '/'
+
+    def __call__(self, environ, start_response):
+        path = decode_path_info(environ.get('PATH_INFO', ''))
+        if path.startswith(self.media_prefix):
+            static_file = self.files.get(path) or self._discover(path)
+            if static_file is not None:
+                try:
+                    return self.serve(static_file, environ, start_response)
+                except FileNotFoundError:
+                    # Garbage-collected since we first served it.
+                    self.files.pop(path, None)
+        return self.application(environ, start_response)
+
+    def _discover(self, path):
+        relative = path[len(self.media_prefix):]
+        if not _FILE_RE.match(relative):
+            return None
+        filename = os.path.join(self.media_root, *relative.split('/'))
+        if not os.path.isfile(filename):
+            return None
+        self.add_file_to_dictionary(path, filename)
+        return self.files.get(path)
+
+
+media_cli = AppGroup('media', help='Manage uploaded media.')
+
+
+@media_cli.command('gc')
+@click.option('--grace', type=int, default=None,
+              help='Keep unreferenced images younger than this many seconds.')
+@click.option('--dry-run', is_flag=True, help='Only list what would be deleted.')
+def gc_command(grace, dry_run):
+    """Delete stored images no user or professional references."""
+    from app.media.images import image_pipeline
+
+    if grace is None:
+        grace = current_app.config['MEDIA_GC_GRACE_SECONDS']
+    removed = collect_garbage(image_pipeline.store, grace, dry_run=dry_run)
+    for digest in removed:
+        if not dry_run:
+            image_pipeline.forget(digest)
+        click.echo(digest)
+    click.echo(f"{'Would delete' if dry_run else 'Deleted'} {len(removed)} unreferenced image(s).")
@@ -0,0 +1,274 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Metrics are kept per worker process; scrape every worker (or run a single
+worker behind the scraper) to get a complete picture.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('_total', key, None, value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('', key, None, value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed wall time in seconds."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        out = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                out.append(('_bucket', key, ('le', le), cumulative))
+            out.append(('_sum', key, None, total))
+            out.append(('_count', key, None, count))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds metrics by name and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'Metric {name} already registered as {metric.type_name}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, func):
+        """Register a callable run right before each scrape (e.g. to refresh gauges)."""
+        if func not in self._collectors:
+            self._collectors.append(func)
+        return func
+
+    def render(self):
+        for collector in list(self._collectors):
+            collector()
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'skillhub_http_requests', 'HTTP requests handled.', ('blueprint', 'endpoint', 'method', 'status'))
+http_latency = registry.histogram(
+    'skillhub_http_request_duration_seconds', 'HTTP request latency.', ('blueprint', 'endpoint'))
+db_queries_per_request = registry.histogram(
+    'skillhub_db_queries_per_request', 'SQL statements executed per request.', ('endpoint',),
+    buckets=QUERY_COUNT_BUCKETS)
+db_pool_checkouts = registry.counter(
+    'skillhub_db_pool_checkouts', 'Connections checked out of the pool.')
+db_pool_size = registry.gauge(
+    'skillhub_db_pool_size', 'Configured pool size.', ('bind',))
+db_pool_checked_out = registry.gauge(
+    'skillhub_db_pool_checked_out', 'Connections currently checked out.', ('bind',))
+db_pool_overflow = registry.gauge(
+    'skillhub_db_pool_overflow', 'Connections open beyond pool_size.', ('bind',))
+matcher_encode_latency = registry.histogram(
+    'skillhub_matcher_encode_seconds', 'Sentence-transformer encode latency.', ('kind',))
+cache_requests = registry.counter(
+    'skillhub_cache_requests', 'Cache lookups by result.', ('cache', 'result'))
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup; the hit ratio is hits / (hits + misses)."""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_metrics_queries' in g:
+        g._metrics_queries += 1
+
+
+@event.listens_for(Pool, 'checkout')
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    db_pool_checkouts.inc()
+
+
+@registry.add_collector
+def _collect_pool_stats():
+    """Refresh pool gauges; runs inside the scrape request's app context."""
+    from app import db
+
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        label = bind or 'default'
+        for gauge, attr in ((db_pool_size, 'size'), (db_pool_checked_out, 'checkedout'),
+                            (db_pool_overflow, 'overflow')):
+            func = getattr(pool, attr, None)
+            if callable(func):
+                gauge.set(func(), bind=label)
+
+
+def init_metrics(app):
+    """Register request instrumentation on the app."""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def _start_metrics():
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    @app.after_request
+    def _record_metrics(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        blueprint = request.blueprint or 'app'
+        http_latency.observe(time.perf_counter() - start, blueprint=blueprint, endpoint=endpoint)
+        http_requests.inc(blueprint=blueprint, endpoint=endpoint, method=request.method,
+                          status=response.status_code)
+        db_queries_per_request.observe(g.pop('_metrics_queries', 0), endpoint=endpoint)
+        return response
@@ -1,4 +1,4 @@
-from .modules import User, Professional, Review, Service, Booking, Job, AISuggestion, Payment
+from .modules import User, Professional, Review, Service, Booking, Job, AISuggestion, Payment, DataVersion, AnalyticsRollup
 
 __all__ = [
     "User",
@@ -9,4 +9,6 @@ __all__ = [
     "Job",
     "AISuggestion",
     "Payment",
+    "DataVersion",
+    "AnalyticsRollup",
 ]
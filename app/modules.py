@@ -1,7 +1,8 @@
+import uuid
 from datetime import datetime, timezone
 from app import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import password_hasher
 from sqlalchemy import func, Column, Integer, String, Float, DateTime, ForeignKey, Table
 
 # Association table for many-to-many relationship between User and Role
@@ -57,20 +58,31 @@ class User(UserMixin, db.Model):
     job_postings = db.relationship('Job', back_populates='poster', lazy=True, cascade='all, delete-orphan')
     roles = db.relationship('Role', secondary=user_roles, back_populates='users', lazy='dynamic')
     
+    def get_role_names(self):
+        """Names of the user's roles, loaded once per instance."""
+        role_names = self.__dict__.get('_role_names')
+        if role_names is None:
+            role_names = self._role_names = frozenset(role.name for role in self.roles)
+        return role_names
+
     def has_role(self, role_name):
         """Check if user has a specific role."""
-        return self.roles.filter(Role.name == role_name).first() is not None
+        return role_name in self.get_role_names()
 
     def __repr__(self):
         return f"<User {self.email}>"
 
     def set_password(self, password: str) -> None:
         """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
         """Verify a password against the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self) -> bool:
+        """Whether the stored hash predates the current hashing parameters."""
+        return password_hasher.needs_rehash(self.password_hash)
         
     def get_full_name(self):
         """Return the user's full name."""
@@ -97,8 +109,15 @@ class Professional(db.Model):
     country = db.Column(db.String(100), nullable=True)
     years_experience = db.Column(db.Integer, default=0)
     hourly_rate = db.Column(db.Float, nullable=True)
-    rating = db.Column(db.Float, default=0.0)
+    # Aggregates of visible reviews, kept current by app/ratings.py
+    rating = db.Column(db.Float, default=0.0, index=True)  # average
     total_reviews = db.Column(db.Integer, default=0)
+    rating_sum = db.Column(db.Float, default=0.0)
+    rating_count_1 = db.Column(db.Integer, default=0)
+    rating_count_2 = db.Column(db.Integer, default=0)
+    rating_count_3 = db.Column(db.Integer, default=0)
+    rating_count_4 = db.Column(db.Integer, default=0)
+    rating_count_5 = db.Column(db.Integer, default=0)
     is_available = db.Column(db.Boolean, default=True)
     location = db.Column(db.String(200))
     skills = db.Column(db.Text, nullable=True)  # Comma-separated skills
@@ -120,6 +139,13 @@ class Professional(db.Model):
     reviews = db.relationship('Review', back_populates='professional', lazy=True, cascade='all, delete-orphan')
     ai_suggestions = db.relationship('AISuggestion', back_populates='professional', lazy=True, cascade='all, delete-orphan')
 
+    # Recommendation candidates filter on availability and minimum rating;
+    # map tiles on availability and a lat/lon box.
+    __table_args__ = (
+        db.Index('idx_professional_available_rating', 'is_available', 'rating'),
+        db.Index('idx_professional_available_location', 'is_available', 'latitude', 'longitude'),
+    )
+
     def __repr__(self):
         return f"<Professional {self.full_name} - {self.profession}>"
 
@@ -136,13 +162,10 @@ class Professional(db.Model):
             return True
         return False
 
-    def update_rating(self, new_rating):
-        """Update professional's rating when a new review is added"""
-        if self.rating == 0:
-            self.rating = new_rating
-        else:
-            self.rating = (self.rating * self.total_reviews + new_rating) / (self.total_reviews + 1)
-        self.total_reviews += 1
+    @property
+    def rating_histogram(self):
+        """Visible review counts for 1 to 5 stars, in that order"""
+        return [getattr(self, f'rating_count_{stars}') or 0 for stars in range(1, 6)]
 
 class Review(db.Model):
     """Model for professional reviews"""
@@ -162,6 +185,12 @@ class Review(db.Model):
     # Relationships
     professional = db.relationship('Professional', back_populates='reviews')
     client = db.relationship('User', back_populates='reviews_given')
+
+    # A professional's visible reviews; a user's reviews
+    __table_args__ = (
+        db.Index('idx_review_professional_visible', 'professional_id', 'is_visible'),
+        db.Index('idx_review_client', 'client_id'),
+    )
     
     def __repr__(self):
         return f"<Review {self.rating} for Professional {self.professional_id}>"
@@ -236,12 +265,19 @@ class Service(db.Model):
 # --------------------------
 # Booking Model
 # --------------------------
+# Longest booking the database accepts; availability queries rely on it
+# (see app/scheduling.py)
+MAX_BOOKING_MINUTES = 24 * 60
+
+
 class Booking(db.Model):
     __tablename__ = 'bookings'
 
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(20), default="pending")
     scheduled_at = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=60)
+    ends_at = db.Column(db.DateTime, nullable=True)  # scheduled_at + duration, set on flush
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text, nullable=True)
@@ -249,17 +285,41 @@ class Booking(db.Model):
     # Foreign Keys
     client_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id', ondelete='CASCADE'), nullable=False)
+    # Copied from the service on flush, so availability needs no join
+    professional_id = db.Column(db.Integer, db.ForeignKey('professionals.id', ondelete='CASCADE'), nullable=True)
     
     # Relationships
     client = db.relationship('User', back_populates='bookings')
     service = db.relationship('Service', back_populates='bookings')
+    professional = db.relationship('Professional')
     payment = db.relationship('Payment', back_populates='booking', uselist=False, cascade='all, delete-orphan')
+
+    # A client's and a service's bookings, by date; a professional's
+    # bookings as intervals (see app/scheduling.py); recent bookings for
+    # analytics rollups (see app/analytics.py)
+    __table_args__ = (
+        db.Index('idx_booking_client_scheduled', 'client_id', 'scheduled_at'),
+        db.Index('idx_booking_service_scheduled', 'service_id', 'scheduled_at'),
+        db.Index('idx_booking_professional_interval', 'professional_id', 'scheduled_at', 'ends_at'),
+        db.Index('idx_booking_created', 'created_at'),
+        db.CheckConstraint(f'duration_minutes BETWEEN 1 AND {MAX_BOOKING_MINUTES}', name='ck_booking_duration'),
+    )
     
     def __repr__(self):
         return f"<Booking {self.id} - {self.status}>"
 
-    def __repr__(self):
-        return f"<Booking {self.id} - {self.status}>"
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'scheduled_at': self.scheduled_at.isoformat(),
+            'ends_at': self.ends_at.isoformat() if self.ends_at else None,
+            'duration_minutes': self.duration_minutes,
+            'service_id': self.service_id,
+            'professional_id': self.professional_id,
+            'client_id': self.client_id,
+            'notes': self.notes,
+        }
 
 # --------------------------
 # Job Model
@@ -285,6 +345,13 @@ class Job(db.Model):
     poster = db.relationship('User', back_populates='job_postings')
     ai_suggestions = db.relationship('AISuggestion', back_populates='job', lazy=True, cascade='all, delete-orphan')
 
+    # Open jobs and a poster's jobs, newest first; recent jobs for analytics
+    __table_args__ = (
+        db.Index('idx_job_status_created', 'status', 'created_at'),
+        db.Index('idx_job_poster_created', 'poster_id', 'created_at'),
+        db.Index('idx_job_created', 'created_at'),
+    )
+
     def create_ai_suggestions(self, matches):
         """
         Create AI suggestions for matched professionals.
@@ -342,6 +409,14 @@ class AISuggestion(db.Model):
     # Relationships
     job = db.relationship('Job', back_populates='ai_suggestions')
     professional = db.relationship('Professional', back_populates='ai_suggestions')
+
+    # A job's suggestions best first; a professional's suggestions; recent
+    # suggestions for analytics
+    __table_args__ = (
+        db.Index('idx_suggestion_job_score', 'job_id', 'score'),
+        db.Index('idx_suggestion_professional', 'professional_id'),
+        db.Index('idx_suggestion_created', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<AISuggestion Job:{self.job_id} Pro:{self.professional_id} Score:{self.score:.2f}>'
@@ -386,16 +461,74 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text, nullable=True)
+    # Sent with the STK push so a retried request is recognised (see app/payments)
+    idempotency_key = db.Column(db.String(32), unique=True, nullable=False, default=lambda: uuid.uuid4().hex)
+    # M-Pesa's id for the STK push; callbacks and status queries refer to it
+    checkout_request_id = db.Column(db.String(64), unique=True, nullable=True)
+    # When M-Pesa accepted the STK push; reconciliation waits MPESA_RECONCILE_MIN_AGE from here.
+    # Set while a push is in flight too, to claim the payment (see app/routes/payments.py).
+    pushed_at = db.Column(db.DateTime, nullable=True)
+    # The number prompted; a callback's PhoneNumber must match it
+    phone = db.Column(db.String(20), nullable=True)
 
     # Foreign Key
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='CASCADE'), nullable=False)
     
     # Relationship
     booking = db.relationship('Booking', back_populates='payment')
+
+    # Pending payments by id, paged by reconciliation (see app/payments/reconcile.py);
+    # recent payments for analytics
+    __table_args__ = (
+        db.Index('idx_payment_status_id', 'status', 'id'),
+        db.Index('idx_payment_created', 'created_at'),
+    )
     
     def __repr__(self):
         return f"<Payment {self.id} - {self.status}>"
 
+
+# --------------------------
+# Data Version Model
+# --------------------------
+class DataVersion(db.Model):
+    """Per-table change counter, bumped in the writing transaction.
+
+    Used to build ETags and cache keys for endpoints whose output depends
+    on a table (see app/http_cache.py).
+    """
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
     def __repr__(self):
-        return f"<Payment {self.id} - {self.status}>"
+        return f"<DataVersion {self.name}={self.version}>"
+
+
+# --------------------------
+# Analytics Rollup Model
+# --------------------------
+class AnalyticsRollup(db.Model):
+    """Count and sum of one metric's rows in an hour or day, per dimension.
 
+    Written only by app/analytics.py; read by the admin analytics pages.
+    """
+    __tablename__ = 'analytics_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(32), nullable=False)
+    period = db.Column(db.String(8), nullable=False)  # hour, day
+    bucket = db.Column(db.DateTime, nullable=False)  # start of the hour or day, UTC
+    dimension = db.Column(db.String(100), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+
+    # One row per bucket and dimension; also serves range reads of a metric
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'period', 'bucket', 'dimension', name='uq_rollup_bucket'),
+        db.Index('idx_rollup_period_bucket', 'period', 'bucket'),
+    )
+
+    def __repr__(self):
+        return f"<AnalyticsRollup {self.metric}/{self.period} {self.bucket} {self.dimension}={self.count}>"
@@ -0,0 +1,87 @@
+"""
+Keyset pagination and NDJSON streaming for JSON list endpoints.
+
+Pages are addressed by an opaque cursor holding the sort key of the last row
+served (e.g. distance and id), so fetching page N costs the same as page 1
+and rows inserted between requests do not shift later pages. The cursor is
+base64url-encoded JSON; it is not signed, since it only narrows a query the
+caller could already run.
+
+With ?format=ndjson (or Accept: application/x-ndjson) a list endpoint
+streams one JSON object per line instead, flushing each batch as the
+database cursor produces it.
+"""
+import base64
+import binascii
+import json
+
+from flask import current_app, request, stream_with_context, url_for
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded."""
+
+
+def encode_cursor(*values):
+    """Opaque cursor for a row's sort key, e.g. encode_cursor(distance, id)."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token, *types):
+    """Decode a cursor into a tuple, coercing each value with `types`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor(f'Invalid cursor: {token!r}') from None
+
+
+def request_cursor(*types):
+    """The decoded ?cursor= of the current request, or None."""
+    token = request.args.get('cursor')
+    return decode_cursor(token, *types) if token else None
+
+
+def page_size(default=None):
+    """?limit= clamped to API_MAX_PAGE_SIZE (API_PAGE_SIZE when absent)."""
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        limit = default or current_app.config['API_PAGE_SIZE']
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def next_page_url(cursor):
+    """URL of the current endpoint with ?cursor= replaced."""
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def wants_ndjson():
+    """True if the client asked for a streamed NDJSON body."""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(batches):
+    """Stream an iterable of row batches as NDJSON, one write per batch.
+
+    Pass `result.mappings().partitions()` from a query executed with
+    yield_per so rows are fetched and sent in step with the DB cursor.
+    """
+    dumps = current_app.json.dumps_bytes
+
+    def generate():
+        for batch in batches:
+            chunk = b''.join(dumps(row) + b'\n' for row in batch)
+            if chunk:
+                yield chunk
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
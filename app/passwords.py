@@ -0,0 +1,103 @@
+"""
+Password hashing on a bounded worker pool.
+
+Hashing and verification run on PASSWORD_HASH_WORKERS threads (hashlib's
+PBKDF2/scrypt release the GIL), so a burst of logins can use at most that
+many cores. At most PASSWORD_HASH_MAX_PENDING jobs may be queued or running;
+beyond that callers get HashingBusy immediately instead of piling up behind
+the pool, which keeps a credential-stuffing wave from starving other traffic.
+Callers that wait longer than PASSWORD_HASH_TIMEOUT get HashingBusy too.
+
+New hashes use Werkzeug's default method unless PASSWORD_HASH_METHOD is set
+(the test config sets a cheap one); hashes made with any other method are
+upgraded on the user's next login.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated."""
+
+
+class PasswordHasher:
+    """Flask extension wrapping Werkzeug's password hashing in a bounded pool."""
+
+    def __init__(self, app=None):
+        self.method = None  # Werkzeug's default
+        self.workers = os.cpu_count() or 2
+        self.max_pending = self.workers * 4
+        self.timeout = 10
+        self._executor = None
+        self._slots = None
+        self._method_prefix = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', app.config['PASSWORD_HASH_WORKERS'] * 4)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+        with self._lock:
+            method = app.config.get('PASSWORD_HASH_METHOD')
+            if method != self.method:
+                self._method_prefix = None
+            self.method = method
+            self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+            workers = app.config['PASSWORD_HASH_WORKERS']
+            max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+            if self._executor is None or (workers, max_pending) != (self.workers, self.max_pending):
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self.workers, self.max_pending = workers, max_pending
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                self._slots = threading.BoundedSemaphore(max_pending)
+        app.extensions['password_hasher'] = self
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            # Used outside an app (scripts, shells): hash inline.
+            return func(*args)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingBusy('Too many password hashing requests in flight')
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is freed when the job finishes, not when the caller stops
+        # waiting for it, so jobs that outlive their timeout still count.
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeout:
+            future.cancel()
+            raise HashingBusy('Password hashing timed out') from None
+
+    def _generate(self, password):
+        if self.method is None:
+            return generate_password_hash(password)
+        return generate_password_hash(password, self.method)
+
+    def hash(self, password):
+        """Hash `password` with the configured algorithm and cost."""
+        return self._run(self._generate, password)
+
+    def verify(self, pwhash, password):
+        """Check `password` against a stored hash."""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if `pwhash` was produced with a different algorithm or cost."""
+        if self._method_prefix is None:
+            # Werkzeug fills in default parameters, so learn the exact prefix once.
+            self._method_prefix = self._generate('').split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,8 @@
+"""M-Pesa payments: the API client and callback handling."""
+from app.payments.mpesa_api import MpesaClient, MpesaError, mpesa
+
+__all__ = [
+    "MpesaClient",
+    "MpesaError",
+    "mpesa",
+]
@@ -0,0 +1,118 @@
+"""
+Applying M-Pesa STK push results to payments.
+
+M-Pesa posts one result per STK push to the callback URL, and may post the
+same one again. `record_results` takes any number of parsed results, looks
+the still-pending payments up by CheckoutRequestID in one query and writes
+them with one bulk UPDATE by primary key. Payments that are no longer
+pending are left alone, so a redelivered callback changes nothing.
+
+Anyone can post to the callback URL, so a successful result from a callback
+is only applied when its Amount and PhoneNumber match what was pushed; one
+that doesn't is logged and left pending for `flask payments reconcile`,
+which asks M-Pesa directly.
+"""
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+from app.modules import Payment
+from app.payments.mpesa_api import EAT, stk_amount
+
+PENDING = 'pending'
+# ResultCode 0 is success and 1032 is the customer dismissing the prompt;
+# anything else (insufficient funds, wrong PIN, timeout) is a failure.
+CANCELLED_CODES = frozenset({1032})
+RESULT_COLUMNS = ('status', 'transaction_id', 'payment_date', 'notes')
+
+
+class InvalidCallback(ValueError):
+    """Raised for a callback body that is not an STK push result."""
+
+
+def status_for(result_code):
+    code = int(result_code)
+    if code == 0:
+        return 'completed'
+    return 'cancelled' if code in CANCELLED_CODES else 'failed'
+
+
+def _transaction_date(value):
+    """TransactionDate (YYYYMMDDHHMMSS, East Africa Time) as naive UTC."""
+    if value is None:
+        return None
+    try:
+        local = datetime.strptime(str(value), '%Y%m%d%H%M%S').replace(tzinfo=EAT)
+    except ValueError:
+        return None
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_callback(body):
+    """{checkout_request_id, status, transaction_id, payment_date, notes, amount, phone} of a callback."""
+    try:
+        stk = body['Body']['stkCallback']
+        checkout_request_id = stk['CheckoutRequestID']
+        status = status_for(stk['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCallback('Not an STK push callback') from None
+    items = {item.get('Name'): item.get('Value')
+             for item in (stk.get('CallbackMetadata') or {}).get('Item', []) if isinstance(item, dict)}
+    return {
+        'checkout_request_id': checkout_request_id,
+        'status': status,
+        'transaction_id': items.get('MpesaReceiptNumber'),
+        'payment_date': _transaction_date(items.get('TransactionDate')),
+        'notes': stk.get('ResultDesc'),
+        'amount': items.get('Amount'),
+        'phone': items.get('PhoneNumber'),
+    }
+
+
+def matches_push(result, amount, phone):
+    """Whether a successful callback result paid the pushed amount from the pushed phone."""
+    try:
+        paid = float(result.get('amount'))
+    except (TypeError, ValueError):
+        return False
+    if paid != stk_amount(amount):
+        return False
+    return phone is None or str(result.get('phone')) == phone
+
+
+def bulk_update(rows):
+    """Write `rows` (dicts with a Payment `id` plus the columns to set) in one
+    executemany UPDATE by primary key."""
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    db.session.execute(update(Payment), [{'updated_at': now, **row} for row in rows])
+    return len(rows)
+
+
+def record_results(results, verify=True):
+    """Apply parsed results to their pending payments; returns how many changed.
+
+    With `verify`, successful results that don't match the push are skipped;
+    pass False only for results that came from M-Pesa itself. The caller
+    commits.
+    """
+    by_checkout = {result['checkout_request_id']: result for result in results}
+    if not by_checkout:
+        return 0
+    pending = db.session.execute(
+        select(Payment.id, Payment.checkout_request_id, Payment.amount, Payment.phone)
+        .where(Payment.checkout_request_id.in_(by_checkout), Payment.status == PENDING)
+    ).all()
+    rows = []
+    for payment_id, checkout_request_id, amount, phone in pending:
+        result = by_checkout[checkout_request_id]
+        if verify and result['status'] == 'completed' and not matches_push(result, amount, phone):
+            current_app.logger.warning('M-Pesa result for payment %s does not match its push '
+                                       '(Amount %r, PhoneNumber %r); left pending',
+                                       payment_id, result.get('amount'), result.get('phone'))
+            continue
+        rows.append({'id': payment_id, **{key: result.get(key) for key in RESULT_COLUMNS}})
+    return bulk_update(rows)
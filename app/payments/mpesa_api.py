@@ -1,20 +1,206 @@
-import requests, os
-
-def stk_push(phone, amount):
-    access_token = os.getenv("MPESA_ACCESS_TOKEN")
-    url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-    payload = {
-        "BusinessShortCode": os.getenv("MPESA_SHORTCODE"),
-        "Password": os.getenv("MPESA_PASSWORD"),
-        "Timestamp": "20251015120000",
-        "TransactionType": "CustomerPayBillOnline",
-        "Amount": amount,
-        "PartyA": phone,
-        "PartyB": os.getenv("MPESA_SHORTCODE"),
-        "PhoneNumber": phone,
-        "CallBackURL": os.getenv("MPESA_CALLBACK_URL"),
-        "AccountReference": "SkillHub",
-        "TransactionDesc": "SkillHub Service Payment"
-    }
-    headers = {"Authorization": f"Bearer {access_token}"}
-    return requests.post(url, json=payload, headers=headers).json()
+"""
+M-Pesa (Daraja) API client.
+
+One `requests.Session` per process keeps TCP/TLS connections to the API
+open and pooled (MPESA_POOL_SIZE per host), and every call has a connect and
+read timeout. Connection failures are retried, since the request never
+reached the API; reads are not, so a payment prompt is never sent twice by
+the transport.
+
+The OAuth access token is fetched with the consumer key and secret, cached,
+and refreshed MPESA_TOKEN_REFRESH_MARGIN seconds before it expires; a 401
+drops it and the call is retried once with a fresh one. The STK password and
+timestamp are computed per request.
+
+`stk_push(payment, phone)` is idempotent per Payment: a payment that already
+has a CheckoutRequestID is not pushed again, and the payment's
+idempotency_key travels with the request so a gateway in front of the API
+can deduplicate retries. Daraja itself ignores the key, so callers that may
+run concurrently claim the payment first (see app/routes/payments.py). Results arrive on the callback URL and are applied
+by app.payments.callbacks; `flask payments reconcile` polls for the ones
+that never arrived (app.payments.reconcile).
+"""
+import base64
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SANDBOX_URL = 'https://sandbox.safaricom.co.ke'
+# Daraja timestamps are East Africa Time, which has no daylight saving.
+EAT = timezone(timedelta(hours=3))
+# errorCode of an STK push query for a prompt the customer has not answered yet
+PROCESSING_ERROR = '500.001.1001'
+
+
+class MpesaError(Exception):
+    """Raised when the M-Pesa API rejects a request or cannot be reached."""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+def timestamp(now=None):
+    """Daraja timestamp, YYYYMMDDHHMMSS in East Africa Time."""
+    return (now or datetime.now(timezone.utc)).astimezone(EAT).strftime('%Y%m%d%H%M%S')
+
+
+def stk_amount(amount):
+    """The whole-shilling amount an STK push asks for."""
+    return int(round(amount))
+
+
+def stk_password(shortcode, passkey, stamp):
+    return base64.b64encode(f'{shortcode}{passkey}{stamp}'.encode()).decode('ascii')
+
+
+class MpesaClient:
+    """Flask extension holding a pooled session and a cached access token."""
+
+    def __init__(self, app=None):
+        self.base_url = SANDBOX_URL
+        self.consumer_key = self.consumer_secret = None
+        self.shortcode = self.passkey = self.callback_url = None
+        self.timeout = (5, 30)
+        self.refresh_margin = 60
+        self.pool_size = 10
+        self.session = None
+        self._token = None
+        self._token_expires = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MPESA_BASE_URL', SANDBOX_URL)
+        app.config.setdefault('MPESA_CONNECT_TIMEOUT', 5)
+        app.config.setdefault('MPESA_READ_TIMEOUT', 30)
+        app.config.setdefault('MPESA_POOL_SIZE', 10)
+        app.config.setdefault('MPESA_CONNECT_RETRIES', 2)
+        app.config.setdefault('MPESA_TOKEN_REFRESH_MARGIN', 60)
+        app.config.setdefault('MPESA_RECONCILE_PAGE_SIZE', 500)
+        app.config.setdefault('MPESA_RECONCILE_MIN_AGE', 120)
+        self.base_url = app.config['MPESA_BASE_URL'].rstrip('/')
+        self.consumer_key = app.config.get('MPESA_CONSUMER_KEY')
+        self.consumer_secret = app.config.get('MPESA_CONSUMER_SECRET')
+        self.shortcode = app.config.get('MPESA_SHORTCODE')
+        self.passkey = app.config.get('MPESA_PASSKEY')
+        self.callback_url = app.config.get('MPESA_CALLBACK_URL')
+        self.timeout = (app.config['MPESA_CONNECT_TIMEOUT'], app.config['MPESA_READ_TIMEOUT'])
+        self.refresh_margin = app.config['MPESA_TOKEN_REFRESH_MARGIN']
+        self.pool_size = app.config['MPESA_POOL_SIZE']
+        with self._lock:
+            if self.session is not None:
+                self.session.close()
+            self.session = self._build_session(self.pool_size, app.config['MPESA_CONNECT_RETRIES'])
+            self._token, self._token_expires = None, 0.0
+        app.extensions['mpesa'] = self
+
+    @staticmethod
+    def _build_session(pool_size, connect_retries):
+        session = requests.Session()
+        retry = Retry(total=connect_retries, connect=connect_retries, read=0, status=0, other=0,
+                      backoff_factor=0.2, allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def access_token(self):
+        """Cached OAuth token, fetched again shortly before it expires."""
+        with self._lock:
+            if self._token is None or time.monotonic() >= self._token_expires - self.refresh_margin:
+                body = self._send('GET', '/oauth/v1/generate', params={'grant_type': 'client_credentials'},
+                                  auth=(self.consumer_key or '', self.consumer_secret or ''))
+                try:
+                    self._token = body['access_token']
+                    lifetime = int(body.get('expires_in', 3599))
+                except (KeyError, TypeError, ValueError):
+                    raise MpesaError('Malformed token response', body=body) from None
+                self._token_expires = time.monotonic() + lifetime
+            return self._token
+
+    def invalidate_token(self):
+        with self._lock:
+            self._token, self._token_expires = None, 0.0
+
+    def _send(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise MpesaError(f'M-Pesa request failed: {e}') from e
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if response.status_code >= 400:
+            message = body.get('errorMessage') if isinstance(body, dict) else None
+            raise MpesaError(message or f'M-Pesa returned HTTP {response.status_code}',
+                             status=response.status_code, body=body)
+        return body
+
+    def post(self, path, payload, headers=None):
+        """POST JSON with the bearer token, retrying once if the token was rejected."""
+        for attempt in (1, 2):
+            request_headers = {'Authorization': f'Bearer {self.access_token()}', **(headers or {})}
+            try:
+                return self._send('POST', path, json=payload, headers=request_headers)
+            except MpesaError as e:
+                if e.status != 401 or attempt == 2:
+                    raise
+                self.invalidate_token()
+
+    def _credentials(self):
+        stamp = timestamp()
+        return {'BusinessShortCode': self.shortcode,
+                'Password': stk_password(self.shortcode, self.passkey, stamp),
+                'Timestamp': stamp}
+
+    def stk_push(self, payment, phone, reference='SkillHub', description='SkillHub Service Payment'):
+        """Prompt `phone` to pay `payment`; returns the payment's CheckoutRequestID.
+
+        Stores the CheckoutRequestID and phone on the payment (the caller commits). A
+        payment that was already pushed is returned as-is.
+        """
+        if payment.checkout_request_id:
+            return payment.checkout_request_id
+        if payment.idempotency_key is None:
+            payment.idempotency_key = uuid.uuid4().hex
+        payload = {
+            **self._credentials(),
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': stk_amount(payment.amount),
+            'PartyA': phone,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone,
+            'CallBackURL': self.callback_url,
+            'AccountReference': reference,
+            'TransactionDesc': description,
+        }
+        body = self.post('/mpesa/stkpush/v1/processrequest', payload,
+                         headers={'Idempotency-Key': payment.idempotency_key})
+        if not isinstance(body, dict) or str(body.get('ResponseCode')) != '0' or not body.get('CheckoutRequestID'):
+            description = body.get('ResponseDescription') if isinstance(body, dict) else None
+            raise MpesaError(description or 'STK push was not accepted', body=body)
+        payment.checkout_request_id = body['CheckoutRequestID']
+        payment.phone = phone
+        payment.pushed_at = datetime.utcnow()
+        return payment.checkout_request_id
+
+    def stk_query(self, checkout_request_id):
+        """Status of an STK push, as returned by the STK push query API.
+
+        While the customer has not answered yet the API replies with an
+        error; see PROCESSING_ERROR.
+        """
+        return self.post('/mpesa/stkpushquery/v1/query',
+                         {**self._credentials(), 'CheckoutRequestID': checkout_request_id})
+
+
+mpesa = MpesaClient()
@@ -0,0 +1,133 @@
+"""
+Reconciliation of pending M-Pesa payments.
+
+A payment whose callback never arrived stays pending. `flask payments
+reconcile` walks pending payments that were pushed at least
+MPESA_RECONCILE_MIN_AGE seconds ago, a page at a time by id, asks the STK
+push query API about each page concurrently on a bounded thread pool
+(at most MPESA_POOL_SIZE requests in flight, one pooled connection each),
+and writes each page's answers with the same bulk UPDATE the callback uses
+before moving on. Database work stays on the calling thread; the pool only
+makes HTTP requests.
+
+Prompts the customer has not answered yet, and payments whose query failed,
+are left pending for the next run.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from app import db
+from app.modules import Payment
+from app.payments.callbacks import PENDING, record_results, status_for
+from app.payments.mpesa_api import PROCESSING_ERROR, MpesaError, mpesa
+
+
+@dataclass
+class ReconcileSummary:
+    checked: int = 0
+    updated: int = 0
+    still_pending: int = 0
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def __str__(self):
+        counts = ''.join(f', {count} {status}' for status, count in sorted(self.statuses.items()))
+        rate = self.checked / self.seconds * 60 if self.seconds else 0
+        return (f'Checked {self.checked} pending payment(s) in {self.seconds:.1f}s ({rate:.0f}/min): '
+                f'{self.updated} updated{counts}, {self.still_pending} still pending, {self.errors} error(s).')
+
+
+def _query(checkout_request_id):
+    """(checkout_request_id, parsed result, or None if still processing, or the error)."""
+    try:
+        body = mpesa.stk_query(checkout_request_id)
+        return checkout_request_id, {
+            'checkout_request_id': checkout_request_id,
+            'status': status_for(body['ResultCode']),
+            'transaction_id': None,
+            'payment_date': None,
+            'notes': body.get('ResultDesc'),
+        }
+    except MpesaError as e:
+        if isinstance(e.body, dict) and e.body.get('errorCode') == PROCESSING_ERROR:
+            return checkout_request_id, None
+        return checkout_request_id, e
+    except (KeyError, TypeError, ValueError) as e:
+        return checkout_request_id, e
+
+
+def pending_page(after_id, cutoff, page_size):
+    """Select (id, checkout_request_id) of the next page of pushed, pending payments."""
+    return (select(Payment.id, Payment.checkout_request_id)
+            .where(Payment.status == PENDING, Payment.id > after_id,
+                   Payment.checkout_request_id.isnot(None), Payment.pushed_at <= cutoff)
+            .order_by(Payment.id)
+            .limit(page_size))
+
+
+def reconcile_payments(page_size=None, workers=None, min_age=None, limit=None, log=None):
+    """Query the status of pending payments and record the final ones.
+
+    Commits after every page; returns a ReconcileSummary.
+    """
+    config = current_app.config
+    page_size = page_size or config['MPESA_RECONCILE_PAGE_SIZE']
+    # More threads than pooled connections would only open throwaway connections.
+    workers = min(workers or mpesa.pool_size, mpesa.pool_size)
+    min_age = config['MPESA_RECONCILE_MIN_AGE'] if min_age is None else min_age
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+
+    summary = ReconcileSummary()
+    started = time.monotonic()
+    after_id = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mpesa-reconcile') as pool:
+        while limit is None or summary.checked < limit:
+            size = page_size if limit is None else min(page_size, limit - summary.checked)
+            page = db.session.execute(pending_page(after_id, cutoff, size)).all()
+            if not page:
+                break
+            after_id = page[-1].id
+            # Don't hold the read transaction open while the requests are in flight.
+            db.session.commit()
+
+            results = []
+            for checkout_request_id, outcome in pool.map(_query, [row.checkout_request_id for row in page]):
+                if outcome is None:
+                    summary.still_pending += 1
+                elif isinstance(outcome, Exception):
+                    summary.errors += 1
+                    current_app.logger.warning('STK query for %s failed: %s', checkout_request_id, outcome)
+                else:
+                    results.append(outcome)
+                    summary.statuses[outcome['status']] = summary.statuses.get(outcome['status'], 0) + 1
+            # These came from M-Pesa's query API, not the open callback URL.
+            summary.updated += record_results(results, verify=False)
+            db.session.commit()
+            summary.checked += len(page)
+            if log:
+                log(f'... {summary.checked} checked')
+    summary.seconds = time.monotonic() - started
+    return summary
+
+
+payments_cli = AppGroup('payments', help='M-Pesa payment maintenance.')
+
+
+@payments_cli.command('reconcile')
+@click.option('--page-size', type=int, help='Payments per page (default: MPESA_RECONCILE_PAGE_SIZE).')
+@click.option('--workers', type=int, help='Concurrent status queries (at most MPESA_POOL_SIZE).')
+@click.option('--min-age', type=int, help='Only payments pushed at least this many seconds ago.')
+@click.option('--limit', type=int, help='Stop after this many payments.')
+def reconcile_command(page_size, workers, min_age, limit):
+    """Query M-Pesa for pending payments and record their final status."""
+    summary = reconcile_payments(page_size=page_size, workers=workers, min_age=min_age, limit=limit,
+                                 log=click.echo)
+    click.echo(str(summary))
@@ -0,0 +1,126 @@
+"""
+SQL query counting and N+1 detection for development and tests.
+
+Hooks SQLAlchemy engine events to count statements and DB time for every
+active tracker. Each request gets a tracker when QUERY_TRACKING is on (the
+default in debug and testing), and `track_queries()` can wrap any block of
+code, which is what the `query_budget` pytest fixture builds on.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_active_trackers = ContextVar('active_query_trackers', default=())
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,?)+\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """Reduce a SQL statement to its shape so repeats with different values match."""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Statements and DB time seen while a tracker was active."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        self.shapes[normalize_statement(statement)] += 1
+
+    def repeated(self, threshold):
+        """Statement shapes executed at least `threshold` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self, threshold=2):
+        lines = [f'{self.count} queries in {self.total_time * 1000:.1f} ms'
+                 + (f' for {self.label}' if self.label else '')]
+        for shape, n in self.repeated(threshold):
+            lines.append(f'  {n}x {shape}')
+        return '\n'.join(lines)
+
+
+def _push(stats):
+    _active_trackers.set(_active_trackers.get() + (stats,))
+
+
+def _pop(stats):
+    _active_trackers.set(tuple(s for s in _active_trackers.get() if s is not stats))
+
+
+@contextmanager
+def track_queries(label=None):
+    """Count the statements executed inside the block."""
+    stats = QueryStats(label)
+    _push(stats)
+    try:
+        yield stats
+    finally:
+        _pop(stats)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_trackers.get():
+        conn.info.setdefault('query_tracker_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trackers = _active_trackers.get()
+    starts = conn.info.get('query_tracker_start')
+    if not trackers or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    for stats in trackers:
+        stats.record(statement, duration)
+
+
+def init_query_tracking(app):
+    """Track queries per request and warn about likely N+1 patterns."""
+    app.config.setdefault('QUERY_TRACKING', app.debug or app.testing)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', 5)
+    if not app.config['QUERY_TRACKING']:
+        return
+
+    @app.before_request
+    def _start_query_tracking():
+        g._query_stats = QueryStats()
+        _push(g._query_stats)
+
+    @app.after_request
+    def _report_queries(response):
+        stats = g.get('_query_stats')
+        if stats is None:
+            return response
+        stats.label = f'{request.method} {request.path}'
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.total_time * 1000:.1f};desc="{stats.count} queries"')
+        threshold = app.config['QUERY_REPEAT_THRESHOLD']
+        if stats.repeated(threshold):
+            app.logger.warning('Possible N+1 query pattern\n%s', stats.report(threshold))
+        return response
+
+    @app.teardown_request
+    def _stop_query_tracking(exc):
+        stats = g.pop('_query_stats', None)
+        if stats is not None:
+            _pop(stats)
@@ -0,0 +1,138 @@
+"""
+SQLite-backed storage for Flask-Limiter.
+
+Counters live in one small SQLite file (WAL, no fsync) that every gunicorn
+worker on the host opens, so limits are shared between workers without
+running Redis or memcached. Each hit is a single UPSERT ... RETURNING.
+
+Select it with RATELIMIT_STORAGE_URI = 'sqlite-ratelimit:///path/to/file.db'
+(same slash rules as SQLAlchemy's sqlite URLs). Left unset, the file is
+ratelimit.db in the instance folder. On read-only hosts, where that folder
+cannot be written, limits fall back to per-process memory:// counters so
+the app still starts.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+from limits.storage import Storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratelimit (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+_INCR = """
+INSERT INTO ratelimit (key, count, expires) VALUES (:key, :amount, :expires)
+ON CONFLICT(key) DO UPDATE SET
+    count = CASE WHEN ratelimit.expires <= :now THEN :amount ELSE ratelimit.count + :amount END,
+    expires = CASE WHEN ratelimit.expires <= :now THEN :expires ELSE ratelimit.expires END
+RETURNING count
+"""
+
+PURGE_EVERY = 1000
+
+
+def _path(uri):
+    path = uri.split('://', 1)[1]
+    return path[1:] if path.startswith('/') else path
+
+
+def _writable(directory):
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(directory, os.W_OK)
+
+
+def configure_ratelimit(app):
+    """Pick the counter store before limiter.init_app(app) opens it."""
+    uri = app.config.get('RATELIMIT_STORAGE_URI')
+    if not uri:
+        uri = 'sqlite-ratelimit:///' + os.path.join(app.instance_path, 'ratelimit.db')
+    if uri.startswith('sqlite-ratelimit://'):
+        directory = os.path.dirname(os.path.abspath(_path(uri)))
+        if not _writable(directory):
+            app.logger.warning('Rate limit directory %s is not writable; counting in memory per process',
+                               directory)
+            uri = 'memory://'
+    app.config['RATELIMIT_STORAGE_URI'] = uri
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in a shared SQLite file."""
+
+    STORAGE_SCHEME = ['sqlite-ratelimit']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        self.path = _path(uri)
+        self.timeout = float(options.get('timeout', 1.0))
+        self._local = threading.local()
+        self._hits = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Losing a few counter updates on power failure is acceptable.
+        conn.execute('PRAGMA synchronous=OFF')
+        return conn
+
+    @property
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        self._hits += 1
+        if self._hits % PURGE_EVERY == 0:
+            self._conn.execute('DELETE FROM ratelimit WHERE expires <= ?', (now,))
+        row = self._conn.execute(_INCR, {'key': key, 'amount': amount, 'now': now,
+                                         'expires': now + expiry}).fetchone()
+        return row[0]
+
+    def get(self, key):
+        row = self._conn.execute('SELECT count FROM ratelimit WHERE key = ? AND expires > ?',
+                                 (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._conn.execute('SELECT expires FROM ratelimit WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conn.execute('DELETE FROM ratelimit').rowcount
+
+    def clear(self, key):
+        self._conn.execute('DELETE FROM ratelimit WHERE key = ?', (key,))
+
+
+def config_limit(name):
+    """Limit string read from app config at request time, e.g. RATELIMIT_LOGIN."""
+    return lambda: current_app.config[name]
@@ -0,0 +1,188 @@
+"""
+Rating aggregates on Professional, maintained from Review writes.
+
+Each professional stores the count (total_reviews), sum, 1-5 star histogram
+(rating_count_1..5) and average (rating) of its visible reviews. Before
+every flush the reviews being inserted, edited, hidden, moved or deleted are
+turned into per-professional deltas, and the professional's columns are
+assigned SQL increments (`rating_sum = rating_sum + :delta`), so concurrent
+transactions never overwrite each other's counts. The columns are reloaded
+on next access.
+
+Writes that bypass the ORM unit of work (raw SQL, bulk UPDATE/DELETE of
+reviews) are not seen; `flask ratings reconcile` recomputes every
+professional from the reviews table and fixes any that drifted.
+"""
+from collections import defaultdict
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func, inspect, literal, select, update
+
+from app import db
+from app.database import RoutingSession
+from app.http_cache import mark_touched
+from app.modules import Professional, Review
+
+STARS = range(1, 6)
+HISTOGRAM_COLUMNS = tuple(f'rating_count_{stars}' for stars in STARS)
+AGGREGATE_COLUMNS = ('total_reviews', 'rating_sum') + HISTOGRAM_COLUMNS
+RECONCILE_BATCH = 500
+
+
+def stars(rating):
+    """Histogram bucket of a rating: the nearest whole star, from 1 to 5."""
+    return 1 + sum(rating >= threshold for threshold in (1.5, 2.5, 3.5, 4.5))
+
+
+def _contribution(rating, is_visible):
+    """What one review adds to AGGREGATE_COLUMNS (zeros if hidden)."""
+    if is_visible is False or rating is None:
+        return None
+    bucket = stars(rating)
+    return (1, rating) + tuple(int(bucket == s) for s in STARS)
+
+
+def _add(deltas, professional, contribution, sign):
+    if professional is None or contribution is None:
+        return
+    delta = deltas[professional]
+    for i, value in enumerate(contribution):
+        delta[i] += sign * value
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(state.obj(), key)
+
+
+def _owners(session, review):
+    """The professional a review belonged to before this flush, and after it."""
+    state = inspect(review)
+    by_object, by_id = state.attrs.professional.history, state.attrs.professional_id.history
+
+    def get(professional_id):
+        return session.get(Professional, professional_id) if professional_id is not None else None
+
+    # An assigned relationship wins over the id, which is only synced at flush.
+    new = by_object.added[0] if by_object.added else get(review.professional_id)
+    if by_object.deleted:
+        old = by_object.deleted[0]
+    elif by_id.deleted:
+        old = get(by_id.deleted[0])
+    else:
+        old = get(review.professional_id)
+    return old, new
+
+
+def _review_deltas(session):
+    deltas = defaultdict(lambda: [0] * len(AGGREGATE_COLUMNS))
+    for review in session.new:
+        if isinstance(review, Review):
+            _add(deltas, _owners(session, review)[1], _contribution(review.rating, review.is_visible), 1)
+    for review in session.deleted:
+        if isinstance(review, Review):
+            state = inspect(review)
+            old = _contribution(_previous(state, 'rating'), _previous(state, 'is_visible'))
+            _add(deltas, _owners(session, review)[0], old, -1)
+    for review in session.dirty:
+        if isinstance(review, Review) and session.is_modified(review):
+            state = inspect(review)
+            old_owner, new_owner = _owners(session, review)
+            _add(deltas, old_owner, _contribution(_previous(state, 'rating'), _previous(state, 'is_visible')), -1)
+            _add(deltas, new_owner, _contribution(review.rating, review.is_visible), 1)
+    return deltas
+
+
+def _apply(professional, delta):
+    state = inspect(professional)
+    if state.pending or state.transient:
+        # Not inserted yet: plain arithmetic on the values being inserted.
+        for key, value in zip(AGGREGATE_COLUMNS, delta):
+            setattr(professional, key, (getattr(professional, key) or 0) + value)
+        count, total = professional.total_reviews, professional.rating_sum
+        professional.rating = total / count if count else 0.0
+        return
+
+    count_delta, sum_delta = delta[0], delta[1]
+    for key, value in zip(AGGREGATE_COLUMNS, delta):
+        if value:
+            column = getattr(Professional, key)
+            setattr(professional, key, func.coalesce(column, 0) + value)
+    count = func.coalesce(Professional.total_reviews, 0) + count_delta
+    professional.rating = case(
+        (count > 0, (func.coalesce(Professional.rating_sum, 0) + sum_delta) / count),
+        else_=literal(0.0),
+    )
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _update_rating_aggregates(session, flush_context, instances):
+    with session.no_autoflush:
+        deltas = _review_deltas(session)
+        for professional, delta in deltas.items():
+            if professional in session.deleted or not any(delta):
+                continue
+            _apply(professional, delta)
+            mark_touched(session, Professional.__tablename__)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Keep the previous value when one of these is assigned on an expired review,
+# so the delta can subtract what the review used to contribute.
+for _key in ('rating', 'is_visible', 'professional_id', 'professional'):
+    event.listen(getattr(Review, _key), 'set', _load_old_value, active_history=True)
+
+
+def computed_aggregates():
+    """Select (professional id, *AGGREGATE_COLUMNS) computed from visible reviews."""
+    bucket = case(*((Review.rating < s + 0.5, s) for s in STARS[:-1]), else_=STARS[-1])
+    visible = (select(
+        Review.professional_id,
+        func.count().label('total_reviews'),
+        func.sum(Review.rating).label('rating_sum'),
+        *(func.sum(case((bucket == s, 1), else_=0)).label(key) for s, key in zip(STARS, HISTOGRAM_COLUMNS)),
+    ).where(Review.is_visible.isnot(False)).group_by(Review.professional_id).subquery())
+    return (select(Professional.id,
+                   *(func.coalesce(visible.c[key], 0).label(key) for key in AGGREGATE_COLUMNS))
+            .outerjoin(visible, visible.c.professional_id == Professional.id)
+            .order_by(Professional.id))
+
+
+def _differs(stored, computed):
+    return any(abs((a or 0) - (b or 0)) > 1e-9 for a, b in zip(stored, computed))
+
+
+def reconcile_ratings(dry_run=False):
+    """Recompute every professional's aggregates; returns the ids that were wrong."""
+    stored_columns = [getattr(Professional, key) for key in AGGREGATE_COLUMNS + ('rating',)]
+    stored = {row[0]: row[1:] for row in db.session.execute(select(Professional.id, *stored_columns))}
+    fixes = []
+    for row in db.session.execute(computed_aggregates().execution_options(yield_per=RECONCILE_BATCH)):
+        values = dict(zip(AGGREGATE_COLUMNS, row[1:]))
+        values['rating'] = values['rating_sum'] / values['total_reviews'] if values['total_reviews'] else 0.0
+        current = stored.get(row.id)
+        if current is None or _differs(current, [values[key] for key in AGGREGATE_COLUMNS + ('rating',)]):
+            fixes.append({'id': row.id, **values})
+    if not dry_run:
+        for start in range(0, len(fixes), RECONCILE_BATCH):
+            # Bulk UPDATE by primary key, one executemany per batch
+            db.session.execute(update(Professional), fixes[start:start + RECONCILE_BATCH])
+        db.session.commit()
+    return [fix['id'] for fix in fixes]
+
+
+ratings_cli = AppGroup('ratings', help='Maintain professional rating aggregates.')
+
+
+@ratings_cli.command('reconcile')
+@click.option('--dry-run', is_flag=True, help='Only list professionals whose aggregates are wrong.')
+def reconcile_command(dry_run):
+    """Recompute rating aggregates from visible reviews."""
+    fixed = reconcile_ratings(dry_run=dry_run)
+    for professional_id in fixed:
+        click.echo(professional_id)
+    click.echo(f"{'Would fix' if dry_run else 'Fixed'} {len(fixed)} professional(s).")
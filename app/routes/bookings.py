@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+
+from app import db
+from app.database import read_only
+from app.http_cache import cached_json
+from app.modules import Professional, Service
+from app.scheduling import (DEFAULT_DURATION_MINUTES, BookingConflict, book, busy_intervals, check_duration,
+                            free_slots, gaps)
+
+bp = Blueprint('bookings', __name__)
+
+
+def parse_datetime(value, name):
+    """ISO 8601 timestamp as naive UTC, the way bookings store it."""
+    if not value:
+        raise ValueError(f'{name} is required')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an ISO 8601 timestamp') from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def request_window():
+    """(start, end, duration) from ?start=&end=&duration= (minutes)."""
+    start = parse_datetime(request.args.get('start'), 'start')
+    end = parse_datetime(request.args.get('end'), 'end')
+    if end <= start:
+        raise ValueError('end must be after start')
+    if end - start > timedelta(days=current_app.config['BOOKING_MAX_WINDOW_DAYS']):
+        raise ValueError(f'window may span at most {current_app.config["BOOKING_MAX_WINDOW_DAYS"]} days')
+    minutes = request.args.get('duration', DEFAULT_DURATION_MINUTES, type=int)
+    if minutes <= 0:
+        raise ValueError('duration must be a positive number of minutes')
+    return start, end, timedelta(minutes=minutes)
+
+
+def _slots(intervals):
+    return [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in intervals]
+
+
+@bp.route('/api/professionals/<int:professional_id>/free-slots', methods=['GET'])
+@read_only
+@cached_json('bookings')
+def professional_free_slots(professional_id):
+    """
+    Free time of one professional.
+
+    Query Parameters:
+        - start, end: ISO 8601 window (at most BOOKING_MAX_WINDOW_DAYS long)
+        - duration: minutes a slot must fit (default: 60)
+
+    Returns:
+        JSON array of {start, end} free intervals, earliest first
+    """
+    try:
+        start, end, duration = request_window()
+    except ValueError as e:
+        return jsonify({'error': str(e), 'code': 400}), 400
+    if db.session.get(Professional, professional_id) is None:
+        return jsonify({'error': 'Professional not found', 'code': 404}), 404
+    return jsonify(_slots(free_slots([professional_id], (start, end), duration)[professional_id]))
+
+
+@bp.route('/api/professionals/availability', methods=['GET'])
+@read_only
+@cached_json('bookings')
+def professionals_availability():
+    """
+    Availability of a page of professionals, e.g. search results, in one query.
+
+    Query Parameters:
+        - ids: comma-separated professional ids (at most API_MAX_PAGE_SIZE)
+        - start, end: ISO 8601 window (at most BOOKING_MAX_WINDOW_DAYS long)
+        - duration: minutes a slot must fit (default: 60)
+
+    Returns:
+        JSON array, in `ids` order, of {professional_id, available, free_slots};
+        `available` is true when nothing is booked in the window
+    """
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers', 'code': 400}), 400
+    if not ids:
+        return jsonify({'error': 'ids is required', 'code': 400}), 400
+    if len(ids) > current_app.config['API_MAX_PAGE_SIZE']:
+        return jsonify({'error': f'at most {current_app.config["API_MAX_PAGE_SIZE"]} ids', 'code': 400}), 400
+    try:
+        start, end, duration = request_window()
+    except ValueError as e:
+        return jsonify({'error': str(e), 'code': 400}), 400
+
+    busy = busy_intervals(ids, start, end)
+    return jsonify([
+        {
+            'professional_id': professional_id,
+            'available': professional_id not in busy,
+            'free_slots': _slots(gaps(busy.get(professional_id, []), start, end, duration)),
+        }
+        for professional_id in dict.fromkeys(ids)
+    ])
+
+
+@bp.route('/api/bookings', methods=['POST'])
+@login_required
+def create_booking():
+    """
+    Book a service for the current user.
+
+    JSON Body:
+        - service_id
+        - scheduled_at: ISO 8601 start time
+        - duration_minutes: default 60, at most BOOKING_MAX_DURATION_MINUTES
+        - notes: optional
+
+    Returns:
+        201 with the booking, or 409 with the bookings it overlaps
+    """
+    data = request.get_json(silent=True) or {}
+    service = db.session.get(Service, data.get('service_id')) if isinstance(data.get('service_id'), int) else None
+    if service is None or service.is_active is False:
+        return jsonify({'error': 'Service not found', 'code': 404}), 404
+    try:
+        scheduled_at = parse_datetime(data.get('scheduled_at'), 'scheduled_at')
+        duration_minutes = data.get('duration_minutes', DEFAULT_DURATION_MINUTES)
+        check_duration(duration_minutes)
+        booking = book(current_user.id, service, scheduled_at, duration_minutes, notes=data.get('notes'))
+    except BookingConflict as e:
+        busy = _slots((b.scheduled_at, b.ends_at) for b in e.bookings)
+        db.session.rollback()
+        return jsonify({'error': str(e), 'code': 409, 'conflicts': busy}), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'code': 400}), 400
+    db.session.commit()
+    return jsonify(booking.to_dict()), 201
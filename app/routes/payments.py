@@ -0,0 +1,106 @@
+import hmac
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import or_, update
+
+from app import db
+from app.modules import Payment
+from app.payments import MpesaError, mpesa
+from app.payments.callbacks import InvalidCallback, parse_callback, record_results
+
+bp = Blueprint('payments', __name__)
+
+
+def claim_push(payment_id):
+    """Mark a payment as being pushed, in its own transaction.
+
+    Returns False when it was already pushed or another request is pushing
+    it, so two concurrent requests cannot both prompt the customer. A claim
+    outlives any push (token fetch and retries included) only if its request
+    died, so claims older than that are taken over.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=5 * sum(mpesa.timeout))
+    claimed = db.session.execute(
+        update(Payment)
+        .where(Payment.id == payment_id, Payment.checkout_request_id.is_(None),
+               or_(Payment.pushed_at.is_(None), Payment.pushed_at < stale))
+        .values(pushed_at=now)
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+
+def release_push(payment_id):
+    """Drop the claim on a payment whose push failed, so it can be retried."""
+    db.session.rollback()
+    db.session.execute(update(Payment)
+                       .where(Payment.id == payment_id, Payment.checkout_request_id.is_(None))
+                       .values(pushed_at=None))
+    db.session.commit()
+
+
+@bp.route('/api/payments/<int:payment_id>/mpesa', methods=['POST'])
+@login_required
+def request_mpesa_payment(payment_id):
+    """
+    Send an M-Pesa payment prompt for one of the current user's bookings.
+
+    JSON Body:
+        - phone: the payer's number, 2547XXXXXXXX
+
+    Returns:
+        202 with the CheckoutRequestID; the result arrives on the callback.
+        Asking again for the same payment does not send a second prompt;
+        409 while another request for it is still sending one.
+    """
+    payment = db.session.get(Payment, payment_id)
+    if payment is None or payment.booking.client_id != current_user.id:
+        return jsonify({'error': 'Payment not found', 'code': 404}), 404
+    if payment.status != 'pending':
+        return jsonify({'error': f'Payment is already {payment.status}', 'code': 409}), 409
+    phone = str((request.get_json(silent=True) or {}).get('phone', '')).lstrip('+')
+    if not (phone.isdigit() and len(phone) == 12):
+        return jsonify({'error': 'phone must be a number like 254712345678', 'code': 400}), 400
+    if payment.checkout_request_id is None and not claim_push(payment.id):
+        db.session.refresh(payment)
+        if payment.checkout_request_id is None:
+            return jsonify({'error': 'A payment prompt is already being sent', 'code': 409}), 409
+    try:
+        checkout_request_id = mpesa.stk_push(payment, phone)
+    except MpesaError as e:
+        release_push(payment_id)
+        current_app.logger.warning('STK push for payment %s failed: %s', payment_id, e)
+        return jsonify({'error': 'Payment provider unavailable', 'code': 502}), 502
+    db.session.commit()
+    return jsonify({'payment_id': payment.id, 'checkout_request_id': checkout_request_id}), 202
+
+
+@bp.route('/api/payments/mpesa/callback', methods=['POST'])
+def mpesa_callback():
+    """
+    STK push results from M-Pesa: one callback, or a JSON array of them.
+
+    Requires ?token=MPESA_CALLBACK_TOKEN; with no token configured every
+    callback is refused. Each pending payment named by a result is updated in
+    a single bulk write; redelivered results, and successes that don't match
+    the push, are ignored. Always acknowledged once parsed, so M-Pesa does not
+    keep retrying.
+    """
+    token = current_app.config.get('MPESA_CALLBACK_TOKEN')
+    if not token:
+        current_app.logger.error('M-Pesa callback refused: MPESA_CALLBACK_TOKEN is not set')
+        return jsonify({'error': 'Forbidden', 'code': 403}), 403
+    if not hmac.compare_digest(request.args.get('token', ''), token):
+        return jsonify({'error': 'Forbidden', 'code': 403}), 403
+    body = request.get_json(silent=True)
+    try:
+        results = [parse_callback(item) for item in (body if isinstance(body, list) else [body])]
+    except InvalidCallback as e:
+        return jsonify({'error': str(e), 'code': 400}), 400
+    updated = record_results(results)
+    db.session.commit()
+    current_app.logger.info('M-Pesa callback: %d result(s), %d payment(s) updated', len(results), updated)
+    return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'})
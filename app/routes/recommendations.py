@@ -1,12 +1,53 @@
-from flask import Blueprint, jsonify, request
+from dataclasses import dataclass
+from typing import List, Optional
+from flask import Blueprint, current_app, jsonify, request
 from flask_login import login_required, current_user
-from app.models import db, Job, Professional
-from app.ai.matcher import ProfessionalMatcher
+from app import db, limiter
+from app.models import Job, Professional
+from app.database import read_only
+from app.http_cache import cached_json
+from app.media import profile_image_url
+from app.pagination import InvalidCursor, encode_cursor, page_size, request_cursor
+from app.ratelimit import config_limit
 
 bp = Blueprint('recommendations', __name__)
 
+
+@dataclass
+class Recommendation:
+    """One recommended professional; serialized directly by the JSON provider."""
+    id: int
+    name: str
+    profession: str
+    photo: Optional[str]
+    rating: Optional[float]
+    total_reviews: Optional[int]
+    hourly_rate: Optional[float]
+    years_experience: Optional[int]
+    skills: List[str]
+    distance_km: Optional[float]
+    match_score: float
+    similarity_score: float
+    distance_score: float
+
+
+def candidate_query(min_rating):
+    """Available professionals rated at least `min_rating`.
+
+    Unordered: the matcher ranks by (score, id) itself, and without an
+    ORDER BY id the planner can use idx_professional_available_rating.
+    """
+    return Professional.query.filter(
+        Professional.is_available == True,
+        Professional.rating >= min_rating
+    )
+
+
 @bp.route('/api/jobs/<int:job_id>/recommendations', methods=['GET'])
+@read_only
+@limiter.limit(config_limit('RATELIMIT_RECOMMENDATIONS'))
 @login_required
+@cached_json('jobs', 'professionals')
 def get_recommendations(job_id):
     """
     Get professional recommendations for a specific job.
@@ -15,6 +56,7 @@ def get_recommendations(job_id):
         - max_distance: Maximum distance in kilometers (default: 50)
         - min_rating: Minimum professional rating (default: 0)
         - limit: Maximum number of results (default: 10)
+        - cursor: next_cursor from the previous page
         
     Returns:
         JSON response with recommended professionals and match details
@@ -22,7 +64,11 @@ def get_recommendations(job_id):
     # Get query parameters with defaults
     max_distance = request.args.get('max_distance', default=50, type=float)
     min_rating = request.args.get('min_rating', default=0, type=float)
-    limit = request.args.get('limit', default=10, type=int)
+    limit = page_size(default=10)
+    try:
+        after = request_cursor(float, int)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e), 'code': 400}), 400
     
     # Get the job with location data
     job = Job.query.get_or_404(job_id)
@@ -34,10 +80,7 @@ def get_recommendations(job_id):
         }), 400
     
     # Base query for professionals
-    query = Professional.query.filter(
-        Professional.is_available == True,
-        Professional.rating >= min_rating
-    )
+    query = candidate_query(min_rating)
     
     # Apply distance filter if coordinates are provided
     if job.location_lat and job.location_lng:
@@ -45,20 +88,30 @@ def get_recommendations(job_id):
         # for more efficient spatial queries
         pass  # We'll filter in memory after getting the results
     
-    professionals = query.all()
-    
-    if not professionals:
+    if not db.session.query(query.exists()).scalar():
         return jsonify({
             'message': 'No professionals found matching the criteria',
-            'recommendations': []
+            'recommendations': [],
+            'next_cursor': None
         })
     
+    # Candidates are fetched in batches while the matcher keeps only the top `limit`
+    professionals = query.execution_options(yield_per=200)
+    
     try:
+        # Imported lazily: sentence-transformers is heavy and only needed here
+        from app.ai.matcher import ProfessionalMatcher
+
         # Initialize the matcher with custom parameters
         matcher = ProfessionalMatcher(
             similarity_weight=0.7,
             distance_weight=0.3,
-            max_distance_km=max_distance
+            experience_weight=0,
+            rating_weight=0,
+            rate_weight=0,
+            max_distance_km=max_distance,
+            # Only the lexically best candidates are embedded (0 embeds all)
+            candidate_pool=current_app.config.get('MATCHER_CANDIDATE_POOL') or None
         )
         
         # Get matches
@@ -66,34 +119,37 @@ def get_recommendations(job_id):
             job=job,
             professionals=professionals,
             top_n=limit,
-            min_score=0.3  # Minimum matching score threshold
+            min_score=0.3,  # Minimum matching score threshold
+            after=after
         )
         
         # Format the response
         recommendations = []
         for match in matches:
             pro = match['professional']
-            recommendations.append({
-                'id': pro.id,
-                'name': pro.full_name,
-                'profession': pro.profession,
-                'photo': pro.profile_picture,
-                'rating': pro.rating,
-                'total_reviews': pro.total_reviews,
-                'hourly_rate': pro.hourly_rate,
-                'years_experience': pro.years_experience,
-                'skills': pro.get_skills_list() if hasattr(pro, 'get_skills_list') else [],
-                'distance_km': match.get('distance_km'),
-                'match_score': match['score'],
-                'similarity_score': match.get('similarity', 0),
-                'distance_score': match.get('distance_score', 0)
-            })
+            recommendations.append(Recommendation(
+                id=pro.id,
+                name=pro.full_name,
+                profession=pro.profession,
+                photo=profile_image_url(pro.profile_picture),
+                rating=pro.rating,
+                total_reviews=pro.total_reviews,
+                hourly_rate=pro.hourly_rate,
+                years_experience=pro.years_experience,
+                skills=pro.get_skills_list() if hasattr(pro, 'get_skills_list') else [],
+                distance_km=match.get('distance_km'),
+                match_score=match['score'],
+                similarity_score=match.get('similarity', 0),
+                distance_score=match.get('distance_score', 0),
+            ))
         
         return jsonify({
             'job_id': job.id,
             'job_title': job.title,
             'total_recommendations': len(recommendations),
-            'recommendations': recommendations
+            'recommendations': recommendations,
+            'next_cursor': (encode_cursor(recommendations[-1].match_score, recommendations[-1].id)
+                            if len(recommendations) == limit else None)
         })
         
     except Exception as e:
@@ -0,0 +1,54 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user
+from app.database import read_only
+from app.http_cache import cached_json
+from app.pagination import InvalidCursor, encode_cursor, next_page_url, page_size, request_cursor
+from app.search import INDEXES, search, search_terms
+
+bp = Blueprint('search', __name__)
+
+
+@bp.before_request
+def jobs_require_login():
+    # Job details are only shown to logged-in users, as on the job pages.
+    # Checked ahead of the response cache, which does not vary on the user.
+    if request.args.get('type') == 'jobs' and not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
+
+
+@bp.route('/api/search', methods=['GET'])
+@read_only
+@cached_json('jobs', 'professionals')
+def search_api():
+    """
+    Full-text search over professionals or jobs, best match first.
+
+    Query Parameters:
+        - q: search text; every word must match, as a prefix
+        - type: professionals (default) or jobs; jobs require a login
+        - limit: page size (default: API_PAGE_SIZE)
+        - cursor: from the Link rel="next" header of the previous page
+
+    Returns:
+        JSON array of matching rows, each with a relevance `score`
+    """
+    kind = request.args.get('type', 'professionals')
+    if kind not in INDEXES:
+        return jsonify({'error': f'type must be one of: {", ".join(INDEXES)}', 'code': 400}), 400
+    query = request.args.get('q', '')
+    if not search_terms(query):
+        return jsonify({'error': 'q is required', 'code': 400}), 400
+    try:
+        after = request_cursor(float, int)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e), 'code': 400}), 400
+
+    limit = page_size()
+    # One extra row tells us whether there is a next page.
+    rows = search(kind, query, limit + 1, after=after)
+    page = rows[:limit]
+    response = jsonify(page)
+    if len(rows) > limit:
+        last = page[-1]
+        response.headers['Link'] = f'<{next_page_url(encode_cursor(last["score"], last["id"]))}>; rel="next"'
+    return response
@@ -0,0 +1,194 @@
+"""
+Booking availability.
+
+A booking occupies its professional from `scheduled_at` to `ends_at`
+(scheduled_at + duration_minutes). Both columns, and the professional copied
+from the booking's service, are kept current before every flush and indexed
+together as (professional_id, scheduled_at, ends_at). Durations are
+validated by book() (and its API route), not at flush time, so unrelated
+updates such as a status change never fail a commit.
+
+Two intervals overlap when each starts before the other ends. On its own
+`ends_at > :start` cannot narrow an index on scheduled_at, so a CHECK
+constraint caps stored durations at MAX_BOOKING_MINUTES and anything
+overlapping the window must also start after `:start - MAX_BOOKING_MINUTES`.
+BOOKING_MAX_DURATION_MINUTES can lower the cap for new bookings only, so
+rows booked under a higher cap are still found. That bounds scheduled_at on
+both sides: for each professional the database reads one short range of
+the index and checks ends_at from the same entries. Availability for a whole
+page of professionals is therefore a single indexed query, not one scan per
+professional.
+
+Cancelled and rejected bookings free their slot.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+
+from app import db
+from app.database import RoutingSession
+from app.modules import MAX_BOOKING_MINUTES, Booking, Professional, Service
+
+FREEING_STATUSES = ('cancelled', 'rejected')
+DEFAULT_DURATION_MINUTES = 60
+
+
+class BookingConflict(ValueError):
+    """Raised when a new booking overlaps the professional's existing ones."""
+
+    def __init__(self, bookings):
+        super().__init__(f'Overlaps {len(bookings)} existing booking(s)')
+        self.bookings = bookings
+
+
+def configure_scheduling(app):
+    app.config.setdefault('BOOKING_MAX_DURATION_MINUTES', MAX_BOOKING_MINUTES)
+    app.config.setdefault('BOOKING_MAX_WINDOW_DAYS', 31)
+    if not 0 < app.config['BOOKING_MAX_DURATION_MINUTES'] <= MAX_BOOKING_MINUTES:
+        raise ValueError(f'BOOKING_MAX_DURATION_MINUTES must be between 1 and {MAX_BOOKING_MINUTES}')
+
+
+def check_duration(minutes):
+    """Raise ValueError unless `minutes` is a positive duration within the cap."""
+    limit = min(current_app.config.get('BOOKING_MAX_DURATION_MINUTES', MAX_BOOKING_MINUTES), MAX_BOOKING_MINUTES)
+    # bool is an int subclass, so True would otherwise pass as one minute.
+    if isinstance(minutes, bool) or not isinstance(minutes, int) or not 0 < minutes <= limit:
+        raise ValueError(f'duration must be between 1 and {limit} minutes')
+
+
+def _overlapping(professional_ids, start, end):
+    """WHERE clauses for active bookings of `professional_ids` overlapping [start, end)."""
+    return (
+        Booking.professional_id.in_(professional_ids),
+        Booking.scheduled_at < end,
+        Booking.scheduled_at > start - timedelta(minutes=MAX_BOOKING_MINUTES),
+        Booking.ends_at > start,
+        func.coalesce(Booking.status, 'pending').notin_(FREEING_STATUSES),
+    )
+
+
+def overlapping_query(professional_ids, start, end):
+    """Select (professional_id, scheduled_at, ends_at) of bookings overlapping the window."""
+    return (select(Booking.professional_id, Booking.scheduled_at, Booking.ends_at)
+            .where(*_overlapping(professional_ids, start, end)))
+
+
+def merge(intervals):
+    """Sorted, non-overlapping union of (start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def busy_intervals(professional_ids, start, end):
+    """{professional id: merged busy intervals clipped to [start, end)}, in one query."""
+    ids = list(set(professional_ids))
+    if not ids or start >= end:
+        return {}
+    rows = defaultdict(list)
+    for professional_id, begins, ends in db.session.execute(overlapping_query(ids, start, end)):
+        rows[professional_id].append((max(begins, start), min(ends, end)))
+    return {professional_id: merge(intervals) for professional_id, intervals in rows.items()}
+
+
+def gaps(busy, start, end, duration):
+    """Free intervals of [start, end) at least `duration` long, given merged `busy` ones."""
+    free = []
+    cursor = start
+    for begins, ends in busy + [(end, end)]:
+        if begins - cursor >= duration:
+            free.append((cursor, begins))
+        cursor = max(cursor, ends)
+    return free
+
+
+def free_slots(professional_ids, window, duration=timedelta(minutes=DEFAULT_DURATION_MINUTES)):
+    """{professional id: free intervals in `window` fitting `duration`} for many professionals."""
+    start, end = window
+    busy = busy_intervals(professional_ids, start, end)
+    return {professional_id: gaps(busy.get(professional_id, []), start, end, duration)
+            for professional_id in professional_ids}
+
+
+def find_free_slots(professional, window, duration=timedelta(minutes=DEFAULT_DURATION_MINUTES)):
+    """Free (start, end) intervals of one professional (or id) in `window`, long
+    enough for `duration`, earliest first."""
+    professional_id = getattr(professional, 'id', professional)
+    return free_slots([professional_id], window, duration)[professional_id]
+
+
+def availability(professional_ids, start, end):
+    """{professional id: True if nothing is booked in [start, end)}, in one query."""
+    ids = list(set(professional_ids))
+    if not ids:
+        return {}
+    busy = set(db.session.scalars(
+        select(Booking.professional_id).where(*_overlapping(ids, start, end)).distinct()
+    ))
+    return {professional_id: professional_id not in busy for professional_id in professional_ids}
+
+
+def conflicts(professional_id, start, end, exclude_booking_id=None):
+    """Active bookings of the professional overlapping [start, end)."""
+    query = select(Booking).where(*_overlapping([professional_id], start, end))
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+    return db.session.scalars(query.order_by(Booking.scheduled_at)).all()
+
+
+def book(client, service, scheduled_at, duration_minutes=DEFAULT_DURATION_MINUTES, notes=None):
+    """Add a booking of `service` for `client` (a user or id), refusing overlaps.
+
+    Raises BookingConflict when the professional is busy and ValueError for
+    a bad duration. The booking is flushed, not committed.
+    """
+    check_duration(duration_minutes)
+    ends_at = scheduled_at + timedelta(minutes=duration_minutes)
+    if service.professional_id is not None:
+        # Serialize concurrent bookings of one professional (a no-op on SQLite,
+        # where the write lock already does that).
+        db.session.execute(select(Professional.id)
+                           .where(Professional.id == service.professional_id).with_for_update())
+        clashes = conflicts(service.professional_id, scheduled_at, ends_at)
+        if clashes:
+            raise BookingConflict(clashes)
+    booking = Booking(client_id=getattr(client, 'id', client), service=service,
+                      scheduled_at=scheduled_at, duration_minutes=duration_minutes, notes=notes)
+    db.session.add(booking)
+    db.session.flush()
+    return booking
+
+
+def _changed(booking, *names):
+    attrs = inspect(booking).attrs
+    return any(attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _set_booking_intervals(session, flush_context, instances):
+    with session.no_autoflush:
+        for booking in list(session.new) + list(session.dirty):
+            if not isinstance(booking, Booking):
+                continue
+            new = booking in session.new
+            if booking.duration_minutes is None:
+                booking.duration_minutes = DEFAULT_DURATION_MINUTES
+            if (new or _changed(booking, 'scheduled_at', 'duration_minutes')) and booking.scheduled_at is not None:
+                ends_at = booking.scheduled_at + timedelta(minutes=booking.duration_minutes)
+                if booking.ends_at != ends_at:
+                    booking.ends_at = ends_at
+            if not (new or _changed(booking, 'service', 'service_id')):
+                continue
+            service = booking.service
+            if service is None and booking.service_id is not None:
+                service = session.get(Service, booking.service_id)
+            # The booking's professional always follows its service.
+            if service is not None and booking.professional is not service.professional:
+                booking.professional = service.professional
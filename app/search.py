@@ -0,0 +1,184 @@
+"""
+Full-text search over jobs and professionals.
+
+On SQLite each table gets an external-content FTS5 index (jobs_fts,
+professionals_fts) kept in step by AFTER INSERT/UPDATE/DELETE triggers and
+ranked with bm25(). On PostgreSQL each table gets a generated, weighted
+`search_vector` tsvector column with a GIN index, ranked with ts_rank_cd();
+the database recomputes the column on every write, so no trigger is needed.
+
+The index is installed by `db.create_all()` and by the 043 migration.
+`flask search rebuild` re-reads every row into the SQLite indexes, e.g.
+after rows were written with triggers disabled.
+
+Results are ordered by score (higher is better) then id, and paged with a
+(score, id) cursor like the other list endpoints (see app/pagination.py).
+"""
+import logging
+import re
+from collections import namedtuple
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Per-column weight classes; bm25 multipliers stand in for them on SQLite.
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+MAX_TERMS = 8
+
+SearchIndex = namedtuple('SearchIndex', 'table columns fields')
+
+INDEXES = {
+    'jobs': SearchIndex(
+        table='jobs',
+        columns=(('title', 'A'), ('profession', 'A'), ('description', 'C')),
+        fields=('id', 'title', 'profession', 'description', 'location', 'budget', 'status', 'created_at'),
+    ),
+    'professionals': SearchIndex(
+        table='professionals',
+        columns=(('full_name', 'A'), ('profession', 'A'), ('skills', 'B'), ('bio', 'C')),
+        fields=('id', 'full_name', 'profession', 'skills', 'rating', 'hourly_rate', 'is_available'),
+    ),
+}
+
+
+def _sqlite_ddl(index):
+    table, fts = index.table, f'{index.table}_fts'
+    names = [name for name, _ in index.columns]
+    columns = ', '.join(names)
+    new = ', '.join(f'new.{name}' for name in names)
+    old = ', '.join(f'old.{name}' for name in names)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', "
+        f"content_rowid='id', tokenize='porter unicode61')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+
+def _postgres_ddl(index):
+    vector = ' || '.join(
+        f"setweight(to_tsvector('english', coalesce({name}, '')), '{weight}')"
+        for name, weight in index.columns
+    )
+    return [
+        f'ALTER TABLE {index.table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+        f'GENERATED ALWAYS AS ({vector}) STORED',
+        f'CREATE INDEX IF NOT EXISTS ix_{index.table}_search_vector '
+        f'ON {index.table} USING GIN (search_vector)',
+    ]
+
+
+def install(connection):
+    """Create the search index for every indexed table that exists.
+
+    Other dialects get no index (and a warning) rather than an error, since
+    this runs inside `db.create_all()`.
+    """
+    dialect = connection.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        logger.warning('Full-text search is not supported on %s; not installing the search index', dialect)
+        return
+    ddl = _sqlite_ddl if dialect == 'sqlite' else _postgres_ddl
+    existing = set(inspect(connection).get_table_names())
+    for index in INDEXES.values():
+        if index.table not in existing:
+            continue
+        for statement in ddl(index):
+            connection.execute(text(statement))
+
+
+def uninstall(connection):
+    """Drop the search indexes; the indexed tables are left alone."""
+    for index in INDEXES.values():
+        if connection.dialect.name == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                connection.execute(text(f'DROP TRIGGER IF EXISTS {index.table}_fts_{suffix}'))
+            connection.execute(text(f'DROP TABLE IF EXISTS {index.table}_fts'))
+        elif connection.dialect.name == 'postgresql':
+            connection.execute(text(f'DROP INDEX IF EXISTS ix_{index.table}_search_vector'))
+            connection.execute(text(f'ALTER TABLE IF EXISTS {index.table} DROP COLUMN IF EXISTS search_vector'))
+
+
+def rebuild(connection):
+    """Re-index every row (SQLite only; PostgreSQL columns are always current)."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    existing = set(inspect(connection).get_table_names())
+    for index in INDEXES.values():
+        fts = f'{index.table}_fts'
+        if fts in existing:
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    return True
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_after_create(metadata, connection, **kw):
+    install(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _uninstall_before_drop(metadata, connection, **kw):
+    uninstall(connection)
+
+
+def search_terms(query):
+    """Lower-cased word tokens of a user query, at most MAX_TERMS of them."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def search(kind, query, limit, after=None):
+    """Rows of `kind` matching every term of `query` as prefixes, best first.
+
+    Returns up to `limit` row mappings, each with a `score`; `after` is the
+    (score, id) of the last row of the previous page.
+    """
+    index = INDEXES[kind]
+    terms = search_terms(query)
+    if not terms:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    fields = ', '.join(f't.{name}' for name in index.fields)
+    params = {'limit': limit}
+
+    if dialect == 'sqlite':
+        fts = f'{index.table}_fts'
+        weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in index.columns)
+        # bm25() is lower-is-better; negate it so both backends sort descending.
+        hits = (f'SELECT {fields}, -bm25({fts}, {weights}) AS score '
+                f'FROM {fts} JOIN {index.table} t ON t.id = {fts}.rowid '
+                f'WHERE {fts} MATCH :query')
+        params['query'] = ' '.join(f'"{term}"*' for term in terms)
+    else:
+        hits = (f'SELECT {fields}, ts_rank_cd(t.search_vector, q)::float8 AS score '
+                f"FROM {index.table} t, to_tsquery('english', :query) q "
+                f'WHERE t.search_vector @@ q')
+        params['query'] = ' & '.join(f'{term}:*' for term in terms)
+
+    keyset = ''
+    if after:
+        keyset = 'WHERE score < :after_score OR (score = :after_score AND id > :after_id)'
+        params.update(after_score=after[0], after_id=after[1])
+
+    statement = text(f'SELECT * FROM ({hits}) AS hits {keyset} ORDER BY score DESC, id ASC LIMIT :limit')
+    return db.session.execute(statement, params).mappings().all()
+
+
+search_cli = AppGroup('search', help='Manage the full-text search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Install the search index if missing and re-index every row."""
+    with db.engine.begin() as connection:
+        install(connection)
+        rebuilt = rebuild(connection)
+    click.echo('Search index rebuilt.' if rebuilt else 'Search index installed; nothing to rebuild.')
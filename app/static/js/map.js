@@ -20,6 +20,65 @@ function getIcon(profession) {
   });
 }
 
+// Cluster bubble, sized by how many professionals it holds
+function getClusterIcon(count) {
+  const size = count < 10 ? 32 : count < 100 ? 40 : 48;
+  return L.divIcon({
+    html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;background:rgba(37,99,235,0.85);color:#fff;text-align:center;font-weight:600;">${count}</div>`,
+    className: 'cluster-icon',
+    iconSize: [size, size],
+  });
+}
+
+// Popup/tooltip content from user-entered text, never parsed as HTML
+function textContent(text) {
+  const span = document.createElement('span');
+  span.textContent = text;
+  return span;
+}
+
+// Professionals are fetched as server-side clusters for the visible area,
+// so the number of markers stays bounded at any zoom level.
+const clusterLayer = L.layerGroup().addTo(map);
+let pendingClusters = null;
+
+function loadClusters() {
+  if (pendingClusters) pendingClusters.abort();
+  pendingClusters = new AbortController();
+
+  const bounds = map.getBounds();
+  const bbox = [
+    Math.max(bounds.getWest(), -180),
+    Math.max(bounds.getSouth(), -85),
+    Math.min(bounds.getEast(), 180),
+    Math.min(bounds.getNorth(), 85),
+  ].map(v => v.toFixed(6)).join(',');
+
+  fetch(`/api/map/clusters?bbox=${bbox}&zoom=${map.getZoom()}`, { signal: pendingClusters.signal })
+    .then(res => res.json())
+    .then(data => {
+      clusterLayer.clearLayers();
+      (data.clusters || []).forEach(c => {
+        if (c.count === 1) {
+          L.marker([c.lat, c.lon], { icon: getIcon(c.profession) })
+            .bindPopup(textContent(c.profession))
+            .addTo(clusterLayer);
+          return;
+        }
+        L.marker([c.lat, c.lon], { icon: getClusterIcon(c.count) })
+          .bindTooltip(textContent(`${c.count} professionals, mostly ${c.profession}`))
+          .on('click', () => map.setView([c.lat, c.lon], Math.min(map.getZoom() + 2, 18)))
+          .addTo(clusterLayer);
+      });
+    })
+    .catch(err => {
+      if (err.name !== 'AbortError') console.error('Failed to load clusters:', err);
+    });
+}
+
+map.on('moveend', loadClusters);
+loadClusters();
+
 // Client location marker
 navigator.geolocation.getCurrentPosition(pos => {
   const { latitude, longitude } = pos.coords;
@@ -35,24 +94,6 @@ navigator.geolocation.getCurrentPosition(pos => {
   const clientMarker = L.marker([latitude, longitude], { icon: clientIcon }).addTo(map);
   clientMarker.bindPopup("<b>You are here!</b>").openPopup();
   map.setView([latitude, longitude], 13);
-
-  // Fetch professionals nearby
-  fetch(`/api/professionals/nearby?lat=${latitude}&lon=${longitude}&radius=10000`)
-    .then(res => res.json())
-    .then(data => {
-      data.forEach(p => {
-        const match = p.coords.match(/POINT\((.*?) (.*?)\)/);
-        if (!match) return;
-
-        const [lon, lat] = match.slice(1);
-        const marker = L.marker([lat, lon], { icon: getIcon(p.profession) }).addTo(map);
-        marker.bindPopup(`
-          <b>${p.full_name}</b><br>
-          ${p.profession}<br>
-          Rating: ${p.rating || "N/A"}
-        `);
-      });
-    });
 }, err => {
   console.error("Geolocation failed:", err);
   alert("Could not access location — please enable GPS!");
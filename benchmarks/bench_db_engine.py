@@ -0,0 +1,128 @@
+"""
+Concurrent request throughput against a file-backed SQLite database, with
+and without the SQLITE_PRAGMAS engine profile.
+
+Each simulated request opens an app context, reads a page of available
+professionals and, for a fraction of requests, writes a review and commits,
+which is roughly the mix the dashboard and review flows produce.
+
+Single runs are noisy (disk cache, CPU frequency, thread scheduling), so
+each profile runs --rounds times on a fresh database, alternating which
+goes first, with seeded randomness and untimed warm-up requests. Compare
+the medians, and treat a difference smaller than the min-max spread as
+no difference.
+
+Run with: python -m benchmarks.bench_db_engine [--threads 8] [--requests 2000] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app, db
+from app.modules import User, Professional, Review
+from config import TestingConfig
+
+
+def make_config(path, pragmas):
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        SQLITE_PRAGMAS = pragmas
+        ACCESS_LOG_ENABLED = False
+        QUERY_TRACKING = False
+    return BenchConfig
+
+
+def seed(app, professionals=500):
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        for i in range(professionals):
+            user = User(full_name=f'Pro {i}', email=f'pro{i}@example.com', password_hash='x')
+            db.session.add(Professional(user=user, full_name=f'Pro {i}', profession='Plumber',
+                                        rating=rng.uniform(0, 5), is_available=True))
+        db.session.commit()
+
+
+def simulated_request(app, write_ratio, rng):
+    with app.app_context():
+        pros = (Professional.query
+                .filter(Professional.is_available.is_(True), Professional.rating >= 2.5)
+                .limit(20).all())
+        if pros and rng.random() < write_ratio:
+            db.session.add(Review(professional_id=rng.choice(pros).id, rating=4.0))
+            db.session.commit()
+        db.session.remove()
+
+
+def run(pragmas, threads, requests, write_ratio, warmup=100):
+    """Requests per second and error count for one run on a fresh database."""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app(make_config(path, pragmas))
+        seed(app)
+        warm = random.Random(-1)
+        for _ in range(warmup):
+            simulated_request(app, write_ratio, warm)
+
+        per_thread = requests // threads
+        errors = []
+
+        def worker(rng):
+            for _ in range(per_thread):
+                try:
+                    simulated_request(app, write_ratio, rng)
+                except Exception as exc:  # "database is locked" without busy_timeout
+                    errors.append(exc)
+
+        pool = [threading.Thread(target=worker, args=(random.Random(i),)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            db.engine.dispose()
+        return (per_thread * threads - len(errors)) / elapsed, len(errors)
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    profiles = [('default', {}), ('tuned', TestingConfig.SQLITE_PRAGMAS)]
+    results = {label: [] for label, _ in profiles}
+    errors = dict.fromkeys(results, 0)
+    print(f'{args.threads} threads, {args.requests} requests, {args.write_ratio:.0%} writes, '
+          f'{args.rounds} rounds')
+    for round_ in range(args.rounds):
+        for label, pragmas in (profiles if round_ % 2 == 0 else profiles[::-1]):
+            rate, failed = run(pragmas, args.threads, args.requests, args.write_ratio)
+            results[label].append(rate)
+            errors[label] += failed
+            print(f'  round {round_ + 1} {label:<8} {rate:>8.1f} req/s   errors={failed}')
+
+    for label, rates in results.items():
+        print(f'{label:<10} median {statistics.median(rates):>8.1f} req/s   '
+              f'range {min(rates):.1f}-{max(rates):.1f}   errors={errors[label]}')
+    ratio = statistics.median(results['tuned']) / statistics.median(results['default'])
+    print(f'tuned/default median ratio: {ratio:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+jsonify throughput for a recommendations-sized payload, stdlib json vs the
+orjson-backed provider, with items as dicts and as dataclasses.
+
+Run with: python -m benchmarks.bench_json [--items 1000] [--rounds 200]
+"""
+import argparse
+import os
+import time
+from dataclasses import asdict
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import FastJSONProvider
+from app.routes.recommendations import Recommendation
+
+
+def make_items(n):
+    return [Recommendation(id=i, name=f'Pro {i}', profession='Plumber', photo=None,
+                           rating=4.5, total_reviews=12, hourly_rate=15.0, years_experience=7,
+                           skills=['pipes', 'boilers', 'drains'], distance_km=3.2,
+                           match_score=0.81, similarity_score=0.77, distance_score=0.9)
+            for i in range(n)]
+
+
+def run(label, provider_class, payload, rounds):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    with app.app_context():
+        app.json.response(payload)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            app.json.response(payload).get_data()
+        elapsed = time.perf_counter() - start
+    print(f'{label:<22} {elapsed / rounds * 1000:>8.3f} ms/response')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    as_dicts = {'recommendations': [asdict(item) for item in items]}
+    as_dataclasses = {'recommendations': items}
+    print(f'{args.items} items, {args.rounds} rounds')
+    run('stdlib, dicts', DefaultJSONProvider, as_dicts, args.rounds)
+    run('stdlib, dataclasses', DefaultJSONProvider, as_dataclasses, args.rounds)
+    run('orjson, dicts', FastJSONProvider, as_dicts, args.rounds)
+    run('orjson, dataclasses', FastJSONProvider, as_dataclasses, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
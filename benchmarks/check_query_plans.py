@@ -0,0 +1,138 @@
+"""
+Query-plan check for the hot queries: fails if any of them would scan a
+whole table instead of using an index.
+
+Each query is built the way the app builds it, run through SQLite's
+EXPLAIN QUERY PLAN against a seeded database (after ANALYZE, so the planner
+sees realistic statistics) and rejected if the plan contains a bare
+`SCAN <table>`. Scans of an index (`SCAN t USING INDEX ...`) are fine.
+
+Run with: python -m benchmarks.check_query_plans [--rows 2000]
+Exits non-zero when a hot query does a full scan.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import text
+
+from app import create_app, db
+from app.map_clusters import available_in
+from app.modules import AISuggestion, Booking, Job, Professional, Review, Service, User
+from config import TestingConfig
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+class PlanConfig(TestingConfig):
+    ACCESS_LOG_ENABLED = False
+    QUERY_TRACKING = False
+
+
+def hot_queries():
+    """(name, statement) for every query the index set is designed around."""
+    from app.routes.recommendations import candidate_query
+    from app.analytics import METRICS, series_query, source_query
+    from app.payments.reconcile import pending_page
+    from app.scheduling import overlapping_query
+
+    return [
+        ('recommendation candidates', candidate_query(3.0).statement),
+        ('map tile', available_in(36.6, -1.4, 37.0, -1.1)),
+        ('job suggestions by score',
+         db.select(AISuggestion).where(AISuggestion.job_id == 1).order_by(AISuggestion.score.desc())),
+        ('professional suggestions', db.select(AISuggestion).where(AISuggestion.professional_id == 1)),
+        ('visible reviews',
+         db.select(Review).where(Review.professional_id == 1, Review.is_visible.isnot(False))),
+        ('reviews by client', db.select(Review).where(Review.client_id == 1)),
+        ('open jobs, newest first',
+         db.select(Job).where(Job.status == 'open').order_by(Job.created_at.desc()).limit(20)),
+        ('jobs by poster', db.select(Job).where(Job.poster_id == 1).order_by(Job.created_at.desc())),
+        ('client bookings',
+         db.select(Booking).where(Booking.client_id == 1).order_by(Booking.scheduled_at.desc())),
+        ('service bookings',
+         db.select(Booking).where(Booking.service_id == 1, Booking.scheduled_at >= datetime(2026, 1, 1))),
+        ('availability of a result page',
+         overlapping_query(list(range(1, 21)), datetime(2025, 3, 1), datetime(2025, 3, 8))),
+        ('pending payments to reconcile', pending_page(1000, datetime(2026, 1, 1), 500)),
+        *((f'{metric} rollup source', source_query(metric, datetime(2025, 1, 20), datetime(2025, 1, 22)))
+          for metric in METRICS),
+        ('analytics series', series_query('jobs', 'day', datetime(2025, 1, 1), datetime(2025, 2, 1))),
+    ]
+
+
+def seed(rows):
+    rng = random.Random(0)
+    clients = [User(full_name=f'Client {i}', email=f'client{i}@example.com', password_hash='x')
+               for i in range(rows // 10)]
+    db.session.add_all(clients)
+    professionals = []
+    for i in range(rows):
+        user = User(full_name=f'Pro {i}', email=f'pro{i}@example.com', password_hash='x')
+        professionals.append(Professional(
+            user=user, full_name=f'Pro {i}', profession=rng.choice(['Plumber', 'Chef', 'Electrician']),
+            is_available=rng.random() < 0.8, rating=rng.uniform(0, 5),
+            latitude=rng.uniform(-4.5, 4.5), longitude=rng.uniform(34, 41.5)))
+    db.session.add_all(professionals)
+    db.session.flush()
+    start = datetime(2025, 1, 1)
+    for i in range(rows):
+        client = rng.choice(clients)
+        pro = rng.choice(professionals)
+        job = Job(title=f'Job {i}', description='Needs doing', profession=pro.profession, poster=client,
+                  status=rng.choice(['open', 'in_progress', 'completed', 'cancelled']),
+                  created_at=start + timedelta(hours=i))
+        service = Service(title=f'Service {i}', description='-', category=pro.profession, price=10,
+                          provider=pro.user, professional=pro)
+        db.session.add_all([
+            job, service,
+            AISuggestion(job=job, professional=pro, score=rng.random()),
+            Review(professional=pro, client=client, rating=rng.randint(1, 5)),
+            Booking(client=client, service=service, scheduled_at=start + timedelta(hours=i)),
+        ])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+
+def plan(statement):
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def check(rows=2000, out=sys.stdout):
+    """Print each hot query's plan; returns the names of those with a full scan."""
+    app = create_app(PlanConfig)
+    failures = []
+    with app.app_context():
+        db.create_all()
+        try:
+            seed(rows)
+            for name, statement in hot_queries():
+                steps = plan(statement)
+                scans = [step for step in steps if FULL_SCAN.match(step)]
+                if scans:
+                    failures.append(name)
+                print(f"{'FULL SCAN' if scans else 'ok':>9}  {name}: {'; '.join(steps)}", file=out)
+        finally:
+            db.session.remove()
+            db.drop_all()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+    failures = check(args.rows)
+    if failures:
+        print(f'\n{len(failures)} hot queries do full table scans: {", ".join(failures)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
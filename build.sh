@@ -1,4 +1,5 @@
 #!/bin/bash
 echo "DATABASE_URL=${DATABASE_URL}" > .env
 pip install -r requirements.txt
+python -m flask assets build
 python -m flask db upgrade
@@ -9,20 +9,164 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'test.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # hard cap on any request body
+
+    # Static files (see app/assets.py). Development serves them uncached and
+    # reloads templates; production serves hashed copies from the manifest
+    # built by `flask assets build`.
+    ASSET_MANIFEST = False
+    STATIC_MAX_AGE = 0
+    SEND_FILE_MAX_AGE_DEFAULT = 0
+    TEMPLATES_AUTO_RELOAD = True
+
+    # Profile picture pipeline (see app/media/images.py). Sizes are square
+    # bounding boxes in pixels; 250 serves 125px slots on 2x screens.
+    MEDIA_IMAGE_SIZES = (125, 250)
+    MEDIA_MAX_UPLOAD_BYTES = int(os.environ.get('MEDIA_MAX_UPLOAD_BYTES', str(8 * 1024 * 1024)))
+    MEDIA_MAX_PIXELS = int(os.environ.get('MEDIA_MAX_PIXELS', '40000000'))
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', '2'))
+    # Unreferenced images younger than this survive `flask media gc`
+    MEDIA_GC_GRACE_SECONDS = int(os.environ.get('MEDIA_GC_GRACE_SECONDS', str(24 * 3600)))
+    # Seconds a rendered image is assumed to still exist before the disk is checked again
+    MEDIA_READY_TTL = int(os.environ.get('MEDIA_READY_TTL', '300'))
+
+    # Access logging (see app/access_log.py)
+    ACCESS_LOG_ENABLED = os.environ.get('ACCESS_LOG_ENABLED', 'true').lower() == 'true'
+    ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', '1.0'))
+    ACCESS_LOG_SLOW_MS = float(os.environ.get('ACCESS_LOG_SLOW_MS', '1000'))
+    ACCESS_LOG_SKIP_PREFIXES = ('/static/', '/favicon.ico')
+
+    # Metrics (see app/metrics.py); METRICS_TOKEN lets a scraper bypass admin login
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Per-request query counting / N+1 warnings (see app/query_tracker.py).
+    # Left unset so it follows DEBUG/TESTING unless QUERY_TRACKING is exported.
+    if os.environ.get('QUERY_TRACKING'):
+        QUERY_TRACKING = os.environ['QUERY_TRACKING'].lower() == 'true'
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', '5'))
+
+    # Engine profile (see app/database.py). Pool settings apply to server
+    # databases; SQLITE_PRAGMAS are run on every new SQLite connection.
+    DB_POOL_SIZE = None
+    DB_MAX_OVERFLOW = None
+    DB_POOL_TIMEOUT = None
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = True
+    DB_STATEMENT_TIMEOUT_MS = None
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,  # 256 MiB
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    }
+
+    # Optional read replica used by views decorated with app.database.read_only
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_READ_AFTER_WRITE_SECONDS = int(os.environ.get('REPLICA_READ_AFTER_WRITE_SECONDS', '5'))
+
+    # Seconds a logged-in user and their roles are served from memory (0 disables)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', '60'))
+
+    # Password hashing pool (see app/passwords.py). Hashes use Werkzeug's
+    # default method; PASSWORD_HASH_METHOD is only set by TestingConfig.
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 4)))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+    # Rate limiting (see app/ratelimit.py). The SQLite file is shared by every
+    # worker on the host; unset, it is ratelimit.db in the instance folder.
+    # Limits use Flask-Limiter's "N per period" syntax.
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI')
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_LOGIN = os.environ.get('RATELIMIT_LOGIN', '10 per minute;100 per hour')
+    RATELIMIT_REGISTER = os.environ.get('RATELIMIT_REGISTER', '5 per minute;50 per hour')
+    RATELIMIT_RECOMMENDATIONS = os.environ.get('RATELIMIT_RECOMMENDATIONS', '30 per minute')
+
+    # Server-side JSON response cache with ETag revalidation (see app/http_cache.py)
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+    HTTP_CACHE_MAXSIZE = int(os.environ.get('HTTP_CACHE_MAXSIZE', '2048'))
+    HTTP_CACHE_TTL = int(os.environ.get('HTTP_CACHE_TTL', '300'))
+
+    # {% cache %} template fragments (see app/fragment_cache.py)
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+    FRAGMENT_CACHE_MAXSIZE = int(os.environ.get('FRAGMENT_CACHE_MAXSIZE', '2048'))
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', '300'))
+
+    # Recommendations embed only the best MATCHER_CANDIDATE_POOL professionals
+    # by profession and skill overlap (see app/ai/candidates.py); 0 embeds all.
+    MATCHER_CANDIDATE_POOL = int(os.environ.get('MATCHER_CANDIDATE_POOL', '300'))
+
+    # Keyset-paginated list endpoints (see app/pagination.py); NDJSON streams
+    # are fetched from the database API_STREAM_BATCH rows at a time.
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '100'))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '500'))
+    API_STREAM_BATCH = int(os.environ.get('API_STREAM_BATCH', '500'))
+
+    # Map clustering (see app/map_clusters.py). A viewport may cover at most
+    # MAP_MAX_TILES tiles; computed tiles are cached per data version.
+    MAP_MAX_ZOOM = 18
+    MAP_MAX_TILES = int(os.environ.get('MAP_MAX_TILES', '64'))
+    MAP_TILE_CACHE_SIZE = int(os.environ.get('MAP_TILE_CACHE_SIZE', '4096'))
+    MAP_TILE_CACHE_TTL = int(os.environ.get('MAP_TILE_CACHE_TTL', '600'))
+
+    # Booking availability (see app/scheduling.py). New bookings are capped at
+    # BOOKING_MAX_DURATION_MINUTES, at most a day (the database's own limit);
+    # windows are capped per request.
+    BOOKING_MAX_DURATION_MINUTES = int(os.environ.get('BOOKING_MAX_DURATION_MINUTES', '1440'))
+    BOOKING_MAX_WINDOW_DAYS = int(os.environ.get('BOOKING_MAX_WINDOW_DAYS', '31'))
+
+    # M-Pesa Daraja API (see app/payments/mpesa_api.py). Requests share a pool
+    # of MPESA_POOL_SIZE connections; timeouts are in seconds. The callback
+    # must carry ?token=MPESA_CALLBACK_TOKEN; callbacks are refused until it is set.
+    MPESA_BASE_URL = os.environ.get('MPESA_BASE_URL', 'https://sandbox.safaricom.co.ke')
+    MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY')
+    MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET')
+    MPESA_SHORTCODE = os.environ.get('MPESA_SHORTCODE')
+    MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY')
+    MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL')
+    MPESA_CALLBACK_TOKEN = os.environ.get('MPESA_CALLBACK_TOKEN')
+    MPESA_CONNECT_TIMEOUT = float(os.environ.get('MPESA_CONNECT_TIMEOUT', '5'))
+    MPESA_READ_TIMEOUT = float(os.environ.get('MPESA_READ_TIMEOUT', '30'))
+    MPESA_POOL_SIZE = int(os.environ.get('MPESA_POOL_SIZE', '10'))
+    MPESA_TOKEN_REFRESH_MARGIN = int(os.environ.get('MPESA_TOKEN_REFRESH_MARGIN', '60'))
+    # `flask payments reconcile` (see app/payments/reconcile.py) pages through
+    # pending payments pushed at least MPESA_RECONCILE_MIN_AGE seconds ago.
+    MPESA_RECONCILE_PAGE_SIZE = int(os.environ.get('MPESA_RECONCILE_PAGE_SIZE', '500'))
+    MPESA_RECONCILE_MIN_AGE = int(os.environ.get('MPESA_RECONCILE_MIN_AGE', '120'))
+
+    # Admin analytics rollups (see app/analytics.py). `flask analytics rollup`
+    # recomputes this many hours before the newest rollup on every run.
+    ANALYTICS_LOOKBACK_HOURS = int(os.environ.get('ANALYTICS_LOOKBACK_HOURS', '48'))
+    ANALYTICS_BACKFILL_CHUNK_DAYS = int(os.environ.get('ANALYTICS_BACKFILL_CHUNK_DAYS', '7'))
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'app.db')
     WTF_CSRF_ENABLED = False
+    # Off so edited templates show up on reload
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'false').lower() == 'true'
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory SQLite for tests
     WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast hashes keep the suite quick
+    RATELIMIT_STORAGE_URI = 'memory://'
 
 class ProductionConfig(Config):
     TESTING = False
     WTF_CSRF_ENABLED = True
+    ASSET_MANIFEST = True
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '3600'))  # unhashed files only
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get('SEND_FILE_MAX_AGE_DEFAULT', '3600'))
+    TEMPLATES_AUTO_RELOAD = False
+    ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', '0.1'))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '10'))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '15000'))
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     if not SQLALCHEMY_DATABASE_URI:
         raise ValueError("No DATABASE_URL set for production")
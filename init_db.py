@@ -1,3 +1,5 @@
+from flask_migrate import stamp
+
 from app import create_app, db
 from app.modules import User, Professional, Service, Review, Booking, Payment
 
@@ -7,6 +9,9 @@ def init_db():
         # Create all database tables
         print("Creating database tables...")
         db.create_all()
+        # create_all() builds the current schema, so record it as migrated;
+        # `flask db upgrade` then only runs revisions added later.
+        stamp()
         print("Database tables created successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+"""baseline schema
+
+Revision ID: 000
+Revises:
+Create Date: 2026-10-19 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '000'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The schema as `db.create_all()` built it before there were revisions.
+    # Databases created that way already have some or all of these tables;
+    # only the missing ones are created, so they upgrade in place.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    def create_table(name, *elements):
+        if name not in existing:
+            op.create_table(name, *elements)
+
+    create_table(
+        'roles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('full_name', sa.String(length=120), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('bio', sa.Text(), nullable=True),
+        sa.Column('photo', sa.String(length=255), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('password_hash', sa.String(length=200), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('profile_picture', sa.String(length=255), nullable=True),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('email_verified', sa.Boolean(), nullable=True),
+        sa.Column('verification_token', sa.String(length=100), nullable=True),
+        sa.Column('reset_token', sa.String(length=100), nullable=True),
+        sa.Column('reset_token_expires', sa.DateTime(), nullable=True),
+        sa.Column('last_login', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('reset_token'),
+        sa.UniqueConstraint('verification_token'),
+    )
+    create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('profession', sa.String(length=100), nullable=False),
+        sa.Column('location', sa.String(length=200), nullable=True),
+        sa.Column('location_lat', sa.Float(), nullable=True),
+        sa.Column('location_lng', sa.Float(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('budget', sa.Float(), nullable=True),
+        sa.Column('deadline', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('poster_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['poster_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    create_table(
+        'professionals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('full_name', sa.String(length=120), nullable=False),
+        sa.Column('profession', sa.String(length=100), nullable=False),
+        sa.Column('bio', sa.Text(), nullable=True),
+        sa.Column('profile_picture', sa.String(length=255), nullable=True),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('address', sa.Text(), nullable=True),
+        sa.Column('city', sa.String(length=100), nullable=True),
+        sa.Column('country', sa.String(length=100), nullable=True),
+        sa.Column('years_experience', sa.Integer(), nullable=True),
+        sa.Column('hourly_rate', sa.Float(), nullable=True),
+        sa.Column('rating', sa.Float(), nullable=True),
+        sa.Column('total_reviews', sa.Integer(), nullable=True),
+        sa.Column('is_available', sa.Boolean(), nullable=True),
+        sa.Column('location', sa.String(length=200), nullable=True),
+        sa.Column('skills', sa.Text(), nullable=True),
+        sa.Column('education', sa.Text(), nullable=True),
+        sa.Column('certifications', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id'),
+    )
+    create_table(
+        'user_roles',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'role_id'),
+    )
+    create_table(
+        'ai_suggestions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('professional_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('distance_km', sa.Float(), nullable=True),
+        sa.Column('similarity_score', sa.Float(), nullable=True),
+        sa.Column('distance_score', sa.Float(), nullable=True),
+        sa.Column('is_contacted', sa.Boolean(), nullable=True),
+        sa.Column('is_interested', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['professional_id'], ['professionals.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    create_table(
+        'reviews',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rating', sa.Float(), nullable=False),
+        sa.Column('comment', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('is_visible', sa.Boolean(), nullable=True),
+        sa.Column('professional_id', sa.Integer(), nullable=False),
+        sa.Column('client_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['client_id'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['professional_id'], ['professionals.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    if 'services' not in existing:
+        op.create_table(
+            'services',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('category', sa.String(length=100), nullable=False),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('location', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('provider_id', sa.Integer(), nullable=False),
+            sa.Column('professional_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['professional_id'], ['professionals.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['provider_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('idx_service_active', 'services', ['is_active'])
+        op.create_index('idx_service_category', 'services', ['category'])
+        op.create_index('idx_service_professional', 'services', ['professional_id'])
+        op.create_index('idx_service_provider', 'services', ['provider_id'])
+    create_table(
+        'bookings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('scheduled_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('client_id', sa.Integer(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['client_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['service_id'], ['services.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    create_table(
+        'payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('method', sa.String(length=50), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('transaction_id', sa.String(length=120), nullable=True),
+        sa.Column('payment_date', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('booking_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['booking_id'], ['bookings.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('transaction_id'),
+    )
+
+
+def downgrade():
+    for table in ('payments', 'bookings', 'services', 'reviews', 'ai_suggestions', 'user_roles',
+                  'professionals', 'jobs', 'users', 'roles'):
+        op.drop_table(table)
@@ -0,0 +1,34 @@
+"""per-table data versions for ETags and response caching
+
+Revision ID: 034
+Revises: 000
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '034'
+down_revision = '000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every commit that writes a tracked table bumps its row here (see
+    # app/http_cache.py), so this must exist before any later revision's
+    # code runs against the database.
+    if sa.inspect(op.get_bind()).has_table('data_versions'):
+        return  # created by db.create_all()
+    op.create_table(
+        'data_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade():
+    op.drop_table('data_versions')
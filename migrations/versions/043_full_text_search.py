@@ -0,0 +1,30 @@
+"""full-text search index over jobs and professionals
+
+Revision ID: 043
+Revises: 034
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import install, rebuild, uninstall
+
+
+# revision identifiers, used by Alembic.
+revision = '043'
+down_revision = '034'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 tables and triggers on SQLite, generated tsvector columns with GIN
+    # indexes on PostgreSQL (see app/search.py). Existing rows are indexed.
+    connection = op.get_bind()
+    install(connection)
+    rebuild(connection)
+
+
+def downgrade():
+    uninstall(op.get_bind())
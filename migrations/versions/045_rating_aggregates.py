@@ -0,0 +1,60 @@
+"""rating aggregates on professionals
+
+Revision ID: 045
+Revises: 043
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import install as install_search
+
+
+# revision identifiers, used by Alembic.
+revision = '045'
+down_revision = '043'
+branch_labels = None
+depends_on = None
+
+HISTOGRAM = [f'rating_count_{stars}' for stars in range(1, 6)]
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('professionals')}
+    if 'rating_sum' in columns:
+        return  # created by db.create_all() with the aggregates in place
+
+    # Plain ADD COLUMN: a batch table rebuild on SQLite would drop the
+    # search triggers from 043.
+    op.add_column('professionals', sa.Column('rating_sum', sa.Float(), nullable=True, server_default='0'))
+    for name in HISTOGRAM:
+        op.add_column('professionals', sa.Column(name, sa.Integer(), nullable=True, server_default='0'))
+    op.create_index('ix_professionals_rating', 'professionals', ['rating'])
+
+    # Backfill from visible reviews; total_reviews and rating previously
+    # counted hidden reviews too. Same buckets as app.ratings.stars().
+    visible = 'FROM reviews r WHERE r.professional_id = professionals.id AND r.is_visible IS NOT false'
+    bucket = ('CASE WHEN r.rating < 1.5 THEN 1 WHEN r.rating < 2.5 THEN 2 WHEN r.rating < 3.5 THEN 3 '
+              'WHEN r.rating < 4.5 THEN 4 ELSE 5 END')
+    histogram = ', '.join(
+        f'{name} = (SELECT count(*) {visible} AND {bucket} = {stars})'
+        for stars, name in enumerate(HISTOGRAM, start=1)
+    )
+    op.execute(f"""
+        UPDATE professionals SET
+            total_reviews = (SELECT count(*) {visible}),
+            rating_sum = (SELECT coalesce(sum(r.rating), 0) {visible}),
+            rating = coalesce((SELECT avg(r.rating) {visible}), 0),
+            {histogram}
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_professionals_rating', table_name='professionals')
+    with op.batch_alter_table('professionals') as batch_op:
+        for name in reversed(HISTOGRAM):
+            batch_op.drop_column(name)
+        batch_op.drop_column('rating_sum')
+    # Recreate the search triggers the SQLite table rebuild dropped.
+    install_search(op.get_bind())
@@ -0,0 +1,43 @@
+"""composite indexes for hot query predicates
+
+Revision ID: 046
+Revises: 045
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '046'
+down_revision = '045'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns); benchmarks/check_query_plans.py checks the queries
+# they serve.
+INDEXES = [
+    ('idx_professional_available_rating', 'professionals', ['is_available', 'rating']),
+    ('idx_professional_available_location', 'professionals', ['is_available', 'latitude', 'longitude']),
+    ('idx_review_professional_visible', 'reviews', ['professional_id', 'is_visible']),
+    ('idx_review_client', 'reviews', ['client_id']),
+    ('idx_booking_client_scheduled', 'bookings', ['client_id', 'scheduled_at']),
+    ('idx_booking_service_scheduled', 'bookings', ['service_id', 'scheduled_at']),
+    ('idx_job_status_created', 'jobs', ['status', 'created_at']),
+    ('idx_job_poster_created', 'jobs', ['poster_id', 'created_at']),
+    ('idx_suggestion_job_score', 'ai_suggestions', ['job_id', 'score']),
+    ('idx_suggestion_professional', 'ai_suggestions', ['professional_id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if not inspector.has_index(table, name):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
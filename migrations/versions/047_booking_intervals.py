@@ -0,0 +1,58 @@
+"""booking durations and per-professional interval index
+
+Revision ID: 047
+Revises: 046
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '047'
+down_revision = '046'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('bookings')}
+    if 'ends_at' in columns:
+        return  # created by db.create_all() with the intervals in place
+
+    # bookings has no search triggers, so a batch rebuild on SQLite is safe.
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.add_column(sa.Column('duration_minutes', sa.Integer(), nullable=False, server_default='60'))
+        batch_op.add_column(sa.Column('ends_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('professional_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_bookings_professional_id', 'professionals',
+                                    ['professional_id'], ['id'], ondelete='CASCADE')
+
+    op.execute("""
+        UPDATE bookings SET
+            professional_id = (SELECT s.professional_id FROM services s WHERE s.id = bookings.service_id)
+    """)
+    # ends_at is computed the way the model does, so fractional seconds survive
+    # and SQLite stores the same text format SQLAlchemy writes.
+    bookings = sa.table('bookings', sa.column('id', sa.Integer), sa.column('scheduled_at', sa.DateTime),
+                        sa.column('duration_minutes', sa.Integer), sa.column('ends_at', sa.DateTime))
+    connection = op.get_bind()
+    rows = [{'booking_id': booking_id, 'ends_at': scheduled_at + timedelta(minutes=minutes)}
+            for booking_id, scheduled_at, minutes in connection.execute(
+                sa.select(bookings.c.id, bookings.c.scheduled_at, bookings.c.duration_minutes))]
+    if rows:
+        connection.execute(bookings.update().where(bookings.c.id == sa.bindparam('booking_id')), rows)
+    op.create_index('idx_booking_professional_interval', 'bookings',
+                    ['professional_id', 'scheduled_at', 'ends_at'])
+
+
+def downgrade():
+    op.drop_index('idx_booking_professional_interval', table_name='bookings')
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.drop_constraint('fk_bookings_professional_id', type_='foreignkey')
+        batch_op.drop_column('professional_id')
+        batch_op.drop_column('ends_at')
+        batch_op.drop_column('duration_minutes')
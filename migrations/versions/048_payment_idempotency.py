@@ -0,0 +1,50 @@
+"""payment idempotency keys and STK push checkout ids
+
+Revision ID: 048
+Revises: 047
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '048'
+down_revision = '047'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('payments')}
+    if 'idempotency_key' in columns:
+        return  # created by db.create_all() with the keys in place
+
+    op.add_column('payments', sa.Column('idempotency_key', sa.String(length=32), nullable=True))
+    op.add_column('payments', sa.Column('checkout_request_id', sa.String(length=64), nullable=True))
+
+    payments = sa.table('payments', sa.column('id', sa.Integer), sa.column('idempotency_key', sa.String))
+    connection = op.get_bind()
+    ids = [row.id for row in connection.execute(sa.select(payments.c.id))]
+    if ids:
+        connection.execute(
+            payments.update().where(payments.c.id == sa.bindparam('payment_id')),
+            [{'payment_id': payment_id, 'idempotency_key': uuid.uuid4().hex} for payment_id in ids],
+        )
+
+    # payments has no search triggers, so a batch rebuild on SQLite is safe.
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.alter_column('idempotency_key', existing_type=sa.String(length=32), nullable=False)
+        batch_op.create_unique_constraint('uq_payments_idempotency_key', ['idempotency_key'])
+        batch_op.create_unique_constraint('uq_payments_checkout_request_id', ['checkout_request_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_constraint('uq_payments_checkout_request_id', type_='unique')
+        batch_op.drop_constraint('uq_payments_idempotency_key', type_='unique')
+        batch_op.drop_column('checkout_request_id')
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,25 @@
+"""index pending payments for reconciliation
+
+Revision ID: 049
+Revises: 048
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '049'
+down_revision = '048'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_index('payments', 'idx_payment_status_id'):
+        op.create_index('idx_payment_status_id', 'payments', ['status', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_payment_status_id', table_name='payments')
@@ -0,0 +1,52 @@
+"""analytics rollup table and created_at indexes on its sources
+
+Revision ID: 050
+Revises: 049
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '050'
+down_revision = '049'
+branch_labels = None
+depends_on = None
+
+# Rollups read their sources by created_at range (see app/analytics.py).
+SOURCE_INDEXES = [
+    ('idx_job_created', 'jobs'),
+    ('idx_suggestion_created', 'ai_suggestions'),
+    ('idx_payment_created', 'payments'),
+    ('idx_booking_created', 'bookings'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('analytics_rollups'):
+        op.create_table(
+            'analytics_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('metric', sa.String(length=32), nullable=False),
+            sa.Column('period', sa.String(length=8), nullable=False),
+            sa.Column('bucket', sa.DateTime(), nullable=False),
+            sa.Column('dimension', sa.String(length=100), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('metric', 'period', 'bucket', 'dimension', name='uq_rollup_bucket'),
+        )
+        op.create_index('idx_rollup_period_bucket', 'analytics_rollups', ['period', 'bucket'])
+    for name, table in SOURCE_INDEXES:
+        if not inspector.has_index(table, name):
+            op.create_index(name, table, ['created_at'])
+
+
+def downgrade():
+    for name, table in reversed(SOURCE_INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_index('idx_rollup_period_bucket', table_name='analytics_rollups')
+    op.drop_table('analytics_rollups')
@@ -0,0 +1,31 @@
+"""payment STK push times for reconciliation
+
+Revision ID: 051
+Revises: 050
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '051'
+down_revision = '050'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('payments')}
+    if 'pushed_at' in columns:
+        return  # created by db.create_all()
+
+    op.add_column('payments', sa.Column('pushed_at', sa.DateTime(), nullable=True))
+    # Pushed payments were last written when M-Pesa accepted the push.
+    op.execute('UPDATE payments SET pushed_at = updated_at WHERE checkout_request_id IS NOT NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('pushed_at')
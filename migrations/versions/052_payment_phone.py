@@ -0,0 +1,29 @@
+"""phone number each payment was pushed to
+
+Revision ID: 052
+Revises: 051
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '052'
+down_revision = '051'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('payments')}
+    if 'phone' in columns:
+        return  # created by db.create_all()
+    # Left NULL for payments pushed before this; their callbacks are checked by amount only.
+    op.add_column('payments', sa.Column('phone', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('phone')
@@ -0,0 +1,51 @@
+"""cap stored booking durations at a day
+
+Revision ID: 053
+Revises: 052
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '053'
+down_revision = '052'
+branch_labels = None
+depends_on = None
+
+MAX_BOOKING_MINUTES = 24 * 60
+
+
+def upgrade():
+    connection = op.get_bind()
+    names = {check['name'] for check in sa.inspect(connection).get_check_constraints('bookings')}
+    if 'ck_booking_duration' in names:
+        return  # created by db.create_all()
+
+    # Availability queries only look back MAX_BOOKING_MINUTES from a window's
+    # start, so clamp anything longer (and anything not positive) first.
+    bookings = sa.table('bookings', sa.column('id', sa.Integer), sa.column('scheduled_at', sa.DateTime),
+                        sa.column('duration_minutes', sa.Integer), sa.column('ends_at', sa.DateTime))
+    rows = []
+    for booking_id, scheduled_at, minutes in connection.execute(
+            sa.select(bookings.c.id, bookings.c.scheduled_at, bookings.c.duration_minutes)
+            .where(sa.or_(bookings.c.duration_minutes < 1, bookings.c.duration_minutes > MAX_BOOKING_MINUTES))):
+        minutes = max(1, min(minutes, MAX_BOOKING_MINUTES))
+        rows.append({'booking_id': booking_id, 'duration_minutes': minutes,
+                     'ends_at': scheduled_at + timedelta(minutes=minutes)})
+    if rows:
+        connection.execute(bookings.update().where(bookings.c.id == sa.bindparam('booking_id')), rows)
+
+    # bookings has no search triggers, so a batch rebuild on SQLite is safe.
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.create_check_constraint('ck_booking_duration',
+                                         f'duration_minutes BETWEEN 1 AND {MAX_BOOKING_MINUTES}')
+
+
+def downgrade():
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.drop_constraint('ck_booking_duration', type_='check')
@@ -0,0 +1,32 @@
+import pytest
+from contextlib import contextmanager
+from app.query_tracker import track_queries
+
+
+@pytest.fixture
+def query_budget():
+    """Assert that a block stays within a query budget.
+
+    Usage:
+        with query_budget(5):
+            client.get('/dashboard')
+    """
+    @contextmanager
+    def _budget(max_queries, max_repeats=None):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= max_queries, f'Query budget of {max_queries} exceeded\n{stats.report()}'
+        if max_repeats is not None:
+            repeated = stats.repeated(max_repeats + 1)
+            assert not repeated, f'Statement repeated more than {max_repeats} times\n{stats.report()}'
+    return _budget
+
+
+@pytest.fixture
+def mpesa_stub():
+    """A local M-Pesa API stub (see test/mpesa_stub.py), stopped afterwards."""
+    from test.mpesa_stub import MpesaStub
+
+    stub = MpesaStub().start()
+    yield stub
+    stub.stop()
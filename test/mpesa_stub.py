@@ -0,0 +1,119 @@
+"""A local stand-in for the M-Pesa Daraja API, served on a random port.
+
+Implements the OAuth token, STK push and STK push query endpoints closely
+enough to exercise app/payments over real HTTP, and records what it saw.
+"""
+import base64
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONSUMER_KEY = 'stub-key'
+CONSUMER_SECRET = 'stub-secret'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/oauth/v1/generate' or parse_qs(url.query).get('grant_type') != ['client_credentials']:
+            return self._reply(404, {'errorMessage': 'Not found'})
+        expected = base64.b64encode(f'{CONSUMER_KEY}:{CONSUMER_SECRET}'.encode()).decode()
+        if self.headers.get('Authorization') != f'Basic {expected}':
+            return self._reply(400, {'errorMessage': 'Invalid credentials'})
+        self._reply(200, {'access_token': self.server.issue_token(),
+                          'expires_in': str(self.server.token_lifetime)})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        token = (self.headers.get('Authorization') or '').removeprefix('Bearer ')
+        if token not in self.server.valid_tokens:
+            return self._reply(401, {'errorMessage': 'Invalid Access Token'})
+        if self.path == '/mpesa/stkpush/v1/processrequest':
+            return self._reply(200, self.server.push(body, self.headers.get('Idempotency-Key')))
+        if self.path == '/mpesa/stkpushquery/v1/query':
+            return self._reply(*self.server.query(body))
+        self._reply(404, {'errorMessage': 'Not found'})
+
+
+class MpesaStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.token_lifetime = 3599
+        self.token_requests = 0
+        self.valid_tokens = set()
+        self.pushes = []
+        self.queries = []
+        # CheckoutRequestID -> (ResultCode, ResultDesc) for status queries;
+        # ids not listed are still being processed.
+        self.results = {}
+        self.failing = set()  # CheckoutRequestIDs whose query returns HTTP 503
+        self.push_delay = 0.0  # seconds an STK push takes to answer
+        self._ids = itertools.count(1)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def issue_token(self):
+        with self.lock:
+            self.token_requests += 1
+            token = f'token-{self.token_requests}'
+            self.valid_tokens.add(token)
+        return token
+
+    def push(self, body, idempotency_key):
+        time.sleep(self.push_delay)
+        with self.lock:
+            checkout_request_id = f'ws_CO_{next(self._ids)}'
+            self.pushes.append({**body, 'Idempotency-Key': idempotency_key})
+        return {'MerchantRequestID': f'mr-{checkout_request_id}', 'CheckoutRequestID': checkout_request_id,
+                'ResponseCode': '0', 'ResponseDescription': 'Success. Request accepted for processing',
+                'CustomerMessage': 'Success. Request accepted for processing'}
+
+    def query(self, body):
+        checkout_request_id = body.get('CheckoutRequestID')
+        with self.lock:
+            self.queries.append(checkout_request_id)
+            result = self.results.get(checkout_request_id)
+        if checkout_request_id in self.failing:
+            return 503, {'errorMessage': 'Service unavailable'}
+        if result is None:
+            return 500, {'requestId': checkout_request_id, 'errorCode': '500.001.1001',
+                         'errorMessage': 'The transaction is being processed'}
+        code, description = result
+        return 200, {'ResponseCode': '0', 'ResponseDescription': 'The service request has been accepted',
+                     'CheckoutRequestID': checkout_request_id, 'ResultCode': str(code), 'ResultDesc': description}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,123 @@
+import itertools
+import json
+import logging
+import queue
+import time
+
+import pytest
+
+from app import access_log, create_app
+from app.access_log import DroppingQueueHandler, access_logger, stop_listener
+from config import TestingConfig
+
+
+class Collector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.access)
+
+    @property
+    def paths(self):
+        return [record['path'] for record in self.records]
+
+
+@pytest.fixture
+def logged():
+    # skillhub.access does not propagate, so caplog cannot see it.
+    collector = Collector()
+    access_logger.addHandler(collector)
+    yield collector
+    access_logger.removeHandler(collector)
+
+
+def make_app(**settings):
+    app = create_app(type('AccessLogConfig', (TestingConfig,), settings))
+    app.add_url_rule('/ok', 'ok', lambda: 'ok')
+    app.add_url_rule('/error', 'error', lambda: ('error', 503))
+
+    def boom():
+        raise RuntimeError('boom')
+
+    app.add_url_rule('/boom', 'boom', boom)
+    return app
+
+
+def test_records_one_line_per_request(logged):
+    client = make_app().test_client()
+    client.get('/ok?x=1')
+    [record] = logged.records
+    assert record['method'] == 'GET'
+    assert record['path'] == '/ok'
+    assert record['endpoint'] == 'ok'
+    assert record['status'] == 200
+    assert record['bytes'] == 2
+    assert record['duration_ms'] >= 0
+
+
+def test_sample_rate(logged, monkeypatch):
+    rolls = itertools.cycle([0.1, 0.3, 0.2, 0.9])
+    monkeypatch.setattr(access_log.random, 'random', lambda: next(rolls))
+    client = make_app(ACCESS_LOG_SAMPLE_RATE=0.25).test_client()
+    for _ in range(8):
+        client.get('/ok')
+    assert len(logged.records) == 4  # the 0.1 and 0.2 rolls of each cycle
+
+
+def test_nothing_sampled_at_rate_zero(logged):
+    client = make_app(ACCESS_LOG_SAMPLE_RATE=0.0).test_client()
+    for _ in range(20):
+        client.get('/ok')
+    assert logged.records == []
+
+
+def test_skip_prefixes(logged):
+    client = make_app(ACCESS_LOG_SKIP_PREFIXES=('/static/', '/ok')).test_client()
+    client.get('/static/missing.css')
+    client.get('/ok')
+    client.get('/error')
+    assert logged.paths == ['/error']
+
+
+def test_slow_and_server_errors_are_always_kept(logged):
+    client = make_app(ACCESS_LOG_SAMPLE_RATE=0.0).test_client()
+    client.get('/error')
+    with pytest.raises(RuntimeError):
+        client.get('/boom')
+    assert [(record['path'], record['status']) for record in logged.records] == [('/error', 503), ('/boom', 500)]
+
+    logged.records.clear()
+    client = make_app(ACCESS_LOG_SAMPLE_RATE=0.0, ACCESS_LOG_SLOW_MS=0).test_client()
+    client.get('/ok')
+    assert logged.paths == ['/ok']
+
+
+def test_full_queue_drops_without_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    before = DroppingQueueHandler.dropped
+    start = time.monotonic()
+    for i in range(5):
+        handler.handle(logging.makeLogRecord({'msg': f'record {i}'}))
+    assert time.monotonic() - start < 1
+    assert DroppingQueueHandler.dropped - before == 3
+    assert handler.queue.qsize() == 2
+
+
+def test_stop_listener_flushes_and_logging_resumes_after_restart(capsys):
+    stop_listener()
+    client = make_app().test_client()  # starts a listener writing to the captured stdout
+    writer = access_log._listener._thread
+    client.get('/ok')
+    stop_listener()
+    assert access_log._listener is None
+    assert not writer.is_alive()
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {'path': '/ok', 'status': 200}.items() <= next(line for line in lines if 'path' in line).items()
+
+    # Loggers configured before the stop still reach the restarted listener.
+    client = make_app().test_client()
+    client.get('/error')
+    stop_listener()
+    assert any(json.loads(line).get('path') == '/error' for line in capsys.readouterr().out.splitlines())
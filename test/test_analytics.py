@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from app.analytics import backfill, refresh, roll_up, series, totals
+from app.fragment_cache import fragment_cache
+from app.identity_cache import identity_cache
+from app.modules import AISuggestion, AnalyticsRollup, Booking, Job, Payment, Professional, Service, User
+from config import TestingConfig
+
+DAY = datetime(2026, 3, 2)
+
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        admin = User(email='admin@example.com', full_name='Admin', password_hash='x', role='admin')
+        client = User(email='client@example.com', full_name='Client', password_hash='x')
+        pro_user = User(email='pro@example.com', full_name='Pro', password_hash='x')
+        pro = Professional(user=pro_user, full_name='Pro', profession='Plumber')
+        service = Service(title='Repair', description='-', category='Plumbing', price=100,
+                          provider=pro_user, professional=pro)
+        db.session.add(admin)
+        for i, (profession, created) in enumerate([('Plumber', at(9, 5)), ('Plumber', at(9, 50)),
+                                                   ('Electrician', at(10, 15)), ('Plumber', at(26))]):
+            job = Job(title=f'Job {i}', description='-', profession=profession, poster=client, created_at=created)
+            db.session.add(AISuggestion(job=job, professional=pro, score=0.5, created_at=created,
+                                        is_contacted=i > 0, is_interested={2: True, 3: False}.get(i)))
+        for i, (status, amount) in enumerate([('completed', 100), ('completed', 250), ('failed', 40)]):
+            booking = Booking(client=client, service=service, scheduled_at=at(48 + i), created_at=at(11, i))
+            db.session.add(Payment(booking=booking, amount=amount, status=status, created_at=at(11, i)))
+        db.session.commit()
+    fragment_cache.clear()
+    identity_cache.clear()
+    yield app
+    fragment_cache.clear()
+    identity_cache.clear()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_refresh_rolls_up_hours_and_days(app):
+    with app.app_context():
+        refresh(DAY, DAY + timedelta(days=2))
+        db.session.commit()
+
+        assert series('jobs', 'hour', DAY, DAY + timedelta(days=2)) == [
+            {'bucket': '2026-03-02T09:00:00', 'dimension': 'Plumber', 'count': 2, 'total': 0.0},
+            {'bucket': '2026-03-02T10:00:00', 'dimension': 'Electrician', 'count': 1, 'total': 0.0},
+            {'bucket': '2026-03-03T02:00:00', 'dimension': 'Plumber', 'count': 1, 'total': 0.0},
+        ]
+        assert series('jobs', 'day', DAY, DAY + timedelta(days=2)) == [
+            {'bucket': '2026-03-02T00:00:00', 'dimension': 'Electrician', 'count': 1, 'total': 0.0},
+            {'bucket': '2026-03-02T00:00:00', 'dimension': 'Plumber', 'count': 2, 'total': 0.0},
+            {'bucket': '2026-03-03T00:00:00', 'dimension': 'Plumber', 'count': 1, 'total': 0.0},
+        ]
+        assert totals('payments', DAY, DAY + timedelta(days=1)) == {'completed': (2, 350.0), 'failed': (1, 40.0)}
+        assert totals('suggestions', DAY, DAY + timedelta(days=2)) == {
+            'pending': (1, 0.5), 'contacted': (1, 0.5), 'interested': (1, 0.5), 'declined': (1, 0.5)}
+        assert totals('bookings', DAY, DAY + timedelta(days=2)) == {'pending': (3, 0.0)}
+
+        # Refreshing again replaces rather than adds to the rollups.
+        rows = db.session.scalar(db.select(db.func.count()).select_from(AnalyticsRollup))
+        refresh(DAY, DAY + timedelta(days=2))
+        db.session.commit()
+        assert db.session.scalar(db.select(db.func.count()).select_from(AnalyticsRollup)) == rows
+
+
+def test_roll_up_picks_up_changes_within_the_lookback(app):
+    with app.app_context():
+        backfill(until=at(27))
+        assert totals('suggestions', DAY, DAY + timedelta(days=2))['pending'] == (1, 0.5)
+
+        db.session.get(AISuggestion, 1).is_contacted = True
+        db.session.delete(db.session.get(Payment, 3))
+        db.session.commit()
+        start, _ = roll_up(now=at(28))
+
+        assert start == at(26) - timedelta(hours=48)  # ANALYTICS_LOOKBACK_HOURS before the newest hourly bucket
+        assert 'pending' not in totals('suggestions', DAY, DAY + timedelta(days=2))
+        assert totals('suggestions', DAY, DAY + timedelta(days=2))['contacted'] == (2, 1.0)
+        assert totals('payments', DAY, DAY + timedelta(days=1)) == {'completed': (2, 350.0)}
+
+
+def test_backfill_in_chunks(app):
+    with app.app_context():
+        lines = []
+        written = backfill(until=DAY + timedelta(days=3), chunk_days=1, log=lines.append)
+        assert len(lines) == 3
+        assert written == db.session.scalar(db.select(db.func.count()).select_from(AnalyticsRollup))
+        assert totals('jobs', DAY, DAY + timedelta(days=3)) == {'Plumber': (3, 0.0), 'Electrician': (1, 0.0)}
+
+
+def test_cli(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['analytics', 'backfill', '--since', '2026-03-01'])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[-1].startswith('Backfilled ')
+    result = runner.invoke(args=['analytics', 'rollup'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Rolled up ')
+    with app.app_context():
+        assert totals('jobs', DAY, DAY + timedelta(days=2)) == {'Plumber': (3, 0.0), 'Electrician': (1, 0.0)}
+
+
+def logged_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    return client
+
+
+def test_analytics_api(app):
+    with app.app_context():
+        backfill(until=DAY + timedelta(days=2))
+    client = logged_in(app, 1)
+    response = client.get('/admin/api/analytics/payments',
+                          query_string={'period': 'hour', 'start': '2026-03-02', 'end': '2026-03-03'})
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {'bucket': '2026-03-02T11:00:00', 'dimension': 'completed', 'count': 2, 'total': 350.0},
+        {'bucket': '2026-03-02T11:00:00', 'dimension': 'failed', 'count': 1, 'total': 40.0},
+    ]
+    # Offsets are converted to UTC buckets.
+    response = client.get('/admin/api/analytics/jobs',
+                          query_string={'period': 'hour', 'start': '2026-03-02T12:00:00+03:00',
+                                        'end': '2026-03-02T13:00:00+03:00'})
+    assert [row['bucket'] for row in response.get_json()] == ['2026-03-02T09:00:00']
+
+    assert client.get('/admin/api/analytics/users').status_code == 400
+    assert client.get('/admin/api/analytics/jobs', query_string={'period': 'week'}).status_code == 400
+    assert client.get('/admin/api/analytics/jobs', query_string={'start': 'yesterday'}).status_code == 400
+    assert client.get('/admin/api/analytics/jobs',
+                      query_string={'period': 'hour', 'start': '2026-01-01', 'end': '2026-03-01'}).status_code == 400
+    assert logged_in(app, 2).get('/admin/api/analytics/jobs').status_code == 403
+
+
+def test_admin_pages_read_rollups(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        for model in (Job, AISuggestion, Booking, Payment):
+            db.session.execute(db.update(model).values(created_at=now - timedelta(hours=1)))
+        db.session.commit()
+        roll_up()
+    client = logged_in(app, 1)
+
+    page = client.get('/admin/dashboard')
+    assert page.status_code == 200
+    assert b'4 jobs posted' in page.data
+    assert b'350' in page.data
+
+    page = client.get('/admin/ai-analytics')
+    assert page.status_code == 200
+    assert b'75%' in page.data  # three of four suggestions contacted
+    assert b'33%' in page.data  # one of those three interested
+
+    assert logged_in(app, 2).get('/admin/dashboard').status_code == 403
+    assert app.test_client().get('/admin/dashboard').status_code == 302  # to the login page
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from flask import url_for
+
+from app import assets, create_app
+from app.assets import build_assets, hashed_name, is_immutable
+from config import TestingConfig
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body { color: red; }\n' * 200)
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'logo.png').write_bytes(b'\x89PNG' + b'\0' * 100)
+    (tmp_path / 'uploads').mkdir()
+    (tmp_path / 'uploads' / 'avatar.jpg').write_bytes(b'jpeg')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'input.css').write_text('@tailwind base;')
+    return tmp_path
+
+
+def test_build_writes_hashed_copies_and_manifest(static_folder):
+    manifest = build_assets(str(static_folder))
+    css = (static_folder / 'css' / 'site.css').read_bytes()
+    assert manifest == {
+        'css/site.css': 'dist/' + hashed_name('css/site.css', css),
+        'images/logo.png': 'dist/' + hashed_name('images/logo.png', (static_folder / 'images' / 'logo.png').read_bytes()),
+    }
+    assert json.loads((static_folder / 'dist' / 'manifest.json').read_text()) == manifest
+    hashed = static_folder / manifest['css/site.css']
+    assert hashed.read_bytes() == css
+    assert hashed.with_name(hashed.name + '.gz').exists()
+    logo = static_folder / manifest['images/logo.png']
+    assert not logo.with_name(logo.name + '.gz').exists()
+
+
+def test_rebuild_keeps_old_versions_unless_cleaned(static_folder):
+    old = static_folder / build_assets(str(static_folder))['css/site.css']
+    (static_folder / 'css' / 'site.css').write_text('body { color: blue; }')
+    new = static_folder / build_assets(str(static_folder))['css/site.css']
+    assert old != new and old.exists()
+    build_assets(str(static_folder), clean=True)
+    assert new.exists() and not old.exists()
+    assert not old.with_name(old.name + '.gz').exists()
+
+
+def test_only_hashed_dist_urls_are_immutable():
+    assert is_immutable('', '/static/dist/css/tailwind.0123456789ab.css')
+    assert not is_immutable('', '/static/css/tailwind.css')
+    assert not is_immutable('', '/static/dist/manifest.json')
+
+
+def make_app(monkeypatch, manifest, enabled=True):
+    monkeypatch.setattr(assets, 'load_manifest', lambda folder: manifest)
+
+    class AssetConfig(TestingConfig):
+        ASSET_MANIFEST = enabled
+
+    return create_app(AssetConfig)
+
+
+def test_url_for_uses_manifest(monkeypatch):
+    app = make_app(monkeypatch, {'css/tailwind.css': 'dist/css/tailwind.0123456789ab.css'})
+    with app.test_request_context():
+        assert url_for('static', filename='css/tailwind.css') == '/static/dist/css/tailwind.0123456789ab.css'
+        assert url_for('static', filename='js/map.js') == '/static/js/map.js'
+
+
+@pytest.mark.parametrize('manifest, enabled', [(None, True), ({'css/tailwind.css': 'dist/x.css'}, False)])
+def test_plain_urls_without_manifest(monkeypatch, manifest, enabled):
+    app = make_app(monkeypatch, manifest, enabled)
+    with app.test_request_context():
+        assert url_for('static', filename='css/tailwind.css') == '/static/css/tailwind.css'
+
+
+def test_build_command(static_folder, monkeypatch):
+    app = create_app(TestingConfig)
+    app.static_folder = str(static_folder)
+    result = app.test_cli_runner().invoke(args=['assets', 'build'])
+    assert result.exit_code == 0
+    assert 'Wrote 2 entries to dist/manifest.json.' in result.output
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from app.ai.candidates import lexical_score, job_terms, skills_of, top_candidates
+
+
+def pro(id, profession, skills=None):
+    return SimpleNamespace(id=id, profession=profession, skills=skills)
+
+
+JOB = SimpleNamespace(title='Fix leaking kitchen pipes', description='Replace the sink trap and pipes',
+                      profession='Plumber')
+
+
+def test_skills_accept_lists_and_comma_strings():
+    assert skills_of(pro(1, 'Plumber', 'pipes, boilers ,')) == ['pipes', 'boilers']
+    assert skills_of(pro(1, 'Plumber', ['pipes'])) == ['pipes']
+    assert skills_of(pro(1, 'Plumber')) == []
+
+
+def test_profession_match_outranks_skill_overlap():
+    terms = job_terms(JOB)
+    plumber = lexical_score(terms, pro(1, 'Plumber'))
+    handyman = lexical_score(terms, pro(2, 'Handyman', 'pipes, sink'))
+    designer = lexical_score(terms, pro(3, 'Designer', 'figma'))
+    assert plumber > handyman > designer == 0
+
+
+def test_overlap_is_normalized_by_skill_count():
+    terms = job_terms(JOB)
+    focused = lexical_score(terms, pro(1, 'Handyman', 'pipes, sink'))
+    scattered = lexical_score(terms, pro(2, 'Handyman', 'pipes, sink, paint, roofing, tiles, fencing'))
+    assert focused > scattered
+
+
+def test_top_candidates_streams_and_keeps_the_best():
+    consumed = []
+
+    def stream():
+        for p in [pro(1, 'Designer', 'figma'), pro(2, 'Plumber', 'pipes'),
+                  pro(3, 'Handyman', 'sink'), pro(4, 'Plumber'), pro(5, 'Chef')]:
+            consumed.append(p.id)
+            yield p
+
+    pool = top_candidates(JOB, stream(), 3)
+    assert consumed == [1, 2, 3, 4, 5]
+    assert [p.id for p in pool] == [2, 4, 3]
+
+
+def test_ties_prefer_lower_ids():
+    pool = top_candidates(JOB, [pro(9, 'Chef'), pro(7, 'Chef'), pro(8, 'Chef')], 2)
+    assert [p.id for p in pool] == [7, 8]
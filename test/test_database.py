@@ -0,0 +1,53 @@
+from sqlalchemy import text
+
+from app import create_app, db
+from app.database import build_engine_options
+from config import ProductionConfig, TestingConfig
+
+
+def pragma(name):
+    with db.engine.connect() as connection:
+        return connection.scalar(text(f'PRAGMA {name}'))
+
+
+def test_pragmas_are_applied_to_file_databases(tmp_path):
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "app.db"}'
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('busy_timeout') == 5000
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('temp_store') == 2  # MEMORY
+        assert pragma('mmap_size') == 268435456
+        db.engine.dispose()
+
+
+def test_memory_databases_skip_wal():
+    class MemoryConfig(TestingConfig):
+        SQLITE_PRAGMAS = {**TestingConfig.SQLITE_PRAGMAS, 'busy_timeout': 1234}
+
+    app = create_app(MemoryConfig)
+    with app.app_context():
+        assert pragma('journal_mode') == 'memory'
+        assert pragma('busy_timeout') == 1234
+
+
+def test_no_pragmas_when_unset(tmp_path):
+    class PlainConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "app.db"}'
+        SQLITE_PRAGMAS = {}
+
+    app = create_app(PlainConfig)
+    with app.app_context():
+        assert pragma('journal_mode') == 'delete'
+        db.engine.dispose()
+
+
+def test_server_databases_get_pool_and_statement_timeout():
+    config = {key: getattr(ProductionConfig, key) for key in dir(ProductionConfig) if key.isupper()}
+    options = build_engine_options(config, 'postgresql://user@localhost/skillhub')
+    assert options['pool_size'] == ProductionConfig.DB_POOL_SIZE
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': f'-c statement_timeout={ProductionConfig.DB_STATEMENT_TIMEOUT_MS}'}
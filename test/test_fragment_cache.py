@@ -0,0 +1,132 @@
+import pytest
+from flask import render_template_string
+from flask_login import login_user
+
+from app import create_app, db
+from app.fragment_cache import fragment_cache, invalidate_fragments
+from app.identity_cache import identity_cache
+from app.modules import Role, User
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    renders = []
+    app.jinja_env.globals['rendered'] = lambda: renders.append(1) or len(renders)
+    app.renders = renders
+    with app.app_context():
+        db.create_all()
+        for email, name in (('a@example.com', 'Alice'), ('b@example.com', 'Bob')):
+            user = User(email=email, full_name=name)
+            user.set_password('testpass123')
+            db.session.add(user)
+        db.session.add(Role(name='admin'))
+        db.session.commit()
+    fragment_cache.clear()
+    identity_cache.clear()
+    yield app
+    fragment_cache.clear()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def render(app, source, user_id=None, **context):
+    with app.test_request_context():
+        if user_id is not None:
+            login_user(db.session.get(User, user_id))
+        return render_template_string(source, **context)
+
+
+def test_shared_fragment_renders_once(app):
+    source = "{% cache 'hero' %}<b>{{ rendered() }}</b>{% endcache %}"
+    assert render(app, source) == '<b>1</b>'
+    assert render(app, source, user_id=1) == '<b>1</b>'
+    assert app.renders == [1]
+
+
+def test_key_expression_separates_copies(app):
+    source = "{% cache ('card', item) %}{{ item }}{% endcache %}"
+    assert render(app, source, item=1) == '1'
+    assert render(app, source, item=2) == '2'
+
+
+def test_vary_on_user(app):
+    source = "{% cache 'nav', vary='user' %}{{ current_user.full_name or 'guest' }}{% endcache %}"
+    assert render(app, source) == 'guest'
+    assert render(app, source, user_id=1) == 'Alice'
+    assert render(app, source, user_id=2) == 'Bob'
+    assert render(app, source, user_id=1) == 'Alice'
+    assert render(app, source) == 'guest'
+
+
+def test_vary_on_role_shares_between_users_with_same_roles(app):
+    source = "{% cache 'menu', 60, vary='role' %}{{ rendered() }}{% endcache %}"
+    assert render(app, source, user_id=1) == '1'
+    assert render(app, source, user_id=2) == '1'
+    with app.app_context():
+        db.session.get(User, 2).roles.append(Role.query.one())
+        db.session.commit()
+    assert render(app, source, user_id=2) == '2'
+    assert render(app, source) == '3'
+
+
+def test_body_is_not_escaped_twice(app):
+    source = "{% cache 'escaped' %}{{ value }}<i>{% endcache %}"
+    assert render(app, source, value='<b>') == '&lt;b&gt;<i>'
+    assert render(app, source, value='ignored') == '&lt;b&gt;<i>'
+
+
+def test_explicit_invalidation(app):
+    source = "{% cache (name, 1) %}{{ rendered() }}{% endcache %}"
+    assert render(app, source, name='a') == '1'
+    assert render(app, source, name='b') == '2'
+    invalidate_fragments('a')
+    assert render(app, source, name='a') == '3'
+    assert render(app, source, name='b') == '2'
+    invalidate_fragments()
+    assert render(app, source, name='b') == '4'
+
+
+def test_user_change_drops_their_fragments(app):
+    source = "{% cache 'nav', vary='user' %}{{ current_user.full_name }}{% endcache %}"
+    assert render(app, source, user_id=1) == 'Alice'
+    assert render(app, source, user_id=2) == 'Bob'
+    with app.app_context():
+        db.session.get(User, 1).full_name = 'Alicia'
+        db.session.commit()
+    assert render(app, source, user_id=1) == 'Alicia'
+    assert len([key for key in fragment_cache._data if key[2] == ('user', 2)]) == 1
+
+
+def test_rolled_back_change_keeps_fragments(app):
+    source = "{% cache 'nav', vary='user' %}{{ rendered() }}{% endcache %}"
+    render(app, source, user_id=1)
+    with app.app_context():
+        db.session.get(User, 1).full_name = 'Alicia'
+        db.session.flush()
+        db.session.rollback()
+    assert render(app, source, user_id=1) == '1'
+
+
+def test_disabled_cache_renders_every_time(app):
+    app.config['FRAGMENT_CACHE_ENABLED'] = False
+    source = "{% cache 'hero' %}{{ rendered() }}{% endcache %}"
+    assert render(app, source) == '1'
+    assert render(app, source) == '2'
+
+
+def test_unknown_vary_is_rejected(app):
+    with pytest.raises(ValueError):
+        render(app, "{% cache 'x', vary='team' %}{% endcache %}")
+
+
+def test_base_nav_follows_profile_changes(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'a@example.com', 'password': 'testpass123'})
+    assert b'Alice' in client.get('/dashboard').data
+    with app.app_context():
+        db.session.get(User, 1).full_name = 'Alicia'
+        db.session.commit()
+    assert b'Alicia' in client.get('/dashboard').data
@@ -0,0 +1,76 @@
+import pytest
+from flask import jsonify
+from app import create_app, db
+from app.http_cache import cached_json, data_version, response_cache
+from app.modules import Professional, User
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    calls = []
+
+    @app.route('/test/professionals')
+    @cached_json('professionals')
+    def list_professionals():
+        calls.append(1)
+        return jsonify([p.full_name for p in Professional.query.order_by(Professional.id)])
+
+    app.view_calls = calls
+    with app.app_context():
+        db.create_all()
+        user = User(email='pro@example.com', full_name='Pro', password_hash='x')
+        db.session.add(Professional(user=user, full_name='First Pro', profession='Plumber'))
+        db.session.commit()
+    response_cache.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_repeat_poll_gets_304(app):
+    client = app.test_client()
+    first = client.get('/test/professionals')
+    assert first.status_code == 200
+    assert first.headers['ETag']
+
+    again = client.get('/test/professionals', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_body_served_from_cache_without_rerunning_view(app):
+    client = app.test_client()
+    assert client.get('/test/professionals').json == ['First Pro']
+    assert client.get('/test/professionals').json == ['First Pro']
+    assert len(app.view_calls) == 1
+
+
+def test_write_changes_version_and_etag(app):
+    client = app.test_client()
+    etag = client.get('/test/professionals').headers['ETag']
+    with app.app_context():
+        before = data_version('professionals')
+        Professional.query.first().full_name = 'Renamed Pro'
+        db.session.commit()
+        assert data_version('professionals') != before
+
+    response = client.get('/test/professionals', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json == ['Renamed Pro']
+    assert response.headers['ETag'] != etag
+
+
+def test_cached_response_keeps_headers(app):
+    @app.route('/test/linked')
+    @cached_json('professionals')
+    def linked():
+        response = jsonify([])
+        response.headers['Link'] = '</test/linked?cursor=abc>; rel="next"'
+        return response
+
+    client = app.test_client()
+    assert client.get('/test/linked').headers['Link'] == '</test/linked?cursor=abc>; rel="next"'
+    assert client.get('/test/linked').headers['Link'] == '</test/linked?cursor=abc>; rel="next"'
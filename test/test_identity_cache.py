@@ -0,0 +1,78 @@
+import pytest
+from app import create_app, db
+from app.identity_cache import identity_cache, load_cached_user
+from app.modules import Role, User
+from app.utils import role_required
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email='test@example.com', full_name='Test User')
+        user.set_password('testpass123')
+        db.session.add(user)
+        db.session.add(Role(name='admin'))
+        db.session.commit()
+    identity_cache.clear()
+    yield app
+    identity_cache.clear()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def login(client):
+    return client.post('/auth/login', data={'email': 'test@example.com', 'password': 'testpass123'})
+
+
+def test_authenticated_request_skips_user_lookup(app, query_budget):
+    client = app.test_client()
+    login(client)
+    with query_budget(0):
+        response = client.get('/dashboard')
+    assert response.status_code == 200
+
+
+def test_cached_user_is_attached_and_roles_come_from_memory(app, query_budget):
+    with app.app_context():
+        load_cached_user(1)
+        db.session.remove()
+        with query_budget(0):
+            user = load_cached_user(1)
+            assert user.full_name == 'Test User'
+            assert not user.has_role('admin')
+        assert user in db.session
+
+
+def test_role_change_invalidates_cache(app):
+    with app.app_context():
+        user = load_cached_user(1)
+        assert 1 in identity_cache._data
+        user.roles.append(Role.query.filter_by(name='admin').one())
+        db.session.commit()
+        assert 1 not in identity_cache._data
+        db.session.remove()
+        assert load_cached_user(1).has_role('admin')
+
+
+def test_role_required_checks_the_role_column_from_cache(app, query_budget):
+    app.add_url_rule('/admin-only', 'admin_only', role_required('admin')(lambda: 'ok'))
+    with app.app_context():
+        user = db.session.get(User, 1)
+        user.roles.append(Role.query.filter_by(name='admin').one())
+        db.session.commit()
+    client = app.test_client()
+    login(client)
+    # A Role row named 'admin' is not the admin role.
+    with query_budget(0):
+        assert client.get('/admin-only').status_code == 403
+
+    with app.app_context():
+        db.session.get(User, 1).role = 'admin'
+        db.session.commit()
+    assert client.get('/admin-only').status_code == 200
+    with query_budget(0):
+        assert client.get('/admin-only').status_code == 200
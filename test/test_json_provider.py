@@ -0,0 +1,65 @@
+import datetime
+import decimal
+from dataclasses import dataclass
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db
+from app import json_provider
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@dataclass
+class Item:
+    id: int
+    name: str
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def provider(request, app, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    return app.json
+
+
+def test_app_uses_fast_provider(app):
+    assert isinstance(app.json, json_provider.FastJSONProvider)
+
+
+def test_serializes_rows_dataclasses_and_flask_types(provider):
+    rows = db.session.execute(text("SELECT 1 AS id, 'a' AS name")).mappings().all()
+    payload = {
+        'rows': rows,
+        'items': [Item(2, 'b')],
+        'when': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        'price': decimal.Decimal('1.50'),
+    }
+    assert provider.loads(provider.dumps(payload)) == {
+        'rows': [{'id': 1, 'name': 'a'}],
+        'items': [{'id': 2, 'name': 'b'}],
+        'when': 'Tue, 02 Jan 2024 03:04:05 GMT',
+        'price': '1.50',
+    }
+
+
+def test_keys_keep_insertion_order(provider):
+    assert provider.dumps({'b': 1, 'a': 2}).replace(' ', '') == '{"b":1,"a":2}'
+
+
+def test_jsonify_response(app, provider):
+    with app.test_request_context():
+        response = provider.response(name='Zoë')
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'name': 'Zoë'}
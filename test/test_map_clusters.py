@@ -0,0 +1,192 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app import map_clusters
+from app.database import RoutingSession
+from app.map_clusters import GRID, cell_for, tile_bounds, tile_coords, tile_index, tile_range
+from app.modules import Professional, User
+from config import TestingConfig
+
+NAIROBI = (-1.2864, 36.8172)
+MOMBASA = (-4.0435, 39.6682)
+KENYA_BBOX = '33.9,-4.7,41.9,5.0'
+NAIROBI_BBOX = '36.80,-1.30,36.83,-1.27'
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        pros = [('Plumber', NAIROBI), ('Plumber', NAIROBI), ('Electrician', NAIROBI),
+                ('Chef', MOMBASA), ('Chef', (None, None))]
+        for i, (profession, (lat, lon)) in enumerate(pros):
+            user = User(email=f'pro{i}@example.com', full_name=f'Pro {i}', password_hash='x')
+            db.session.add(Professional(user=user, full_name=f'Pro {i}', profession=profession,
+                                        latitude=lat, longitude=lon))
+        db.session.commit()
+    tile_index.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_tile_math_round_trips():
+    x, y = tile_coords(*NAIROBI, 12)
+    west, south, east, north = tile_bounds(12, int(x), int(y))
+    assert west <= NAIROBI[1] <= east and south <= NAIROBI[0] <= north
+    assert (cell_for(*NAIROBI, 12)[0] // GRID, cell_for(*NAIROBI, 12)[1] // GRID) == (int(x), int(y))
+
+
+def test_tile_range_covers_bbox():
+    xs, ys = tile_range(33.9, -4.7, 41.9, 5.0, 6)
+    assert int(tile_coords(*NAIROBI, 6)[0]) in xs and int(tile_coords(*MOMBASA, 6)[1]) in ys
+    with pytest.raises(ValueError):
+        tile_range(41.9, -4.7, 33.9, 5.0, 6)
+
+
+def test_clusters_aggregate_per_cell(app):
+    response = app.test_client().get(f'/api/map/clusters?bbox={KENYA_BBOX}&zoom=6')
+    assert response.status_code == 200
+    clusters = sorted(response.json['clusters'], key=lambda c: -c['count'])
+    assert [(c['count'], c['profession']) for c in clusters] == [(3, 'Plumber'), (1, 'Chef')]
+    assert clusters[0]['lat'] == pytest.approx(NAIROBI[0])
+
+
+def test_unavailable_professionals_are_skipped(app):
+    with app.app_context():
+        Professional.query.filter_by(profession='Chef').update({'is_available': False})
+        db.session.commit()
+    clusters = app.test_client().get(f'/api/map/clusters?bbox={KENYA_BBOX}&zoom=6').json['clusters']
+    assert [c['profession'] for c in clusters] == ['Plumber']
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    calls = []
+    compute = map_clusters.compute_tile
+
+    def counting(zoom, x, y):
+        calls.append((zoom, x, y))
+        return compute(zoom, x, y)
+
+    monkeypatch.setattr(map_clusters, 'compute_tile', counting)
+    return calls
+
+
+def clusters(client, zoom=6, bbox=KENYA_BBOX):
+    response = client.get(f'/api/map/clusters?bbox={bbox}&zoom={zoom}')
+    return sorted((c['count'], c['profession']) for c in response.json['clusters'])
+
+
+def test_warm_tiles_are_not_recomputed(app, computed):
+    client = app.test_client()
+    clusters(client)
+    assert computed and len(tile_index) == len(computed)
+    computed.clear()
+    clusters(client)
+    assert computed == []
+
+
+@pytest.mark.parametrize('change, expected', [
+    (lambda pro: setattr(pro, 'profession', 'Chef'), [(1, 'Chef'), (3, 'Plumber')]),
+    (lambda pro: setattr(pro, 'is_available', False), [(1, 'Chef'), (2, 'Plumber')]),
+    (lambda pro: (setattr(pro, 'latitude', MOMBASA[0]), setattr(pro, 'longitude', MOMBASA[1])),
+     [(2, 'Chef'), (2, 'Plumber')]),
+    (lambda pro: db.session.delete(pro), [(1, 'Chef'), (2, 'Plumber')]),
+])
+def test_commits_update_warm_tiles_in_place(app, computed, change, expected):
+    client = app.test_client()
+    clusters(client)
+    clusters(client, zoom=12, bbox=NAIROBI_BBOX)
+    computed.clear()
+
+    with app.app_context():
+        # Expired after commit, so the old value has to be loaded on assignment.
+        pro = Professional.query.filter_by(profession='Electrician').one()
+        db.session.commit()
+        change(pro)
+        db.session.commit()
+
+    assert clusters(client) == expected
+    assert computed == []
+    # Deeper zooms are kept current too; recompute from scratch to compare.
+    incremental = clusters(client, zoom=12, bbox=NAIROBI_BBOX)
+    tile_index.clear()
+    assert clusters(client, zoom=12, bbox=NAIROBI_BBOX) == incremental
+
+
+def test_inserts_use_column_defaults(app, computed):
+    client = app.test_client()
+    clusters(client)
+    with app.app_context():
+        user = User(email='new@example.com', full_name='New', password_hash='x')
+        db.session.add(Professional(user=user, full_name='New', profession='Chef',
+                                    latitude=MOMBASA[0], longitude=MOMBASA[1]))
+        db.session.commit()
+    assert clusters(client) == [(2, 'Chef'), (3, 'Plumber')]
+
+
+def test_rolled_back_changes_are_ignored(app, computed):
+    client = app.test_client()
+    clusters(client)
+    with app.app_context():
+        Professional.query.filter_by(profession='Electrician').one().profession = 'Chef'
+        db.session.flush()
+        db.session.rollback()
+    assert clusters(client) == [(1, 'Chef'), (3, 'Plumber')]
+
+
+def test_writes_from_elsewhere_drop_the_index(app, computed):
+    client = app.test_client()
+    clusters(client)
+    with app.app_context():
+        # Bulk UPDATE bumps the data version without per-row deltas.
+        Professional.query.filter_by(profession='Chef').update({'profession': 'Baker'})
+        db.session.commit()
+    computed.clear()
+    assert clusters(client) == [(1, 'Baker'), (3, 'Plumber')]
+    assert computed
+
+
+def test_tiles_read_between_commit_and_apply_are_not_counted_twice(app):
+    client = app.test_client()
+    clusters(client)  # the index is now at the current data version
+    zoom = 12
+    x, y = (coord // GRID for coord in cell_for(*MOMBASA, zoom))
+    during = []
+
+    def read_cold_tile():
+        # A request that synced just before the commit, reading a tile the
+        # index has not cached yet.
+        with app.app_context():
+            during.append(tile_index.clusters(zoom, x, y))
+
+    def between_commit_and_apply(session):
+        if 'map_deltas' in session.info and not during:
+            reader = threading.Thread(target=read_cold_tile)
+            reader.start()
+            reader.join()
+
+    event.listen(RoutingSession, 'after_commit', between_commit_and_apply, insert=True)
+    try:
+        with app.app_context():
+            pro = Professional.query.filter_by(profession='Electrician').one()
+            pro.latitude, pro.longitude = MOMBASA
+            db.session.commit()
+    finally:
+        event.remove(RoutingSession, 'after_commit', between_commit_and_apply)
+
+    assert [cluster['count'] for cluster in during[0]] == [2]  # already includes the move
+    with app.app_context():
+        assert [cluster['count'] for cluster in tile_index.clusters(zoom, x, y)] == [2]
+
+
+@pytest.mark.parametrize('query', ['zoom=6', 'bbox=1,2,3&zoom=6', f'bbox={KENYA_BBOX}',
+                                   'bbox=41.9,-4.7,33.9,5.0&zoom=6', f'bbox={KENYA_BBOX}&zoom=14'])
+def test_bad_requests(app, query):
+    assert app.test_client().get(f'/api/map/clusters?{query}').status_code == 400
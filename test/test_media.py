@@ -0,0 +1,175 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app import create_app, db
+from app.media import ImageRejected, image_pipeline, profile_image_url
+from app.media.storage import collect_garbage, reference_counts
+from app.modules import Professional, User
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    class MediaConfig(TestingConfig):
+        UPLOAD_FOLDER = str(tmp_path)
+        MEDIA_MAX_UPLOAD_BYTES = 200_000
+        MEDIA_MAX_PIXELS = 4_000_000
+
+    app = create_app(MediaConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email='test@example.com', full_name='Test User', role='client')
+        user.set_password('testpass123')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def image_bytes(size=(800, 600), fmt='JPEG', mode='RGB'):
+    buf = io.BytesIO()
+    Image.new(mode, size, 'red').save(buf, fmt)
+    buf.seek(0)
+    return buf
+
+
+def upload(buf, name='me.jpg'):
+    return FileStorage(stream=buf, filename=name)
+
+
+def wait_until_ready(name, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not image_pipeline.is_ready(name):
+        assert time.monotonic() < deadline, 'variants were not rendered'
+        time.sleep(0.01)
+
+
+DIGEST = 'ab' * 32
+OTHER = 'cd' * 32
+
+
+def test_renders_every_size_and_format(app, tmp_path):
+    with app.app_context():
+        image_pipeline.submit(DIGEST, image_bytes()).result(timeout=10)
+    directory = tmp_path / 'media' / 'ab' / 'ab' / DIGEST
+    for size in (125, 250):
+        for ext, _, _ in image_pipeline.formats + [('jpg', 'JPEG', {})]:
+            with Image.open(directory / f'{size}.{ext}') as img:
+                assert max(img.size) == size
+    assert image_pipeline.is_ready(DIGEST)
+
+
+def test_transparent_png_gets_jpeg_fallback(app):
+    with app.app_context():
+        image_pipeline.submit(DIGEST, image_bytes(fmt='PNG', mode='RGBA')).result(timeout=10)
+    with Image.open(image_pipeline.store.path(DIGEST, '125.jpg')) as img:
+        assert img.mode == 'RGB'
+
+
+def test_identical_uploads_are_stored_once(app, monkeypatch):
+    rendered = []
+    render = image_pipeline.render
+    monkeypatch.setattr(image_pipeline, 'render', lambda name, source: (rendered.append(name), render(name, source)))
+    with app.app_context():
+        first = image_pipeline.save_profile_picture(upload(image_bytes()))
+        wait_until_ready(first)
+        second = image_pipeline.save_profile_picture(upload(image_bytes()))
+    assert first == second and len(first) == 64
+    assert rendered == [first]
+
+
+@pytest.mark.parametrize('buf, message', [
+    (io.BytesIO(b'x' * 300_000), 'smaller than'),
+    (io.BytesIO(b'not an image'), 'not a supported image'),
+    (image_bytes(fmt='GIF'), 'JPEG, PNG or WebP'),
+    (image_bytes(size=(2500, 2000), fmt='PNG', mode='1'), 'too large'),
+])
+def test_rejects_bad_uploads(app, buf, message):
+    with app.app_context(), pytest.raises(ImageRejected, match=message):
+        image_pipeline.save_profile_picture(upload(buf))
+
+
+def test_placeholder_until_ready(app):
+    with app.test_request_context():
+        assert profile_image_url(OTHER).endswith('profile-placeholder.svg')
+        assert profile_image_url(None).endswith('profile-placeholder.svg')
+        assert profile_image_url('legacy.jpg') == '/static/uploads/profiles/legacy.jpg'
+        image_pipeline.submit(DIGEST, image_bytes()).result(timeout=10)
+        assert profile_image_url(DIGEST, size=250) == f'/static/uploads/media/ab/ab/{DIGEST}/250.jpg'
+
+
+def test_profile_upload_returns_before_rendering(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'test@example.com', 'password': 'testpass123'})
+    response = client.post('/profile', data={'picture': (image_bytes(), 'me.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    with app.app_context():
+        name = db.session.get(User, 1).profile_picture
+    wait_until_ready(name)
+    page = client.get('/profile').get_data(as_text=True)
+    url = f'/static/uploads/media/{name[:2]}/{name[2:4]}/{name}'
+    assert f'{url}/125.jpg' in page
+    assert f'{url}/250.webp 2x' in page
+
+    image = client.get(f'{url}/250.webp')
+    assert image.status_code == 200
+    assert image.mimetype == 'image/webp'
+    assert 'immutable' in image.headers['Cache-Control']
+
+
+def age(digest, seconds):
+    then = time.time() - seconds
+    os.utime(image_pipeline.store.path(digest), (then, then))
+
+
+def test_gc_removes_only_old_unreferenced_images(app):
+    with app.app_context():
+        for digest in (DIGEST, OTHER):
+            image_pipeline.submit(digest, image_bytes()).result(timeout=10)
+        young = 'ef' * 32
+        image_pipeline.submit(young, image_bytes()).result(timeout=10)
+        age(DIGEST, 7200)
+        age(OTHER, 7200)
+        user = db.session.get(User, 1)
+        user.profile_picture = DIGEST
+        db.session.add(Professional(user=user, full_name='Pro', profession='Chef', profile_picture=DIGEST))
+        db.session.commit()
+        assert reference_counts()[DIGEST] == 2
+
+        assert collect_garbage(image_pipeline.store, 3600, dry_run=True) == [OTHER]
+        assert os.path.isdir(image_pipeline.store.path(OTHER))
+        assert collect_garbage(image_pipeline.store, 3600) == [OTHER]
+    assert not os.path.exists(image_pipeline.store.path(OTHER))
+    assert not os.path.exists(os.path.dirname(image_pipeline.store.path(OTHER).rstrip(os.sep)))
+    assert image_pipeline.store.exists(DIGEST, '125.jpg')
+    assert image_pipeline.store.exists(young, '125.jpg')
+
+
+def test_gc_command(app):
+    with app.app_context():
+        image_pipeline.submit(OTHER, image_bytes()).result(timeout=10)
+        assert image_pipeline.is_ready(OTHER)
+    result = app.test_cli_runner().invoke(args=['media', 'gc', '--grace', '0'])
+    assert result.exit_code == 0
+    assert 'Deleted 1 unreferenced image(s).' in result.output
+    assert not image_pipeline.is_ready(OTHER)
+
+
+def test_readiness_is_rechecked_after_the_ttl(app):
+    app.config['MEDIA_READY_TTL'] = 0.05
+    image_pipeline.init_app(app)
+    with app.test_request_context():
+        image_pipeline.submit(OTHER, image_bytes()).result(timeout=10)
+        assert image_pipeline.is_ready(OTHER)
+        image_pipeline.store.delete(OTHER)  # as `flask media gc` in another process would
+        time.sleep(0.1)
+        assert not image_pipeline.is_ready(OTHER)
+        assert profile_image_url(OTHER).endswith('profile-placeholder.svg')
@@ -0,0 +1,60 @@
+import pytest
+from app import create_app, db
+from app.metrics import Histogram, MetricsRegistry
+from config import TestingConfig
+
+
+class MetricsTestConfig(TestingConfig):
+    METRICS_TOKEN = 'scrape-secret'
+
+
+@pytest.fixture
+def app():
+    app = create_app(MetricsTestConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    hist = registry.histogram('demo_seconds', 'Demo.', ('endpoint',), buckets=(0.1, 1.0))
+    hist.observe(0.05, endpoint='a')
+    hist.observe(0.5, endpoint='a')
+    hist.observe(5, endpoint='a')
+
+    text = registry.render()
+    assert 'demo_seconds_bucket{endpoint="a",le="0.1"} 1.0' in text
+    assert 'demo_seconds_bucket{endpoint="a",le="1.0"} 2.0' in text
+    assert 'demo_seconds_bucket{endpoint="a",le="+Inf"} 3.0' in text
+    assert 'demo_seconds_count{endpoint="a"} 3.0' in text
+
+
+def test_histogram_rejects_wrong_labels():
+    hist = Histogram('demo', 'Demo.', ('endpoint',))
+    with pytest.raises(ValueError):
+        hist.observe(1, blueprint='main')
+
+
+def test_metrics_requires_login(client):
+    response = client.get('/admin/metrics')
+    assert response.status_code == 302
+    assert '/auth/login' in response.location
+
+
+def test_metrics_with_token_reports_requests(client):
+    client.get('/')
+    response = client.get('/admin/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'skillhub_http_requests_total{blueprint="main",endpoint="main.index",method="GET",status="200"}' in body
+    assert 'skillhub_http_request_duration_seconds_bucket' in body
+    assert 'skillhub_db_pool_checkouts_total' in body
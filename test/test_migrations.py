@@ -0,0 +1,114 @@
+import logging
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+from sqlalchemy import inspect, text
+
+from app import create_app, db
+from app.identity_cache import identity_cache
+from app.modules import Booking, Job, User
+from app.search import install
+from config import TestingConfig, basedir
+
+MIGRATIONS = os.path.join(basedir, 'migrations')
+HEAD = '053'
+
+
+@pytest.fixture
+def app(tmp_path):
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "migrations.db"}'
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def revision():
+    with db.engine.connect() as connection:
+        return connection.scalar(text('SELECT version_num FROM alembic_version'))
+
+
+def schema_differences():
+    """Differences between the migrated schema and the models (search tables aside)."""
+    def include_name(name, type_, parent_names):
+        return type_ != 'table' or name in db.metadata.tables
+
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'include_name': include_name})
+        return compare_metadata(context, db.metadata)
+
+
+def test_upgrade_empty_database(app):
+    upgrade(directory=MIGRATIONS)
+    assert revision() == HEAD
+    assert {'professionals_fts', 'jobs_fts', 'analytics_rollups'} <= set(inspect(db.engine).get_table_names())
+
+
+def test_upgrade_unstamped_baseline_database(app):
+    # A database db.create_all() built before there were revisions.
+    upgrade(directory=MIGRATIONS, revision='000')
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, full_name, email, password_hash, is_active) VALUES (1, 'A', 'a@x', 'x', 1)"))
+        connection.execute(text("INSERT INTO professionals (id, full_name, profession, user_id, rating, total_reviews) "
+                                "VALUES (1, 'A', 'Plumber', 1, 0, 0)"))
+        connection.execute(text("INSERT INTO reviews (rating, professional_id, is_visible) VALUES (4, 1, 1)"))
+        connection.execute(text("INSERT INTO services (id, title, description, category, price, provider_id, "
+                                "professional_id) VALUES (1, 'Repair', '-', 'Plumbing', 100, 1, 1)"))
+        connection.execute(text("INSERT INTO bookings (id, scheduled_at, client_id, service_id) "
+                                "VALUES (1, '2026-03-02 09:00:00.250000', 1, 1)"))
+        connection.execute(text('DROP TABLE alembic_version'))
+
+    upgrade(directory=MIGRATIONS)
+    assert revision() == HEAD
+    assert schema_differences() == []
+    with db.engine.connect() as connection:
+        assert connection.execute(text('SELECT rating, rating_sum, rating_count_4 FROM professionals')).one() == (4, 4, 1)
+    booking = db.session.get(Booking, 1)
+    assert (booking.professional_id, booking.ends_at) == (1, datetime(2026, 3, 2, 10, 0, 0, 250000))
+
+    # Writes bump data_versions and cached endpoints read it.
+    db.session.add(Job(title='Fix sink', description='Leaking', profession='Plumber', poster=db.session.get(User, 1)))
+    db.session.commit()
+    identity_cache.clear()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    response = client.get('/api/search', query_string={'q': 'sink', 'type': 'jobs'})
+    assert response.status_code == 200
+    assert client.get('/api/search', query_string={'q': 'sink', 'type': 'jobs'},
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_overlong_bookings_are_clamped(app):
+    upgrade(directory=MIGRATIONS, revision='052')
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, full_name, email, password_hash) VALUES (1, 'A', 'a@x', 'x')"))
+        connection.execute(text("INSERT INTO services (id, title, description, category, price, provider_id) "
+                                "VALUES (1, 'Repair', '-', 'Plumbing', 100, 1)"))
+        connection.execute(text("INSERT INTO bookings (id, scheduled_at, duration_minutes, ends_at, client_id, "
+                                "service_id) VALUES (1, '2026-03-02 09:00:00.000000', 2000, "
+                                "'2026-03-03 18:20:00.000000', 1, 1)"))
+    upgrade(directory=MIGRATIONS)
+    booking = db.session.get(Booking, 1)
+    assert (booking.duration_minutes, booking.ends_at) == (24 * 60, datetime(2026, 3, 3, 9))
+
+
+def test_upgrade_after_create_all(app):
+    # The deploy path: init_db.py's create_all(), then build.sh's upgrade.
+    db.create_all()
+    upgrade(directory=MIGRATIONS)
+    assert revision() == HEAD
+
+
+def test_search_index_is_skipped_on_unsupported_dialects(caplog):
+    connection = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+    with caplog.at_level(logging.WARNING, logger='app.search'):
+        install(connection)
+    assert 'not supported on mysql' in caplog.text
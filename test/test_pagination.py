@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from flask import current_app, jsonify
+from sqlalchemy import text
+
+from app import create_app, db
+from app.identity_cache import identity_cache
+from app.modules import Professional, User
+from app.pagination import (InvalidCursor, decode_cursor, encode_cursor, ndjson_response,
+                            next_page_url, page_size, request_cursor, wants_ndjson)
+from config import TestingConfig
+
+
+class PagedConfig(TestingConfig):
+    API_PAGE_SIZE = 2
+    API_MAX_PAGE_SIZE = 3
+    API_STREAM_BATCH = 2
+
+
+@pytest.fixture
+def app():
+    app = create_app(PagedConfig)
+
+    @app.route('/test/by-rating')
+    def by_rating():
+        # Same shape as geo.get_nearby_professionals, keyed on rating instead of distance
+        try:
+            after = request_cursor(float, int)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        params = {}
+        keyset = ''
+        if after:
+            keyset = 'WHERE (rating, id) > (:after_rating, :after_id)'
+            params.update(after_rating=after[0], after_id=after[1])
+        sql = f'SELECT id, full_name, rating FROM professionals {keyset} ORDER BY rating, id'
+        if wants_ndjson():
+            query = text(sql).execution_options(yield_per=current_app.config['API_STREAM_BATCH'])
+            return ndjson_response(db.session.execute(query, params).mappings().partitions())
+        params['limit'] = page_size() + 1
+        rows = db.session.execute(text(sql + ' LIMIT :limit'), params).mappings().all()
+        page = rows[:params['limit'] - 1]
+        response = jsonify(page)
+        if len(rows) > len(page):
+            cursor = encode_cursor(page[-1]['rating'], page[-1]['id'])
+            response.headers['Link'] = f'<{next_page_url(cursor)}>; rel="next"'
+        return response
+
+    with app.app_context():
+        db.create_all()
+        for i, rating in enumerate([4.0, 2.0, 3.0, 3.0, 5.0]):
+            user = User(email=f'pro{i}@example.com', full_name=f'Pro {i}', password_hash='x')
+            db.session.add(Professional(user=user, full_name=f'Pro {i}', profession='Plumber',
+                                        rating=rating))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1.5, 7), float, int) == (1.5, 7)
+
+
+@pytest.mark.parametrize('token', ['%%%', encode_cursor(1.5), encode_cursor('x', 1), 'e30'])
+def test_invalid_cursor(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, float, int)
+
+
+def test_page_size_is_clamped(app):
+    with app.test_request_context('/?limit=50'):
+        assert page_size() == 3
+    with app.test_request_context('/?limit=0'):
+        assert page_size() == 1
+    with app.test_request_context('/'):
+        assert page_size() == 2
+
+
+def test_follows_link_headers_through_all_pages(app):
+    client = app.test_client()
+    url, names = '/test/by-rating', []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        names += [row['full_name'] for row in response.json]
+        link = response.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
+    assert names == ['Pro 1', 'Pro 2', 'Pro 3', 'Pro 0', 'Pro 4']
+
+
+def test_bad_cursor_is_400(app):
+    assert app.test_client().get('/test/by-rating?cursor=nope').status_code == 400
+
+
+@pytest.mark.parametrize('kwargs', [{'query_string': {'format': 'ndjson'}},
+                                    {'headers': {'Accept': 'application/x-ndjson'}}])
+def test_ndjson_streams_every_row(app, kwargs):
+    response = app.test_client().get('/test/by-rating', **kwargs)
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert [row['full_name'] for row in rows] == ['Pro 1', 'Pro 2', 'Pro 3', 'Pro 0', 'Pro 4']
+
+
+def test_ndjson_resumes_after_cursor(app):
+    cursor = encode_cursor(3.0, 4)
+    response = app.test_client().get(f'/test/by-rating?format=ndjson&cursor={cursor}')
+    assert [json.loads(line)['full_name'] for line in response.data.splitlines()] == ['Pro 0', 'Pro 4']
+
+
+def test_recommendations_are_behind_login(app):
+    identity_cache.clear()
+    client = app.test_client()
+    assert client.get('/api/jobs/1/recommendations').status_code == 302
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    response = client.get('/api/jobs/1/recommendations?cursor=bogus')
+    assert response.status_code == 400
+    assert 'cursor' in response.get_json()['error']
@@ -0,0 +1,123 @@
+import threading
+import time
+import pytest
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.modules import User
+from app.passwords import HashingBusy, PasswordHasher
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email='test@example.com', full_name='Test User')
+        user.set_password('testpass123')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_login_upgrades_outdated_hash(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    app.extensions['password_hasher'].init_app(app)
+    client = app.test_client()
+    response = client.post('/auth/login', data={'email': 'test@example.com', 'password': 'testpass123'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.one().password_hash.startswith('pbkdf2:sha256:2000$')
+
+
+def test_saturated_pool_sheds_load():
+    hasher = PasswordHasher()
+    release = threading.Event()
+    started = threading.Event()
+
+    class FakeApp:
+        config = {'PASSWORD_HASH_WORKERS': 1, 'PASSWORD_HASH_MAX_PENDING': 1}
+        extensions = {}
+
+    hasher.init_app(FakeApp)
+
+    def slow(pw):
+        started.set()
+        release.wait(5)
+        return pw
+
+    worker = threading.Thread(target=hasher._run, args=(slow, 'x'))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(HashingBusy):
+        hasher.hash('another')
+    release.set()
+    worker.join()
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+
+def test_timed_out_jobs_keep_their_slot():
+    hasher = PasswordHasher()
+    release = threading.Event()
+
+    class FakeApp:
+        config = {'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000', 'PASSWORD_HASH_WORKERS': 1,
+                  'PASSWORD_HASH_MAX_PENDING': 1, 'PASSWORD_HASH_TIMEOUT': 0.05}
+        extensions = {}
+
+    hasher.init_app(FakeApp)
+
+    def slow(pw):
+        release.wait(5)
+        return pw
+
+    with pytest.raises(HashingBusy, match='timed out'):
+        hasher._run(slow, 'x')
+    # The job is still running, so the pool is still full.
+    with pytest.raises(HashingBusy, match='in flight'):
+        hasher.hash('another')
+    release.set()
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            assert hasher.verify(hasher.hash('secret'), 'secret')
+            break
+        except HashingBusy:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+def test_slow_login_gets_503(app, monkeypatch):
+    app.config['PASSWORD_HASH_TIMEOUT'] = 0.05
+    app.extensions['password_hasher'].init_app(app)
+    release = threading.Event()
+    monkeypatch.setattr('app.passwords.check_password_hash', lambda pwhash, password: release.wait(5))
+    response = app.test_client().post('/auth/login', data={'email': 'test@example.com', 'password': 'testpass123'})
+    release.set()
+    assert response.status_code == 503
+
+
+def test_login_succeeds_when_rehash_is_busy(app, monkeypatch):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    hasher = app.extensions['password_hasher']
+    hasher.init_app(app)
+
+    def busy(password):
+        raise HashingBusy('Too many password hashing requests in flight')
+
+    monkeypatch.setattr(hasher, 'hash', busy)
+    response = app.test_client().post('/auth/login', data={'email': 'test@example.com', 'password': 'testpass123'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.one().password_hash.startswith('pbkdf2:sha256:1000$')
+
+
+def test_default_method_is_werkzeugs():
+    hasher = PasswordHasher()
+    werkzeug_default = generate_password_hash('x').split('$', 1)[0]
+    assert hasher.hash('secret').startswith(werkzeug_default + '$')
+    assert not hasher.needs_rehash(generate_password_hash('other'))
+    assert hasher.needs_rehash(generate_password_hash('other', 'pbkdf2:sha256:1000'))
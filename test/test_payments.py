@@ -0,0 +1,232 @@
+import base64
+import threading
+from datetime import datetime
+
+import pytest
+
+from app import create_app, db
+from app.modules import Booking, Payment, Professional, Service, User
+from app.payments import MpesaError, mpesa
+from app.payments.callbacks import parse_callback, record_results
+from config import TestingConfig
+from test.mpesa_stub import CONSUMER_KEY, CONSUMER_SECRET
+
+
+@pytest.fixture
+def app(mpesa_stub, tmp_path):
+    class StubConfig(TestingConfig):
+        # A file, so concurrent requests get connections of their own.
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "payments.db"}'
+        MPESA_BASE_URL = mpesa_stub.url
+        MPESA_CONSUMER_KEY = CONSUMER_KEY
+        MPESA_CONSUMER_SECRET = CONSUMER_SECRET
+        MPESA_SHORTCODE = '174379'
+        MPESA_PASSKEY = 'passkey'
+        MPESA_CALLBACK_URL = 'https://example.com/api/payments/mpesa/callback'
+        MPESA_CALLBACK_TOKEN = 'callback-secret'
+        MPESA_CONNECT_RETRIES = 0
+
+    app = create_app(StubConfig)
+    with app.app_context():
+        db.create_all()
+        client = User(email='client@example.com', full_name='Client', password_hash='x')
+        pro_user = User(email='pro@example.com', full_name='Pro', password_hash='x')
+        pro = Professional(user=pro_user, full_name='Pro', profession='Plumber')
+        service = Service(title='Repair', description='-', category='Plumbing', price=1500,
+                          provider=pro_user, professional=pro)
+        for i in range(3):
+            booking = Booking(client=client, service=service, scheduled_at=datetime(2026, 3, 2, 9 + i))
+            db.session.add(Payment(booking=booking, amount=1500.4))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def callback(checkout_request_id, code=0, receipt='QK12ABC3DE', amount=1500, phone=254712345678):
+    stk = {'MerchantRequestID': 'mr', 'CheckoutRequestID': checkout_request_id, 'ResultCode': code,
+           'ResultDesc': 'The service request is processed successfully.' if code == 0 else 'Request cancelled by user'}
+    if code == 0:
+        stk['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': amount},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt},
+            {'Name': 'TransactionDate', 'Value': 20260302113005},
+            {'Name': 'PhoneNumber', 'Value': phone},
+        ]}
+    return {'Body': {'stkCallback': stk}}
+
+
+def test_stk_push_reuses_connection_and_token(app, mpesa_stub):
+    with app.app_context():
+        payments = db.session.scalars(db.select(Payment).order_by(Payment.id)).all()
+        ids = [mpesa.stk_push(payment, '254712345678') for payment in payments]
+        assert ids == ['ws_CO_1', 'ws_CO_2', 'ws_CO_3']
+        assert all(payment.pushed_at is not None for payment in payments)
+        assert payments[0].phone == '254712345678'
+        assert mpesa_stub.token_requests == 1
+        assert mpesa_stub.connections == 1
+
+        push = mpesa_stub.pushes[0]
+        assert push['Amount'] == 1500
+        assert push['Idempotency-Key'] == payments[0].idempotency_key
+        assert len(push['Timestamp']) == 14
+        assert base64.b64decode(push['Password']).decode() == f"174379passkey{push['Timestamp']}"
+
+
+def test_stk_push_is_idempotent_per_payment(app, mpesa_stub):
+    with app.app_context():
+        payment = db.session.get(Payment, 1)
+        first = mpesa.stk_push(payment, '254712345678')
+        db.session.commit()
+        assert mpesa.stk_push(db.session.get(Payment, 1), '254712345678') == first
+        assert len(mpesa_stub.pushes) == 1
+
+
+def test_token_is_refreshed_before_expiry(app, mpesa_stub):
+    with app.app_context():
+        assert mpesa.access_token() == 'token-1'
+        assert mpesa.access_token() == 'token-1'
+        mpesa._token_expires -= 3599 - 30  # 30 seconds left, inside the refresh margin
+        assert mpesa.access_token() == 'token-2'
+
+
+def test_rejected_token_is_replaced_once(app, mpesa_stub):
+    with app.app_context():
+        mpesa.access_token()
+        mpesa_stub.valid_tokens.clear()
+        assert mpesa.stk_push(db.session.get(Payment, 1), '254712345678') == 'ws_CO_1'
+        assert mpesa_stub.token_requests == 2
+
+
+def test_unreachable_api_raises(app, mpesa_stub):
+    with app.app_context():
+        mpesa_stub.stop()
+        mpesa.base_url = mpesa_stub.url
+        with pytest.raises(MpesaError):
+            mpesa.access_token()
+
+
+def test_parse_callback():
+    result = parse_callback(callback('ws_CO_1'))
+    assert result == {'checkout_request_id': 'ws_CO_1', 'status': 'completed', 'transaction_id': 'QK12ABC3DE',
+                      'payment_date': datetime(2026, 3, 2, 8, 30, 5),
+                      'notes': 'The service request is processed successfully.', 'amount': 1500,
+                      'phone': 254712345678}
+    assert parse_callback(callback('ws_CO_2', code=1032))['status'] == 'cancelled'
+    assert parse_callback(callback('ws_CO_3', code=2001))['status'] == 'failed'
+
+
+def test_results_are_applied_in_bulk_once(app, query_budget):
+    with app.app_context():
+        for payment_id in (1, 2, 3):
+            db.session.get(Payment, payment_id).checkout_request_id = f'ws_CO_{payment_id}'
+        db.session.commit()
+        results = [parse_callback(callback('ws_CO_1')), parse_callback(callback('ws_CO_2', code=1032)),
+                   parse_callback(callback('ws_CO_9'))]
+        with query_budget(2):
+            assert record_results(results) == 2
+        db.session.commit()
+        assert record_results(results) == 0  # redelivered
+
+        db.session.expire_all()
+        assert [(p.status, p.transaction_id) for p in db.session.scalars(db.select(Payment).order_by(Payment.id))] \
+            == [('completed', 'QK12ABC3DE'), ('cancelled', None), ('pending', None)]
+
+
+def test_callback_endpoint(app):
+    with app.app_context():
+        db.session.get(Payment, 1).checkout_request_id = 'ws_CO_1'
+        db.session.get(Payment, 2).checkout_request_id = 'ws_CO_2'
+        db.session.commit()
+    client = app.test_client()
+    url = '/api/payments/mpesa/callback'
+    assert client.post(url, json=callback('ws_CO_1')).status_code == 403
+    response = client.post(f'{url}?token=callback-secret', json=[callback('ws_CO_1'), callback('ws_CO_2', 1)])
+    assert response.get_json() == {'ResultCode': 0, 'ResultDesc': 'Accepted'}
+    assert client.post(f'{url}?token=callback-secret', json={'nope': 1}).status_code == 400
+    with app.app_context():
+        assert [db.session.get(Payment, i).status for i in (1, 2, 3)] == ['completed', 'failed', 'pending']
+
+
+def test_callback_is_refused_without_a_token(app):
+    app.config['MPESA_CALLBACK_TOKEN'] = None
+    with app.app_context():
+        db.session.get(Payment, 1).checkout_request_id = 'ws_CO_1'
+        db.session.commit()
+    client = app.test_client()
+    assert client.post('/api/payments/mpesa/callback', json=callback('ws_CO_1')).status_code == 403
+    assert client.post('/api/payments/mpesa/callback?token=', json=callback('ws_CO_1')).status_code == 403
+    with app.app_context():
+        assert db.session.get(Payment, 1).status == 'pending'
+
+
+def test_results_must_match_the_push(app):
+    with app.app_context():
+        for payment_id in (1, 2, 3):
+            payment = db.session.get(Payment, payment_id)
+            payment.checkout_request_id, payment.phone = f'ws_CO_{payment_id}', '254712345678'
+        db.session.commit()
+        results = [parse_callback(callback('ws_CO_1', amount=1)),
+                   parse_callback(callback('ws_CO_2', phone=254799999999)),
+                   parse_callback(callback('ws_CO_3', amount=1500.0))]
+        assert record_results(results) == 1
+        # Failures carry no metadata and query results come from M-Pesa itself.
+        assert record_results([parse_callback(callback('ws_CO_1', code=1032))]) == 1
+        assert record_results([{**parse_callback(callback('ws_CO_2', receipt='QK12ABC3DF')), 'amount': None}],
+                              verify=False) == 1
+        db.session.commit()
+        assert [db.session.get(Payment, i).status for i in (1, 2, 3)] == ['cancelled', 'completed', 'completed']
+
+
+def test_request_payment_endpoint(app, mpesa_stub):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    response = client.post('/api/payments/1/mpesa', json={'phone': '+254712345678'})
+    assert response.status_code == 202
+    assert response.get_json() == {'payment_id': 1, 'checkout_request_id': 'ws_CO_1'}
+    assert client.post('/api/payments/1/mpesa', json={'phone': '254712345678'}).get_json()['checkout_request_id'] \
+        == 'ws_CO_1'
+    assert len(mpesa_stub.pushes) == 1
+    assert client.post('/api/payments/2/mpesa', json={'phone': '0712'}).status_code == 400
+
+    with client.session_transaction() as session:
+        session['_user_id'] = '2'
+    assert client.post('/api/payments/2/mpesa', json={'phone': '254712345678'}).status_code == 404
+
+
+def test_concurrent_requests_push_once(app, mpesa_stub):
+    mpesa_stub.push_delay = 0.5  # the second request arrives while the first is at M-Pesa
+    clients = [app.test_client(), app.test_client()]
+    for client in clients:
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+    responses = [None, None]
+
+    def pay(i):
+        responses[i] = clients[i].post('/api/payments/1/mpesa', json={'phone': '254712345678'})
+
+    threads = [threading.Thread(target=pay, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(response.status_code for response in responses) == [202, 409]
+    assert len(mpesa_stub.pushes) == 1
+    assert clients[0].post('/api/payments/1/mpesa', json={'phone': '254712345678'}).get_json() \
+        == {'payment_id': 1, 'checkout_request_id': 'ws_CO_1'}
+
+
+def test_failed_push_can_be_retried(app, mpesa_stub):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    mpesa.base_url = 'http://127.0.0.1:9'  # nothing listens on the discard port
+    assert client.post('/api/payments/1/mpesa', json={'phone': '254712345678'}).status_code == 502
+    with app.app_context():
+        assert db.session.get(Payment, 1).pushed_at is None
+    mpesa.base_url = mpesa_stub.url
+    assert client.post('/api/payments/1/mpesa', json={'phone': '254712345678'}).status_code == 202
@@ -0,0 +1,8 @@
+import io
+
+from benchmarks.check_query_plans import check
+
+
+def test_hot_queries_use_indexes():
+    out = io.StringIO()
+    assert check(rows=200, out=out) == [], out.getvalue()
@@ -0,0 +1,49 @@
+import pytest
+from app import create_app, db
+from app.modules import User, Professional, Review
+from app.query_tracker import normalize_statement, track_queries
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        pro_user = User(email='pro@example.com', full_name='Pro User')
+        pro_user.set_password('testpass123')
+        professional = Professional(user=pro_user, full_name='Pro User', profession='Plumber')
+        db.session.add(professional)
+        for i in range(6):
+            client = User(email=f'client{i}@example.com', full_name=f'Client {i}')
+            client.set_password('testpass123')
+            db.session.add(Review(professional=professional, client=client, rating=4))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_normalize_statement_collapses_literals_and_in_lists():
+    a = normalize_statement("SELECT * FROM users WHERE id IN (?, ?, ?) AND name = 'x'")
+    b = normalize_statement("SELECT *  FROM users\nWHERE id IN (?) AND name = 'yy'")
+    assert a == b == 'SELECT * FROM users WHERE id IN (...) AND name = ?'
+
+
+def test_lazy_review_clients_are_flagged_as_repeated(app):
+    with app.app_context():
+        professional = Professional.query.first()
+        db.session.expire_all()
+        with track_queries() as stats:
+            [review.to_dict() for review in professional.reviews]
+        assert stats.count >= 7
+        assert stats.repeated(5), stats.report()
+
+
+def test_home_page_query_budget(app, query_budget):
+    client = app.test_client()
+    with query_budget(2, max_repeats=1):
+        response = client.get('/')
+    assert response.status_code == 200
+    assert 'db;dur=' in response.headers['Server-Timing']
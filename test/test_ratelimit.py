@@ -0,0 +1,69 @@
+import time
+import pytest
+from flask import Flask
+from app import create_app, db
+from app.ratelimit import SQLiteStorage, configure_ratelimit
+from config import TestingConfig
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage('sqlite-ratelimit:///' + str(tmp_path / 'limits.db'))
+
+
+def test_counters_are_shared_between_storage_instances(storage):
+    other = SQLiteStorage('sqlite-ratelimit:///' + storage.path)
+    assert storage.incr('k', 60) == 1
+    assert other.incr('k', 60) == 2
+    assert storage.get('k') == 2
+    assert storage.get_expiry('k') > time.time()
+
+
+def test_expired_window_restarts(storage):
+    storage.incr('k', 60, amount=5)
+    storage._conn.execute('UPDATE ratelimit SET expires = 0')
+    assert storage.get('k') == 0
+    assert storage.incr('k', 60) == 1
+
+
+def test_login_is_rate_limited(tmp_path):
+    class LimitedConfig(TestingConfig):
+        RATELIMIT_STORAGE_URI = 'sqlite-ratelimit:///' + str(tmp_path / 'limits.db')
+        RATELIMIT_LOGIN = '2 per minute'
+
+    app = create_app(LimitedConfig)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    data = {'email': 'nobody@example.com', 'password': 'wrongpass'}
+    assert client.post('/auth/login', data=data).status_code == 302
+    assert client.post('/auth/login', data=data).status_code == 302
+    assert client.post('/auth/login', data=data).status_code == 429
+    # Only POSTs count against the login limit
+    assert client.get('/auth/login').status_code == 200
+
+
+def test_storage_defaults_to_the_instance_folder(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path / 'instance'))
+    configure_ratelimit(app)
+    assert app.config['RATELIMIT_STORAGE_URI'] == 'sqlite-ratelimit:///' + str(tmp_path / 'instance' / 'ratelimit.db')
+    assert (tmp_path / 'instance').is_dir()
+
+
+def test_unwritable_directory_falls_back_to_memory(tmp_path, caplog):
+    blocker = tmp_path / 'read-only'
+    blocker.write_text('')  # a file where the directory should be can never be created
+
+    class ReadOnlyConfig(TestingConfig):
+        RATELIMIT_STORAGE_URI = 'sqlite-ratelimit:///' + str(blocker / 'ratelimit.db')
+        RATELIMIT_LOGIN = '1 per minute'
+
+    app = create_app(ReadOnlyConfig)
+    assert app.config['RATELIMIT_STORAGE_URI'] == 'memory://'
+    assert 'not writable' in caplog.text
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    data = {'email': 'nobody@example.com', 'password': 'wrongpass'}
+    assert client.post('/auth/login', data=data).status_code == 302
+    assert client.post('/auth/login', data=data).status_code == 429
@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db
+from app.modules import Professional, Review, User
+from app.ratings import reconcile_ratings, stars
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        for i in range(2):
+            user = User(email=f'pro{i}@example.com', full_name=f'Pro {i}', password_hash='x')
+            db.session.add(Professional(user=user, full_name=f'Pro {i}', profession='Plumber'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def aggregates(professional_id):
+    db.session.expire_all()
+    pro = db.session.get(Professional, professional_id)
+    return pro.total_reviews, pro.rating_sum, pro.rating, pro.rating_histogram
+
+
+def add_reviews(professional_id, *ratings, **kwargs):
+    reviews = [Review(professional_id=professional_id, rating=r, **kwargs) for r in ratings]
+    db.session.add_all(reviews)
+    db.session.commit()
+    return reviews
+
+
+def test_stars_rounds_to_the_nearest_whole_star():
+    assert [stars(r) for r in (0.5, 1, 1.49, 1.5, 3.7, 4.5, 5)] == [1, 1, 1, 2, 4, 5, 5]
+
+
+def test_inserts_update_aggregates(app):
+    with app.app_context():
+        add_reviews(1, 5, 4)
+        add_reviews(1, 3)
+        assert aggregates(1) == (3, 12, 4.0, [0, 0, 1, 1, 1])
+        assert aggregates(2) == (0, 0, 0.0, [0, 0, 0, 0, 0])
+
+
+def test_reviews_added_through_the_relationship(app):
+    with app.app_context():
+        pro = db.session.get(Professional, 2)
+        pro.reviews.append(Review(rating=2))
+        db.session.commit()
+        assert aggregates(2) == (1, 2, 2.0, [0, 1, 0, 0, 0])
+
+
+def test_new_professional_with_reviews(app):
+    with app.app_context():
+        user = User(email='new@example.com', full_name='New', password_hash='x')
+        pro = Professional(user=user, full_name='New', profession='Chef',
+                           reviews=[Review(rating=4), Review(rating=5)])
+        db.session.add(pro)
+        db.session.commit()
+        assert aggregates(pro.id) == (2, 9, 4.5, [0, 0, 0, 1, 1])
+
+
+def test_edit_hide_and_delete(app):
+    with app.app_context():
+        low, high = add_reviews(1, 1, 5)
+        low.rating = 3
+        db.session.commit()
+        assert aggregates(1) == (2, 8, 4.0, [0, 0, 1, 0, 1])
+
+        high.is_visible = False
+        db.session.commit()
+        assert aggregates(1) == (1, 3, 3.0, [0, 0, 1, 0, 0])
+
+        high.is_visible = True
+        db.session.delete(low)
+        db.session.commit()
+        assert aggregates(1) == (1, 5, 5.0, [0, 0, 0, 0, 1])
+
+
+def test_changes_to_expired_reviews_use_old_values(app):
+    with app.app_context():
+        review, = add_reviews(1, 2)
+        db.session.expire_all()
+        review.rating = 4
+        db.session.commit()
+        assert aggregates(1) == (1, 4, 4.0, [0, 0, 0, 1, 0])
+
+
+def test_moving_a_review_between_professionals(app):
+    with app.app_context():
+        by_id, by_object = add_reviews(1, 4, 2)
+        by_id.professional_id = 2
+        db.session.commit()
+        by_object.professional = db.session.get(Professional, 2)
+        db.session.commit()
+        assert aggregates(1) == (0, 0, 0.0, [0, 0, 0, 0, 0])
+        assert aggregates(2) == (2, 6, 3.0, [0, 1, 0, 1, 0])
+
+
+def test_rollback_leaves_aggregates_alone(app):
+    with app.app_context():
+        add_reviews(1, 5)
+        db.session.add(Review(professional_id=1, rating=1))
+        db.session.flush()
+        db.session.rollback()
+        assert aggregates(1) == (1, 5, 5.0, [0, 0, 0, 0, 1])
+
+
+def test_hidden_reviews_are_not_counted(app):
+    with app.app_context():
+        add_reviews(1, 1, is_visible=False)
+        assert aggregates(1) == (0, 0, 0.0, [0, 0, 0, 0, 0])
+
+
+def test_reconcile_fixes_drift(app):
+    with app.app_context():
+        add_reviews(1, 5, 3)
+        add_reviews(2, 4)
+        db.session.execute(text('UPDATE reviews SET is_visible = 0 WHERE rating = 3'))
+        db.session.execute(text('UPDATE professionals SET rating = 1 WHERE id = 2'))
+        db.session.commit()
+
+        assert reconcile_ratings(dry_run=True) == [1, 2]
+        assert aggregates(1) == (2, 8, 4.0, [0, 0, 1, 0, 1])
+        assert reconcile_ratings() == [1, 2]
+        assert aggregates(1) == (1, 5, 5.0, [0, 0, 0, 0, 1])
+        assert aggregates(2) == (1, 4, 4.0, [0, 0, 0, 1, 0])
+        assert reconcile_ratings() == []
+
+
+def test_reconcile_command(app):
+    with app.app_context():
+        add_reviews(1, 5)
+        db.session.execute(text('DELETE FROM reviews'))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['ratings', 'reconcile'])
+    assert result.exit_code == 0
+    assert 'Fixed 1 professional(s).' in result.output
@@ -0,0 +1,101 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from app.modules import Booking, Payment, Professional, Service, User
+from app.payments.reconcile import reconcile_payments
+from config import TestingConfig
+from test.mpesa_stub import CONSUMER_KEY, CONSUMER_SECRET
+
+PAYMENTS = 600
+
+
+@pytest.fixture
+def app(mpesa_stub):
+    class StubConfig(TestingConfig):
+        MPESA_BASE_URL = mpesa_stub.url
+        MPESA_CONSUMER_KEY = CONSUMER_KEY
+        MPESA_CONSUMER_SECRET = CONSUMER_SECRET
+        MPESA_SHORTCODE = '174379'
+        MPESA_PASSKEY = 'passkey'
+        MPESA_POOL_SIZE = 8
+        MPESA_RECONCILE_PAGE_SIZE = 100
+
+    app = create_app(StubConfig)
+    with app.app_context():
+        db.create_all()
+        client = User(email='client@example.com', full_name='Client', password_hash='x')
+        pro_user = User(email='pro@example.com', full_name='Pro', password_hash='x')
+        pro = Professional(user=pro_user, full_name='Pro', profession='Plumber')
+        service = Service(title='Repair', description='-', category='Plumbing', price=100,
+                          provider=pro_user, professional=pro)
+        pushed = datetime.utcnow() - timedelta(minutes=10)
+        for i in range(1, PAYMENTS + 1):
+            booking = Booking(client=client, service=service, scheduled_at=datetime(2026, 3, 2) + timedelta(hours=i))
+            db.session.add(Payment(booking=booking, amount=100, checkout_request_id=f'ws_CO_{i}',
+                                   pushed_at=pushed))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def statuses():
+    db.session.expire_all()
+    rows = db.session.execute(db.select(Payment.status, db.func.count()).group_by(Payment.status))
+    return dict(rows.all())
+
+
+def test_reconciles_in_pages_on_a_bounded_pool(app, mpesa_stub, query_budget):
+    expected = Counter()
+    for i in range(1, PAYMENTS + 1):
+        if i % 10 == 0:
+            continue  # still waiting for the customer
+        code = 0 if i % 3 else (1032 if i % 2 else 1)
+        mpesa_stub.results[f'ws_CO_{i}'] = (code, 'done')
+        if i != 7:
+            expected[{0: 'completed', 1032: 'cancelled', 1: 'failed'}[code]] += 1
+    mpesa_stub.failing.add('ws_CO_7')
+
+    with app.app_context():
+        # Per page: one SELECT of the page, one to find the pending rows, one bulk UPDATE.
+        with query_budget(3 * (PAYMENTS // 100) + 1, max_repeats=PAYMENTS // 100 + 1):
+            summary = reconcile_payments(workers=32)
+
+        assert summary.checked == PAYMENTS
+        assert summary.still_pending == PAYMENTS // 10
+        assert summary.errors == 1
+        assert summary.updated == PAYMENTS - PAYMENTS // 10 - 1
+        assert summary.statuses == expected
+        assert statuses() == {**expected, 'pending': PAYMENTS // 10 + 1}
+        assert 'Checked 600 pending payment(s)' in str(summary)
+
+    assert len(mpesa_stub.queries) == PAYMENTS
+    assert mpesa_stub.token_requests == 1
+    assert mpesa_stub.connections <= 8  # workers are capped at MPESA_POOL_SIZE
+
+
+def test_recent_and_settled_payments_are_skipped(app, mpesa_stub):
+    with app.app_context():
+        # Created long ago, but the prompt only just went out.
+        recent = db.session.get(Payment, 1)
+        recent.created_at = datetime.utcnow() - timedelta(days=1)
+        recent.pushed_at = datetime.utcnow()
+        db.session.get(Payment, 2).status = 'completed'
+        db.session.commit()
+        summary = reconcile_payments(limit=10)
+        assert summary.checked == 10
+        assert sorted(mpesa_stub.queries) == sorted(f'ws_CO_{i}' for i in range(3, 13))
+
+
+def test_cli_prints_a_summary(app, mpesa_stub):
+    mpesa_stub.results.update({f'ws_CO_{i}': (0, 'ok') for i in range(1, PAYMENTS + 1)})
+    result = app.test_cli_runner().invoke(args=['payments', 'reconcile', '--page-size', '250'])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[-1].startswith('Checked 600 pending payment(s)')
+    assert f'{PAYMENTS} updated, {PAYMENTS} completed, 0 still pending, 0 error(s).' in result.output
+    with app.app_context():
+        assert statuses() == {'completed': PAYMENTS}
@@ -0,0 +1,62 @@
+import pytest
+from flask import g, session
+from app import create_app, db
+from app.database import REPLICA_BIND, mark_read_only
+from app.modules import User
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'primary.db')
+        SQLALCHEMY_REPLICA_URI = 'sqlite:///' + str(tmp_path / 'replica.db')
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(bind=db.engines[REPLICA_BIND])
+        # Different rows on each side so tests can tell where a read went.
+        with db.engines[None].begin() as conn:
+            conn.execute(User.__table__.insert(), {'full_name': 'Primary', 'email': 'p@example.com', 'password_hash': 'x'})
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(User.__table__.insert(), {'full_name': 'Replica', 'email': 'r@example.com', 'password_hash': 'x'})
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # The bind's (empty) metadata outlives the app and would make later
+    # db.create_all() calls look for a replica engine.
+    db.metadatas.pop(REPLICA_BIND, None)
+
+
+def first_name():
+    return db.session.query(User.full_name).order_by(User.id).first()[0]
+
+
+def test_reads_use_primary_by_default(app):
+    with app.test_request_context('/'):
+        assert first_name() == 'Primary'
+
+
+def test_read_only_request_uses_replica(app):
+    with app.test_request_context('/'):
+        mark_read_only()
+        assert first_name() == 'Replica'
+
+
+def test_session_reads_its_own_writes_from_primary(app):
+    with app.test_request_context('/'):
+        mark_read_only()
+        db.session.add(User(full_name='New', email='n@example.com', password_hash='x'))
+        db.session.commit()
+        assert first_name() == 'Primary'
+        assert g._db_wrote
+
+
+def test_client_pinned_to_primary_after_write(app):
+    with app.test_request_context('/'):
+        session['_db_primary_until'] = 2 ** 40
+        mark_read_only()
+        assert first_name() == 'Primary'
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.modules import Booking, Professional, Service, User
+from app.scheduling import (BookingConflict, availability, book, conflicts, find_free_slots, free_slots,
+                            gaps, merge)
+from config import TestingConfig
+
+DAY = datetime(2026, 3, 2)
+
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        client = User(email='client@example.com', full_name='Client', password_hash='x')
+        db.session.add(client)
+        for i in range(3):
+            user = User(email=f'pro{i}@example.com', full_name=f'Pro {i}', password_hash='x')
+            pro = Professional(user=user, full_name=f'Pro {i}', profession='Plumber')
+            db.session.add(Service(title=f'Service {i}', description='-', category='Plumbing', price=10,
+                                   provider=user, professional=pro))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def add_booking(service_id, start, minutes=60, **kwargs):
+    booking = Booking(client_id=1, service_id=service_id, scheduled_at=start, duration_minutes=minutes, **kwargs)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def test_merge_and_gaps():
+    busy = merge([(at(13), at(14)), (at(9), at(10)), (at(9, 30), at(11)), (at(11), at(12))])
+    assert busy == [(at(9), at(12)), (at(13), at(14))]
+    assert gaps(busy, at(8), at(17), timedelta(hours=1)) == [(at(8), at(9)), (at(12), at(13)), (at(14), at(17))]
+    assert gaps(busy, at(8), at(17), timedelta(hours=2)) == [(at(14), at(17))]
+
+
+def test_flush_sets_interval_and_professional(app):
+    with app.app_context():
+        booking = add_booking(2, at(9), 90)
+        assert booking.ends_at == at(10, 30)
+        assert booking.professional_id == db.session.get(Service, 2).professional_id
+
+        booking.duration_minutes = 30
+        db.session.commit()
+        assert booking.ends_at == at(9, 30)
+
+        booking.scheduled_at = at(11)
+        db.session.commit()
+        assert booking.ends_at == at(11, 30)
+
+        booking.service_id = 3
+        db.session.commit()
+        assert booking.professional_id == db.session.get(Service, 3).professional_id
+
+
+def test_duration_is_capped(app):
+    app.config['BOOKING_MAX_DURATION_MINUTES'] = 120
+    with app.app_context():
+        with pytest.raises(ValueError):
+            book(1, db.session.get(Service, 1), at(9), 121)
+        with pytest.raises(ValueError):
+            book(1, db.session.get(Service, 1), at(9), 0)
+        with pytest.raises(ValueError):
+            book(1, db.session.get(Service, 1), at(9), True)
+        assert db.session.scalar(db.select(db.func.count()).select_from(Booking)) == 0
+
+
+def test_unrelated_updates_skip_validation(app):
+    with app.app_context():
+        long_booking = add_booking(1, at(9), 600)
+        add_booking(2, at(9))
+        # The cap was lowered after these were made; status changes still commit.
+        app.config['BOOKING_MAX_DURATION_MINUTES'] = 120
+        for booking in Booking.query.all():
+            booking.status = 'confirmed'
+        db.session.commit()
+        assert {b.status for b in Booking.query.all()} == {'confirmed'}
+        assert long_booking.ends_at == at(19)
+        # Still found by availability, which looks back the database's cap.
+        assert find_free_slots(1, (at(18), at(20))) == [(at(19), at(20))]
+
+
+def test_find_free_slots(app):
+    with app.app_context():
+        pro = db.session.get(Professional, 1)
+        add_booking(1, at(10))
+        add_booking(1, at(10, 30))  # overlapping bookings merge
+        add_booking(1, at(14), status='cancelled')
+        add_booking(1, at(7))  # ends before the window opens
+        add_booking(2, at(12))  # another professional
+        assert find_free_slots(pro, (at(8), at(18))) == [(at(8), at(10)), (at(11, 30), at(18))]
+        assert find_free_slots(1, (at(8), at(18)), timedelta(hours=3)) == [(at(11, 30), at(18))]
+
+
+def test_booking_started_before_the_window_blocks_it(app):
+    with app.app_context():
+        add_booking(1, at(6), 180)
+        assert find_free_slots(1, (at(8), at(12))) == [(at(9), at(12))]
+        assert availability([1], at(8), at(9)) == {1: False}
+
+
+def test_availability_of_a_page_is_one_query(app):
+    with app.app_context():
+        add_booking(1, at(9))
+        add_booking(3, at(16))
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        assert availability([1, 2, 3], at(8), at(12)) == {1: False, 2: True, 3: True}
+        slots = free_slots([1, 2, 3], (at(8), at(12)), timedelta(hours=2))
+        assert len(statements) == 2
+        assert slots == {1: [(at(10), at(12))], 2: [(at(8), at(12))], 3: [(at(8), at(12))]}
+
+
+def test_book_refuses_overlaps(app):
+    with app.app_context():
+        service = db.session.get(Service, 1)
+        first = book(1, service, at(9), 60)
+        db.session.commit()
+        with pytest.raises(BookingConflict) as excinfo:
+            book(1, service, at(9, 30), 60)
+        assert excinfo.value.bookings == [first]
+        db.session.rollback()
+
+        book(1, service, at(10), 30)  # back to back is fine
+        db.session.commit()
+        assert conflicts(service.professional_id, at(9, 59), at(10, 1), exclude_booking_id=first.id) != []
+
+
+def test_free_slots_api(app):
+    with app.app_context():
+        add_booking(1, at(9))
+    client = app.test_client()
+    response = client.get('/api/professionals/1/free-slots',
+                          query_string={'start': '2026-03-02T08:00:00', 'end': '2026-03-02T12:00:00Z'})
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {'start': '2026-03-02T08:00:00', 'end': '2026-03-02T09:00:00'},
+        {'start': '2026-03-02T10:00:00', 'end': '2026-03-02T12:00:00'},
+    ]
+    assert client.get('/api/professionals/99/free-slots',
+                      query_string={'start': '2026-03-02T08:00', 'end': '2026-03-02T12:00'}).status_code == 404
+    assert client.get('/api/professionals/1/free-slots',
+                      query_string={'start': '2026-03-02T12:00', 'end': '2026-03-02T08:00'}).status_code == 400
+    assert client.get('/api/professionals/1/free-slots',
+                      query_string={'start': '2026-03-02', 'end': '2026-05-02'}).status_code == 400
+
+
+def test_availability_api(app):
+    with app.app_context():
+        add_booking(2, at(9))
+    response = app.test_client().get('/api/professionals/availability', query_string={
+        'ids': '2,1', 'start': '2026-03-02T08:00', 'end': '2026-03-02T11:00', 'duration': 120})
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {'professional_id': 2, 'available': False, 'free_slots': []},
+        {'professional_id': 1, 'available': True,
+         'free_slots': [{'start': '2026-03-02T08:00:00', 'end': '2026-03-02T11:00:00'}]},
+    ]
+    assert app.test_client().get('/api/professionals/availability',
+                                 query_string={'ids': 'x', 'start': '2026-03-02'}).status_code == 400
+
+
+def test_create_booking_api(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    body = {'service_id': 1, 'scheduled_at': '2026-03-02T09:00:00', 'duration_minutes': 90}
+    response = client.post('/api/bookings', json=body)
+    assert response.status_code == 201
+    assert response.get_json()['ends_at'] == '2026-03-02T10:30:00'
+
+    response = client.post('/api/bookings', json={**body, 'scheduled_at': '2026-03-02T10:00:00'})
+    assert response.status_code == 409
+    assert response.get_json()['conflicts'] == [{'start': '2026-03-02T09:00:00', 'end': '2026-03-02T10:30:00'}]
+    assert client.post('/api/bookings', json={**body, 'duration_minutes': 0}).status_code == 400
+    assert client.post('/api/bookings', json={**body, 'service_id': 99}).status_code == 404
@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db
+from app.http_cache import response_cache
+from app.identity_cache import identity_cache
+from app.modules import Job, Professional, User
+from app.pagination import encode_cursor
+from app.search import rebuild, search
+from config import TestingConfig
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        poster = User(email='client@example.com', full_name='Client', password_hash='x')
+        db.session.add(poster)
+        for i, (name, profession, skills, bio) in enumerate([
+            ('Jane Plumber', 'Plumber', 'pipes, leaks, boilers', 'Fixing leaking pipes since 2010'),
+            ('John Sparks', 'Electrician', 'wiring, lighting', 'Certified electrician, also fixes pipes'),
+            ('Mary Code', 'Web Developer', 'python, flask', 'Builds web apps'),
+        ]):
+            user = User(email=f'pro{i}@example.com', full_name=name, password_hash='x')
+            db.session.add(Professional(user=user, full_name=name, profession=profession,
+                                        skills=skills, bio=bio))
+        db.session.add(Job(title='Leaking kitchen pipe', description='Water under the sink',
+                           profession='Plumber', poster=poster))
+        db.session.add(Job(title='Install lights', description='Three ceiling lights',
+                           profession='Electrician', poster=poster))
+        db.session.commit()
+    response_cache.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def names(response):
+    return [row['full_name'] for row in response.get_json()]
+
+
+def test_ranks_field_weighted_matches_first(app):
+    response = app.test_client().get('/api/search?q=pipes')
+    assert response.status_code == 200
+    # Skills outweigh the bio, so the plumber comes first.
+    assert names(response) == ['Jane Plumber', 'John Sparks']
+    scores = [row['score'] for row in response.get_json()]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_terms_are_prefixes_and_all_required(app):
+    client = app.test_client()
+    assert names(client.get('/api/search?q=plumb')) == ['Jane Plumber']
+    assert names(client.get('/api/search?q=pipe+certified')) == ['John Sparks']
+    assert names(client.get('/api/search?q="web" (develop*')) == ['Mary Code']
+
+
+def test_searches_jobs(app):
+    identity_cache.clear()
+    client = app.test_client()
+    assert client.get('/api/search?type=jobs&q=leak').status_code == 302  # to the login page
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    rows = client.get('/api/search?type=jobs&q=leak').get_json()
+    assert [row['title'] for row in rows] == ['Leaking kitchen pipe']
+    with client.session_transaction() as session:
+        session.clear()
+    assert client.get('/api/search?type=jobs&q=leak').status_code == 302  # not served from the cache
+
+
+def test_pages_with_cursor(app):
+    client = app.test_client()
+    first = client.get('/api/search?q=pipes&limit=1')
+    assert names(first) == ['Jane Plumber']
+    link = first.headers['Link']
+    assert link.endswith('>; rel="next"')
+    second = client.get(link[1:link.index('>')])
+    assert names(second) == ['John Sparks']
+    assert 'Link' not in second.headers
+
+
+def test_cursor_skips_rows_up_to_the_last_score(app):
+    with app.app_context():
+        best = search('professionals', 'pipes', 10)[0]
+        rest = search('professionals', 'pipes', 10, after=(best['score'], best['id']))
+    assert [row['full_name'] for row in rest] == ['John Sparks']
+
+
+def test_index_follows_updates_and_deletes(app):
+    client = app.test_client()
+    with app.app_context():
+        pro = Professional.query.filter_by(full_name='Mary Code').one()
+        pro.skills = 'django, pipes'
+        db.session.delete(Professional.query.filter_by(full_name='Jane Plumber').one())
+        db.session.commit()
+    assert names(client.get('/api/search?q=django')) == ['Mary Code']
+    assert names(client.get('/api/search?q=python')) == []
+    assert sorted(names(client.get('/api/search?q=pipes'))) == ['John Sparks', 'Mary Code']
+
+
+def test_rebuild_reindexes_rows_written_without_triggers(app):
+    with app.app_context():
+        db.session.execute(text("DELETE FROM professionals_fts"))
+        db.session.commit()
+        assert search('professionals', 'pipes', 10) == []
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        assert len(search('professionals', 'pipes', 10)) == 2
+
+
+@pytest.mark.parametrize('query', ['', 'q=', 'q=%21%21', 'q=pipes&type=users', 'q=pipes&cursor=bad'])
+def test_rejects_bad_requests(app, query):
+    assert app.test_client().get(f'/api/search?{query}').status_code == 400
+
+
+def test_rebuild_command(app):
+    result = app.test_cli_runner().invoke(args=['search', 'rebuild'])
+    assert result.exit_code == 0
+    assert 'Search index rebuilt.' in result.output